@@ -1,28 +1,138 @@
 #Reciprocal Rank Fusion (RRF) Ensemble:
-import sys
-from collections import defaultdict
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 # Import both methods
-from bm25_query import get_bm25_rankings
-from Sentence_Transformer import get_sentence_transformer_rankings
-
-def compute_rrf_scores(rankings_dict, k=60): #Compute RRF scores from multiple ranking methods
-
-    rrf_scores = defaultdict(float)
-    # For each method's rankings
-    for method_name, rankings in rankings_dict.items():
-        for item in rankings:
-            author = item[0]  # First element is author name
-            rank = item[1]    # Second element is rank
-            
-            # RRF formula: 1 / (k + rank)
-            rrf_scores[author] += 1.0 / (k + rank)
-    
-    return dict(rrf_scores)
+from bm25_query import author_ranking_for_context
+from Sentence_Transformer import get_recommender
+from query_context import QueryContext
+import fusion
+import instrumentation
+from fusion import as_ranking, fuse, register_retriever, retriever_weights
+
+# How retrievers run within one request: "thread" (concurrently; BM25's NumPy/SciPy scoring and the
+# torch forward pass both release the GIL), "process" (concurrently in worker processes that load
+# their own indexes) or None (one after the other)
+RETRIEVAL_EXECUTOR = "thread"
+RETRIEVAL_DEPTH = 20        # authors listed per retriever on the QueryContext; fusion itself sees every ranked author
+# Seconds each retriever may take (None = no limit). A retriever that times out or fails is left out
+# and the others are fused on their own (degraded mode). With a limit set, thread retrievers run in a
+# per-request pool: a timed-out retriever keeps running until it returns, and in the shared pool it would
+# hold a worker that later requests then wait for (and time out on). Timed-out process retrievers still
+# hold a worker of the shared process pool until they return.
+RETRIEVER_TIMEOUTS = {'BM25': None, 'SentenceTransformer': None}
+
+_EXECUTORS = {}
+_EXECUTOR_LOCK = threading.Lock()
+
+def get_executor(kind): #Shared pool for the given executor kind, created on first use
+    with _EXECUTOR_LOCK:
+        executor = _EXECUTORS.get(kind)
+        if executor is None:
+            if kind == "thread":
+                executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retriever")
+            elif kind == "process":
+                executor = ProcessPoolExecutor(max_workers=2)
+            else:
+                raise ValueError(f"Unknown retrieval executor: {kind}")
+            _EXECUTORS[kind] = executor
+    return executor
+
+def _bm25_in_thread(context, depth):
+    return author_ranking_for_context(context, depth)
+
+def _st_in_thread(context, depth):
+    return get_recommender().author_ranking_for_context(context)
 
-def get_author_details(author, bm25_rankings, st_rankings): #Get detailed information for an author from both methods
+def _bm25_in_process(raw_text, depth): # Process workers get the extracted text, not the context
+    return author_ranking_for_context(QueryContext(raw_text=raw_text), depth)
 
+def _st_in_process(raw_text, depth):
+    return get_recommender().author_ranking_for_context(QueryContext(raw_text=raw_text))
+
+# Retrievers fused by rrf_ensemble, in tie-break order; add one with fusion.register_retriever(name, run, ...)
+register_retriever('BM25', _bm25_in_thread, _bm25_in_process, attribute='bm25_rankings', prefix='bm25')
+register_retriever('SentenceTransformer', _st_in_thread, _st_in_process, attribute='st_rankings', prefix='st')
+RETRIEVERS = fusion.RETRIEVERS
+
+def run_retrievers(context, depth=RETRIEVAL_DEPTH, executor=None, timeouts=None): #{name: fusion.AuthorRanking} of the retrievers that finished
+    #Each retriever's top depth authors are also stored as tuples on its context attribute. Failed or
+    #timed-out retrievers are listed in context.failed_retrievers and their tuples set to []
+    executor = RETRIEVAL_EXECUTOR if executor is None else executor
+    timeouts = RETRIEVER_TIMEOUTS if timeouts is None else timeouts
+    context.raw_text  # extract once, before the retrievers share (or ship) it
+    results = {}
+
+    if not executor or executor == "sequential":
+        for name, retriever in RETRIEVERS.items():
+            try:
+                results[name] = retriever.run(context, depth)
+            except Exception as e:
+                print(f"✗ {name} failed: {e}")
+                context.failed_retrievers.append(name)
+    else:
+        limited = any(timeouts.get(name) is not None for name in RETRIEVERS)
+        own_pool = executor == "thread" and limited
+        pool = ThreadPoolExecutor(max_workers=len(RETRIEVERS), thread_name_prefix="retriever") if own_pool \
+            else get_executor(executor)
+        start = time.perf_counter()
+        if executor == "process":
+            futures = {name: pool.submit(retriever.run_in_process, context.raw_text, depth)
+                       for name, retriever in RETRIEVERS.items()}
+        else:
+            # Threads record their stages into the caller's trace; process workers only into their own totals
+            futures = {name: instrumentation.submit(pool, retriever.run, context, depth)
+                       for name, retriever in RETRIEVERS.items()}
+        for name, future in futures.items():
+            limit = timeouts.get(name)
+            remaining = None if limit is None else max(0.0, limit - (time.perf_counter() - start))
+            try:
+                results[name] = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                future.cancel()  # a running retriever finishes in the background; its result is ignored
+                print(f"✗ {name} timed out after {limit}s")
+                context.failed_retrievers.append(name)
+            except Exception as e:
+                print(f"✗ {name} failed: {e}")
+                context.failed_retrievers.append(name)
+        if own_pool:
+            pool.shutdown(wait=False)  # threads of timed-out retrievers exit when they return
+
+    if not results:
+        raise RuntimeError(f"All retrievers failed: {', '.join(context.failed_retrievers)}")
+    context.author_rankings.update(results)
+    for name, retriever in RETRIEVERS.items():
+        if retriever.attribute:
+            setattr(context, retriever.attribute, results[name].top(depth) if name in results else [])
+    return results
+
+def compute_rrf_scores(rankings_dict, k=60): #{author: RRF score} of every ranked author, best first (ranking tuples or fusion.AuthorRanking)
+    return {author: score for author, score, _ in fuse(rankings_dict, method="rrf", top_k=None, k=k, with_entries=False)}
+
+def fused_details(entries): #Details dict of one fused author: <prefix>_rank/<prefix>_score per retriever, num_papers
+    details = {}
+    for retriever in RETRIEVERS.values():
+        details[f'{retriever.prefix}_rank'] = None
+        details[f'{retriever.prefix}_score'] = None
+    details['num_papers'] = None
+    for name, (author, rank, score, avg_score, num_papers) in entries.items():
+        prefix = RETRIEVERS[name].prefix if name in RETRIEVERS else name.lower()
+        details[f'{prefix}_rank'] = rank
+        details[f'{prefix}_score'] = score
+        if details['num_papers'] is None:  # first retriever (in fusion order) that ranks the author
+            details['num_papers'] = num_papers
+    return details
+
+def get_author_details(author, bm25_rankings=None, st_rankings=None, context=None): #Get detailed information for an author from both methods
+
+    #Rankings default to the ones cached on the QueryContext by rrf_ensemble
     #Returns: Dict with BM25 and Sentence Transformer metrics  
+    if context is not None:
+        bm25_rankings = context.bm25_rankings if bm25_rankings is None else bm25_rankings
+        st_rankings = context.st_rankings if st_rankings is None else st_rankings
+    bm25_rankings = bm25_rankings or []
+    st_rankings = st_rankings or []
     details = {
         'bm25_rank': None,
         'bm25_score': None,
@@ -48,35 +158,44 @@ def get_author_details(author, bm25_rankings, st_rankings): #Get detailed inform
     return details
 
 def rrf_ensemble(pdf_input, top_k=10, k=60): #List of (author, rrf_score, details_dict) tuples
+    #pdf_input may be a QueryContext; the per-method rankings are left on it for re-ranking
+    context = QueryContext.from_input(pdf_input)
     
     print("Running RRF Ensemble\n")
     
-    # Get rankings from both methods
-    print("1/3 Getting BM25 rankings")
-    bm25_rankings = get_bm25_rankings(pdf_input, k=20)  # Get top-20 from each
+    # Get top-20 rankings from both methods, concurrently unless RETRIEVAL_EXECUTOR is None
+    print(f"1/2 Getting BM25 + Sentence Transformer rankings ({RETRIEVAL_EXECUTOR or 'sequential'})")
+    rankings_dict = run_retrievers(context)
+    if context.failed_retrievers:
+        print(f"⚠️ Degraded: fusing {', '.join(rankings_dict)} only")
     
-    print("2/3 Getting Sentence Transformer rankings")
-    st_rankings = get_sentence_transformer_rankings(pdf_input, top_k=20)
+    print("2/2 Computing RRF scores...\n")
     
-    print("3/3 Computing RRF scores...\n")
-    
-    # Prepare rankings dict for RRF
-    rankings_dict = {
-        'BM25': bm25_rankings,
-        'SentenceTransformer': st_rankings
-    }
-    # Compute RRF scores
-    rrf_scores = compute_rrf_scores(rankings_dict, k=k)
-    # Sort by RRF score
-    ranked_authors = sorted(rrf_scores.items(), key=lambda x: x[1], reverse=True)
-    
-    # Get detailed info for top-K authors
-    results = []
-    for author, rrf_score in ranked_authors[:top_k]:
-        details = get_author_details(author, bm25_rankings, st_rankings)
-        results.append((author, rrf_score, details))
+    results, tuples = fuse_with_rankings(rankings_dict, top_k=top_k, k=k)
+    for name, retriever in RETRIEVERS.items():
+        if retriever.attribute and name in tuples:
+            setattr(context, retriever.attribute, tuples[name])
     return results
 
+@instrumentation.timed("fusion")
+def fuse_rankings(rankings_dict, top_k=10, k=60, method=None): #Fusion over per-method rankings -> (author, fused score, details_dict) tuples
+    #rankings_dict values: fusion.AuthorRanking (full depth) or ranking tuples; method defaults to fusion.FUSION_METHOD
+    return [(author, score, fused_details(entries))
+            for author, score, entries in fuse(rankings_dict, method=method, top_k=top_k, k=k, weights=retriever_weights())]
+
+@instrumentation.timed("fusion")
+def fuse_with_rankings(rankings_dict, top_k=10, k=60, depth=RETRIEVAL_DEPTH, method=None): #(fuse_rankings results, {name: ranking tuples}) for re-ranking
+    #Each retriever's tuples are its top depth authors plus every fused author it ranks, so re-ranking
+    #finds the retriever scores and paper counts of all fused authors
+    fused = fuse(rankings_dict, method=method, top_k=top_k, k=k, weights=retriever_weights())
+    tuples = {}
+    for name, ranking in rankings_dict.items():
+        listed = as_ranking(ranking).top(depth)
+        seen = {entry[0] for entry in listed}
+        extra = [entries[name] for _, _, entries in fused if name in entries and entries[name][0] not in seen]
+        tuples[name] = sorted(listed + extra, key=lambda entry: entry[1])
+    return [(author, score, fused_details(entries)) for author, score, entries in fused], tuples
+
 def display_rrf_results(results): #Display RRF results
     print("TOP 10 RECOMMENDED REVIEWERS (RRF - Hybrid Ensemble)")
     for i, (author, rrf_score, details) in enumerate(results, 1):
@@ -87,12 +206,12 @@ def display_rrf_results(results): #Display RRF results
         if details['bm25_rank'] is not None:
             print(f"   BM25: Rank {details['bm25_rank']}, Score {details['bm25_score']:.4f}")
         else:
-            print(f"   BM25: Not in top-20")
+            print(f"   BM25: Not ranked")
         # ST info
         if details['st_rank'] is not None:
             print(f"   Sentence Transformers: Rank {details['st_rank']}, Score {details['st_score']:.4f}")
         else:
-            print(f"   Sentence Transformers: Not in top-20")
+            print(f"   Sentence Transformers: Not ranked")
         # Papers count
         if details['num_papers'] is not None:
             print(f"   Papers: {details['num_papers']}")
@@ -1,60 +1,129 @@
 #Re-ranking module: Apply boosts and penalties to RRF results
+import copy
 import pickle
 from pathlib import Path
 
 from pathlib import Path
 
+import numpy as np
+
+import artifacts
+import instrumentation
+from instrumentation import timed
+
 BASE_DIR = Path(__file__).parent
-AUTHOR_PROFILES_PATH = BASE_DIR / "PKL_files" / "author_profiles.pkl"
-try:
-    with open(AUTHOR_PROFILES_PATH, 'rb') as f:
-        AUTHOR_PROFILES = pickle.load(f)
-    print(f"✓ Loaded {len(AUTHOR_PROFILES)} author profiles")
-except Exception as e:
-    print(f"✗ Error loading author profiles: {e}")
-    AUTHOR_PROFILES = {}
+AUTHOR_PROFILES_PATH = BASE_DIR / "PKL_files" / "author_profiles.pkl"   # flat layout; see artifacts.artifact_path
+_AUTHOR_PROFILES = None
+_AUTHOR_PROFILES_VERSION = None
+
+def get_author_profiles(): #Author profiles of the current snapshot, loaded on first use (or by startup.warmup)
+    global _AUTHOR_PROFILES, _AUTHOR_PROFILES_VERSION
+    version = artifacts.current_version()
+    if _AUTHOR_PROFILES is None or version != _AUTHOR_PROFILES_VERSION:
+        try:
+            with open(artifacts.artifact_path(artifacts.AUTHOR_PROFILES, version), 'rb') as f:
+                profiles = pickle.load(f)
+            print(f"✓ Loaded {len(profiles)} author profiles")
+        except Exception as e:
+            print(f"✗ Error loading author profiles: {e}")
+            profiles = {}
+        _AUTHOR_PROFILES, _AUTHOR_PROFILES_VERSION = profiles, version
+    return _AUTHOR_PROFILES
+
+def __getattr__(name): # AUTHOR_PROFILES stays available as a module attribute
+    if name == 'AUTHOR_PROFILES':
+        return get_author_profiles()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Indian premier institutions
 PREMIER_INSTITUTIONS = ['IIT', 'IISc', 'IIIT', 'NIT', 'BITS', 'VIT']
 
+# Boost table: name -> (input column, [(minimum value, factor), ...] first match wins, factor below every minimum)
+BOOST_TABLE = {
+    'experience': ('num_papers', [(30, 1.07), (20, 1.05), (10, 1.02), (5, 1.01)], 1.00),
+    'recency': ('recent_papers', [(3, 1.015), (1, 1.025)], 1.04),       # papers in the last 3 years
+    'consistency': ('avg_similarity', [(0.7, 1.05), (0.5, 1.025)], 1.00),
+    'penalty': ('num_papers', [(3, 1.00)], 0.95),                       # 2 or fewer papers (counts are integers)
+}
+# Categorical boosts: name -> (input column, {value: factor}, factor for any other value)
+CATEGORY_BOOSTS = {
+    'institution': ('institution', {name: 1.02 for name in PREMIER_INSTITUTIONS}, 1.00),
+}
+# Factors multiplied into the final score, in this order
+BOOST_ORDER = ('experience', 'institution', 'recency', 'consistency', 'penalty')
+
+def tier_factors(values, tiers, default): #Factor of each value from a (minimum, factor) ladder, as a float64 array
+    values = np.asarray(values)
+    return np.select([values >= minimum for minimum, _ in tiers], [factor for _, factor in tiers], default).astype(np.float64)
+
+def category_factors(codes, labels, mapping, default): #Factor of each coded value; labels[code] is the value
+    return np.array([mapping.get(label, default) for label in labels], dtype=np.float64)[codes]
+
+def _boost(name, value): #One boost for one value, from the tables
+    if name in CATEGORY_BOOSTS:
+        _, mapping, default = CATEGORY_BOOSTS[name]
+        return mapping.get(value, default)
+    _, tiers, default = BOOST_TABLE[name]
+    return float(tier_factors([value], tiers, default)[0])
+
 def calculate_experience_boost(num_papers): #Calculate experience boost based on number of papers
-    if num_papers >= 30:
-        return 1.07
-    elif num_papers >= 20:
-        return 1.05
-    elif num_papers >= 10:
-        return 1.02
-    elif num_papers >= 5:
-        return 1.01
-    else:
-        return 1.00
+    return _boost('experience', num_papers)
 
 def calculate_institution_boost(institution): #Calculate institution boost for Indian premier institutions
-    if institution in PREMIER_INSTITUTIONS:
-        return 1.02
-    else:
-        return 1.00
+    return _boost('institution', institution)
 
 def calculate_recency_boost(recent_papers): #Calculate recency boost based on papers in last 3 years
-    if recent_papers >= 3:
-        return 1.015
-    elif recent_papers >= 1:
-        return 1.025
-    else:
-        return 1.04
+    return _boost('recency', recent_papers)
+
 def calculate_consistency_boost(avg_similarity): #Calculate consistency boost based on average similarity
-    if avg_similarity >= 0.7:
-        return 1.05
-    elif avg_similarity >= 0.5:
-        return 1.025
-    else:
-        return 1.00
+    return _boost('consistency', avg_similarity)
 
 def calculate_penalty(num_papers): #Calculate penalty for authors with very few papers
-    if num_papers <= 2:
-        return 0.95
-    else:
-        return 1.00
+    return _boost('penalty', num_papers)
+
+
+class ProfileTable:  # Author profiles as columns indexed by author id; built once per profiles dict
+    MISSING_YEAR = -1
+
+    def __init__(self, profiles):
+        self.profiles = profiles
+        self.authors = list(profiles)
+        self.author_ids = {author: i for i, author in enumerate(self.authors)}
+        values = list(profiles.values())
+        # Institution codes; code 0 ('Other') is also used for authors without a profile
+        self.institutions = list(dict.fromkeys(['Other'] + [p.get('primary_institution', 'Other') for p in values]))
+        codes = {name: i for i, name in enumerate(self.institutions)}
+        self.num_papers = np.array([p.get('num_papers', 0) for p in values], dtype=np.int64)
+        self.institution = np.array([codes[p.get('primary_institution', 'Other')] for p in values], dtype=np.int32)
+        self.recent_papers = np.array([p.get('recent_papers', 0) for p in values], dtype=np.int64)
+        self.latest_year = np.array([p.get('latest_year') if p.get('latest_year') is not None else self.MISSING_YEAR
+                                     for p in values], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.authors)
+
+    def columns(self, authors): #{num_papers, institution, recent_papers, latest_year} arrays for authors; defaults where there is no profile
+        ids = np.array([self.author_ids.get(author, -1) for author in authors], dtype=np.int64)
+        known = ids >= 0
+        safe = np.where(known, ids, 0)
+        return {
+            'num_papers': np.where(known, self.num_papers[safe] if len(self) else 0, 0),
+            'institution': np.where(known, self.institution[safe] if len(self) else 0, 0),
+            'recent_papers': np.where(known, self.recent_papers[safe] if len(self) else 0, 0),
+            'latest_year': np.where(known, self.latest_year[safe] if len(self) else 0, self.MISSING_YEAR),
+        }
+
+# RRF candidates handed to rerank_results; None re-ranks every author any retriever returned
+RERANK_CANDIDATES = 20
+
+_PROFILE_TABLE = None
+
+def get_profile_table(): #Columnar view of get_author_profiles(), rebuilt when the profiles are reloaded
+    global _PROFILE_TABLE
+    profiles = get_author_profiles()
+    if _PROFILE_TABLE is None or _PROFILE_TABLE.profiles is not profiles:
+        _PROFILE_TABLE = ProfileTable(profiles)
+    return _PROFILE_TABLE
 
 
 def get_author_info(author, bm25_rankings, st_rankings): #Get author information from profiles and rankings
@@ -62,7 +131,7 @@ def get_author_info(author, bm25_rankings, st_rankings): #Get author information
     #Args: author: Author name,bm25_rankings: BM25 results list,st_rankings: Sentence Transformer results list
 
     # Get from author profiles (if available)
-    profile = AUTHOR_PROFILES.get(author, {})
+    profile = get_author_profiles().get(author, {})
     
     # Initialize variables
     bm25_avg = None
@@ -113,98 +182,142 @@ def assign_tier(rank): #Assign tier based on rank
         return "3. Consider"
 
 
-def rerank_results(rrf_results, bm25_rankings, st_rankings, top_k=10): #Apply re-ranking with boosts and penalties    
-    reranked = []
-    
-    for author, rrf_score, rrf_details in rrf_results:
-        
-        # Get author information
-        info = get_author_info(author, bm25_rankings, st_rankings)
-        
-        # Calculate all boosts and penalties
-        experience_boost = calculate_experience_boost(info['num_papers'])
-        institution_boost = calculate_institution_boost(info['institution'])
-        recency_boost = calculate_recency_boost(info['recent_papers'])
-        consistency_boost = calculate_consistency_boost(info['avg_similarity'])
-        penalty = calculate_penalty(info['num_papers'])
-        
-        # Calculate final score
-        final_score = (rrf_score * 
-                      experience_boost * 
-                      institution_boost * 
-                      recency_boost * 
-                      consistency_boost * 
-                      penalty)
-        
-        # Store result
-        reranked.append({
-            'author': author,
+def _ranking_columns(authors, rankings): #(avg score, num_papers) arrays of authors in one method's rankings; NaN/0 where absent
+    found = {}
+    for author, rank, max_score, avg_score, num_papers in rankings:
+        found.setdefault(author, (avg_score, num_papers))
+    avg = np.array([found[a][0] if a in found else np.nan for a in authors], dtype=np.float64)
+    papers = np.array([found[a][1] if a in found else 0 for a in authors], dtype=np.int64)
+    return avg, papers
+
+def rerank_scores(authors, rrf_scores, bm25_rankings, st_rankings): #(final scores, boost factors, candidate columns) for every candidate at once
+    columns = get_profile_table().columns(authors)
+    bm25_avg, bm25_papers = _ranking_columns(authors, bm25_rankings)
+    st_avg, st_papers = _ranking_columns(authors, st_rankings)
+    # Authors without a profile paper count fall back to BM25's, then the ST count
+    num_papers = np.where(columns['num_papers'] == 0, bm25_papers, columns['num_papers'])
+    columns['num_papers'] = np.where(num_papers == 0, st_papers, num_papers)
+    has_bm25, has_st = ~np.isnan(bm25_avg), ~np.isnan(st_avg)
+    columns['avg_similarity'] = np.where(has_bm25 & has_st, (bm25_avg + st_avg) / 2,
+                                         np.where(has_bm25, bm25_avg, np.where(has_st, st_avg, 0.0)))
+
+    factors = {name: tier_factors(columns[column], tiers, default) for name, (column, tiers, default) in BOOST_TABLE.items()}
+    labels = get_profile_table().institutions
+    factors.update({name: category_factors(columns[column], labels, mapping, default)
+                    for name, (column, mapping, default) in CATEGORY_BOOSTS.items()})
+    final = np.asarray(rrf_scores, dtype=np.float64)
+    for name in BOOST_ORDER:
+        final = final * factors[name]
+    return final, factors, columns
+
+@timed("reranking")
+def rerank_results(rrf_results, bm25_rankings=None, st_rankings=None, top_k=10, context=None): #Apply re-ranking with boosts and penalties    
+    # Rankings default to the ones rrf_ensemble cached on the QueryContext
+    if context is not None:
+        bm25_rankings = context.bm25_rankings if bm25_rankings is None else bm25_rankings
+        st_rankings = context.st_rankings if st_rankings is None else st_rankings
+    bm25_rankings = bm25_rankings or []
+    st_rankings = st_rankings or []
+    if not rrf_results:
+        return []
+
+    # Scores of every candidate in one pass; result dicts only for the top K
+    authors = [author for author, _, _ in rrf_results]
+    rrf_scores = [rrf_score for _, rrf_score, _ in rrf_results]
+    final, factors, columns = rerank_scores(authors, rrf_scores, bm25_rankings, st_rankings)
+    order = np.argsort(-final, kind='stable')[:top_k]   # stable: ties keep RRF order
+    labels = get_profile_table().institutions
+
+    top_results = []
+    max_score = float(final[order[0]])
+    for rank, i in enumerate(order, 1):
+        latest_year = int(columns['latest_year'][i])
+        avg_similarity = float(columns['avg_similarity'][i])
+        final_score = float(final[i])
+        # Normalize scores to 0-100
+        normalized_score = (final_score / max_score) * 100 if max_score > 0 else 0.0
+        top_results.append({
+            'author': authors[i],
             'final_score': final_score,
-            'rrf_score': rrf_score,
-            'num_papers': info['num_papers'],
-            'institution': info['institution'],
-            'recent_papers': info['recent_papers'],
-            'latest_year': info['latest_year'],
-            'avg_similarity': info['avg_similarity'],
-            'boosts': {
-                'experience': experience_boost,
-                'institution': institution_boost,
-                'recency': recency_boost,
-                'consistency': consistency_boost,
-                'penalty': penalty
-            }
+            'rrf_score': rrf_scores[i],
+            'num_papers': int(columns['num_papers'][i]),
+            'institution': labels[columns['institution'][i]],
+            'recent_papers': int(columns['recent_papers'][i]),
+            'latest_year': None if latest_year == ProfileTable.MISSING_YEAR else latest_year,
+            'avg_similarity': avg_similarity,
+            'boosts': {name: float(factors[name][i]) for name in BOOST_ORDER},
+            'rank': rank,
+            'tier': assign_tier(rank),
+            'score': round(normalized_score, 2),
+            'avg_similarity_pct': round(avg_similarity * 100, 1),
         })
-    
-    # Sort by final score
-    reranked.sort(key=lambda x: x['final_score'], reverse=True)
-    
-    # Take top K
-    top_results = reranked[:top_k]
-    
-    # Normalize scores to 0-100
-    if top_results:
-        max_score = top_results[0]['final_score']
-        
-        for i, result in enumerate(top_results):
-            # Normalize
-            if max_score > 0:
-                normalized_score = (result['final_score'] / max_score) * 100
-            else:
-                normalized_score = 0.0
-            
-            # Add rank and tier
-            result['rank'] = i + 1
-            result['tier'] = assign_tier(i + 1)
-            result['score'] = round(normalized_score, 2)
-            
-            # Convert avg_similarity to percentage
-            result['avg_similarity_pct'] = round(result['avg_similarity'] * 100, 1)
-    
     return top_results
 
-def get_reranked_recommendations(pdf_input, top_k=10): #Main function: Get re-ranked recommendations from PDF
-    from RRF_Ensemble import rrf_ensemble
-    from bm25_query import get_bm25_rankings
-    from Sentence_Transformer import get_sentence_transformer_rankings
+def _files_version(version, embeddings_path): #Sizes/mtimes of the index, profile and embedding files of version
+    from pipeline_cache import file_version
+    return file_version(*(artifacts.artifact_path(name, version) for name in (
+        artifacts.BM25_SPARSE_INDEX, artifacts.BM25_RANK_INDEX, artifacts.BM25_DOC_AUTHORS, artifacts.AUTHOR_PROFILES)),
+        embeddings_path)
+
+# Stat()ed once per snapshot switch, not per request
+_FILES_VERSION = artifacts.VersionCache(_files_version)
+
+def pipeline_version(): #Version of everything the final rankings depend on: index/profile files and retrieval settings
+    import bm25_query
+    import encoders
+    import fusion
+    import Sentence_Transformer
+    from pdf_extraction import extraction_version
+    from pipeline_cache import cache_key
+
+    version = artifacts.current_version()
+    files = _FILES_VERSION.get(str(Sentence_Transformer.active_embeddings_path()))
+    settings = (RERANK_CANDIDATES, fusion.FUSION_METHOD, fusion.FUSION_DEPTH, bm25_query.QUERY_TERM_BUDGET, bm25_query.BM25_BACKEND,
+                Sentence_Transformer.VECTOR_INDEX_BACKEND, Sentence_Transformer.ANN_TOP_M, Sentence_Transformer.AUTHOR_SHORTLIST,
+                Sentence_Transformer.QUERY_CHUNKING, Sentence_Transformer.CHUNK_WORDS, Sentence_Transformer.MAX_CHUNKS,
+                Sentence_Transformer.ENCODER_BACKEND or encoders.ENCODER_BACKEND)
+    return cache_key(version, files, *settings, *extraction_version())
+
+def rankings_cache_key(content_hash, top_k): #Pipeline-cache key of one paper's final rankings (also used by server.py)
+    from pipeline_cache import cache_key
+    return cache_key(content_hash, pipeline_version(), top_k)
+
+def get_reranked_recommendations(pdf_input, top_k=10, use_cache=True): #Main function: Get re-ranked recommendations from PDF
+    from query_context import QueryContext
     
     print("\n" + "="*80)
     print("GETTING RE-RANKED RECOMMENDATIONS")
     print("="*80)
     
-    # Step 1: Get RRF results
-    print("\n[1/4] Running RRF ensemble...")
-    rrf_results = rrf_ensemble(pdf_input, top_k=20, k=60)
-    
-    # Step 2: Get BM25 and ST rankings for avg scores
-    print("[2/4] Getting BM25 rankings...")
-    bm25_rankings = get_bm25_rankings(pdf_input, k=20)
+    # One context per request: text is extracted, cleaned, scored and encoded only once
+    context = QueryContext.from_input(pdf_input)
+    with instrumentation.trace() as request_trace:
+        results = _reranked_for_context(context, top_k, use_cache)
+    # Per-stage timings: pass a QueryContext to read them back
+    context.timings = request_trace.breakdown()
+    return results
+
+def _reranked_for_context(context, top_k, use_cache):
+    from RRF_Ensemble import rrf_ensemble
+
+    # Same PDF bytes + same indexes/settings: serve the rankings from the pipeline cache
+    cache = context.cache if use_cache else None
+    if cache is not None:
+        key = rankings_cache_key(context.content_hash, top_k)
+        cached = cache.get("rankings", key)
+        if cached is not None:
+            print(f"\n✓ Cache hit! Returning top {len(cached)} recommendations\n")
+            return copy.deepcopy(cached)
     
-    print("[3/4] Getting Sentence Transformer rankings...")
-    st_rankings = get_sentence_transformer_rankings(pdf_input, top_k=20)
+    # Step 1: Get RRF results (also leaves the BM25/ST rankings on the context)
+    print("\n[1/2] Running RRF ensemble...")
+    rrf_results = rrf_ensemble(context, top_k=RERANK_CANDIDATES, k=60)
     
-    # Step 3: Apply re-ranking
-    print("[4/4] Applying re-ranking with boosts...")
-    results = rerank_results(rrf_results, bm25_rankings, st_rankings, top_k=top_k)
+    # Step 2: Apply re-ranking
+    print("[2/2] Applying re-ranking with boosts...")
+    results = rerank_results(rrf_results, top_k=top_k, context=context)
+    if cache is not None and not context.failed_retrievers:  # degraded results are not cached
+        cache.put("rankings", key, copy.deepcopy(results))
     
     print(f"\n✓ Complete! Generated top {len(results)} recommendations\n")
     
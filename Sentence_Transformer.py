@@ -1,122 +1,320 @@
 import pickle
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
-import fitz  # PyMuPDF
 import re
-import os
-import io
+import threading
 from pathlib import Path
+import artifacts
+from instrumentation import stage, timed
+from query_context import QueryContext
+from author_index import AuthorIndex, top_k_indices
+from fusion import AuthorRanking
+from embedding_store import is_store, load_store
+import encoders
+from vector_index import ExactIndex, default_index_path, load_or_build_index, normalize_rows, search_passages
+
+DEFAULT_EMBEDDINGS_PATH = Path(__file__).parent / "PKL_files" / "sentence_transformer_embeddings.pkl"
+# Memory-mapped store written by embedding_store.py; preferred over the pickle when present
+DEFAULT_EMBEDDINGS_STORE = Path(__file__).parent / "PKL_files" / "st_embedding_store"
+
+def default_embeddings_path(): #Embeddings of the current snapshot (artifacts.py); the flat PKL_files layout otherwise
+    store = artifacts.artifact_path(artifacts.EMBEDDINGS_STORE)
+    return store if is_store(store) else artifacts.artifact_path(artifacts.EMBEDDINGS_PICKLE)
+
+# Paper search backend: "exact" (pre-normalized dot product over every paper), "hnsw" (hnswlib) or
+# "ivf" (pure NumPy). Approximate backends shortlist ANN_TOP_M papers, then score their authors exactly.
+# "centroid" is two-stage author retrieval: AUTHOR_SHORTLIST authors are picked against each author's
+# centroid + k-means medoids (vector_index.AuthorCentroidIndex), then scored exactly over their papers.
+VECTOR_INDEX_BACKEND = "exact"
+ANN_TOP_M = 200
+AUTHOR_SHORTLIST = 200
+
+# Query encoding: None embeds the first 512 words only. "mean"/"max" split the whole paper into
+# model-window passages, encode them in one batched call and pool them into one vector; "maxsim"
+# keeps every passage and scores each corpus paper by its best-matching passage.
+QUERY_CHUNKING = None
+CHUNK_WORDS = None        # words per passage; None derives it from the model's max_seq_length
+MAX_CHUNKS = 64           # passage cap for very long submissions
+ENCODE_BATCH_SIZE = 32
+ENCODE_THREADS = None     # encoder intra-op threads (torch or onnxruntime); None keeps the runtime's default
+ENCODER_BACKEND = None    # query encoder: "torch", "onnx" or "onnx-int8" (see encoders.py); None uses encoders.ENCODER_BACKEND
+
+# Process-wide shared state: query encoders by (model name, backend, threads), recommenders by registry key
+_MODELS = {}
+_RECOMMENDERS = {}
+_DEFAULT_KEY = None     # registry key last served for the default (current snapshot) embeddings
+_REGISTRY_LOCK = threading.RLock()
+
+def load_model(model_name, backend="torch", num_threads=None): #Shared encoder instance; constructed once per process
+    #The default is the stock SentenceTransformer, which corpus builds always use
+    key = (model_name, backend, num_threads)
+    model = _MODELS.get(key)
+    if model is None:
+        with _REGISTRY_LOCK:
+            model = _MODELS.get(key)
+            if model is None:
+                model = encoders.load_encoder(model_name, backend, num_threads)
+                _MODELS[key] = model
+    return model
 
 class ReviewerRecommender:  # Sentence Transformer based reviewer recommendation
-    def __init__(self, embeddings_path=None):
+    def __init__(self, embeddings_path=None, st_model=None, index_backend=None, index_path=None, top_m=None,
+                 author_shortlist=None, chunking=None, chunk_words=None, batch_size=None, num_threads=None,
+                 encoder_backend=None):
         if embeddings_path is None:
-            BASE_DIR = Path(__file__).parent
-            embeddings_path = BASE_DIR / "PKL_files" / "sentence_transformer_embeddings.pkl"
+            embeddings_path = default_embeddings_path()
+        self.embeddings_path = Path(embeddings_path)
         
-        # Load saved embeddings
-        with open(embeddings_path, 'rb') as f:
-            saved_data = pickle.load(f)
+        # Load saved embeddings: a store is memory-mapped (zero-copy, already normalized), a pickle is read whole
+        if is_store(embeddings_path):
+            saved_data = load_store(embeddings_path)
+        else:
+            with open(embeddings_path, 'rb') as f:
+                saved_data = pickle.load(f)
         
         self.embeddings = saved_data['embeddings']
         self.all_paths = saved_data['all_paths']
         self.author_papers = saved_data['author_papers']
         self.model_name = saved_data['model_name']
-        # Load sentence transformer model
-        self.st_model = SentenceTransformer(self.model_name)
+        # author -> paper rows CSR index, built once
+        self.author_index = AuthorIndex.from_author_papers(self.author_papers, self.all_paths)
+        # Rows normalized once so a query is a plain dot product; optional ANN index on top
+        if 'scales' in saved_data:
+            self.exact_index = ExactIndex(self.embeddings, normalized=True, scales=saved_data['scales'],
+                                          fingerprint=saved_data.get('content_hash'))
+        else:
+            self.exact_index = ExactIndex(self.embeddings)
+        self.index_backend = index_backend or VECTOR_INDEX_BACKEND
+        self.top_m = top_m or ANN_TOP_M
+        self.author_shortlist = author_shortlist or AUTHOR_SHORTLIST
+        self.ann_index = None
+        if self.index_backend != "exact":
+            if index_path is None:
+                index_path = default_index_path(self.embeddings_path, self.index_backend)
+            self.ann_index = load_or_build_index(self.index_backend, self.exact_index, index_path, self.author_index)
+        # Load the query encoder (shared across recommenders unless one is passed in); the ONNX backends
+        # are exported offline from the model_name the embeddings were built with
+        self.encoder_backend = encoder_backend or ENCODER_BACKEND or encoders.ENCODER_BACKEND
+        self.num_threads = num_threads or ENCODE_THREADS
+        if self.encoder_backend == "torch":
+            encoders.set_torch_threads(self.num_threads)
+        self.st_model = st_model if st_model is not None else load_model(
+            self.model_name, self.encoder_backend, None if self.encoder_backend == "torch" else self.num_threads)
+
+        # Query encoding settings
+        self.chunking = chunking or QUERY_CHUNKING
+        if self.chunking not in (None, "mean", "max", "maxsim"):
+            raise ValueError(f"Unknown chunking mode: {self.chunking}")
+        max_seq_length = getattr(self.st_model, "max_seq_length", None) or 256
+        # ~0.75 words per subword token keeps a passage inside the model window
+        self.chunk_words = chunk_words or CHUNK_WORDS or max(32, int(max_seq_length * 0.75))
+        self.batch_size = batch_size or ENCODE_BATCH_SIZE
     
     def preprocess_text(self, raw_text): #Minimal preprocessing for transformer models
         text = raw_text.lower()
         text = re.sub(r'\s+', ' ', text)
         text = text.strip()
         return text
-    def extract_text_from_pdf(self, pdf_input):
-    
+    def extract_text_from_pdf(self, pdf_input): #Shared extractor, same text as the BM25 side
+        from pdf_extraction import extract_text
+        return extract_text(pdf_input)
+
+    def split_passages(self, text): #Model-window-sized word passages of the whole paper
+        words = text.split()
+        passages = [' '.join(words[i:i + self.chunk_words]) for i in range(0, len(words), self.chunk_words)]
+        return passages[:MAX_CHUNKS] or ['']
 
-        if isinstance(pdf_input, (str, bytes, os.PathLike)):
-            # Case 1: Path to file or raw bytes
-            if isinstance(pdf_input, bytes):
-                pdf_bytes = pdf_input
-            else:
-                with open(pdf_input, 'rb') as f:
-                    pdf_bytes = f.read()
-            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-
-        elif hasattr(pdf_input, "read"):
-            # Case 2: Streamlit UploadedFile object
-            try:
-                pdf_input.seek(0)  # Reset the file pointer before reading
-            except Exception:
-                pass
-            pdf_bytes = pdf_input.read()
-            if not pdf_bytes:
-                raise ValueError("⚠️ Uploaded PDF stream is empty. Try re-uploading the file.")
-            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    @timed("st_encoding")
+    def encode_query(self, new_paper_text): #Normalized query embedding (passages x dim for "maxsim")
+        if self.chunking is None:
+            # Truncate to 512 tokens
+            tokens = new_paper_text.split()[:512]
+            truncated_text = ' '.join(tokens)
 
+            # Generate embedding
+            new_embedding = self.st_model.encode(truncated_text, convert_to_numpy=True)
+            return normalize_rows(new_embedding)
+
+        # All passages in one batched forward pass
+        passages = normalize_rows(self.st_model.encode(self.split_passages(new_paper_text), convert_to_numpy=True,
+                                                       batch_size=self.batch_size))
+        if self.chunking == "mean":
+            return normalize_rows(passages.mean(axis=0))
+        if self.chunking == "max":
+            return normalize_rows(passages.max(axis=0))
+        return passages
+
+    @timed("st_encoding")
+    def encode_queries(self, texts): #encode_query for many papers in one batched encode: (rows, offsets), paper i owns rows[offsets[i]:offsets[i+1]]
+        if self.chunking is None:
+            passages = [' '.join(text.split()[:512]) for text in texts]
+            offsets = np.arange(len(texts) + 1)
+        else:
+            per_paper = [self.split_passages(text) for text in texts]
+            passages = [passage for paper in per_paper for passage in paper]
+            offsets = np.concatenate(([0], np.cumsum([len(paper) for paper in per_paper])))
+        if not passages:
+            return np.zeros((0, self.exact_index.dim), dtype=np.float32), offsets
+        rows = normalize_rows(self.st_model.encode(passages, convert_to_numpy=True, batch_size=self.batch_size))
+        if self.chunking == "mean":
+            rows = normalize_rows(np.add.reduceat(rows, offsets[:-1], axis=0) / np.diff(offsets)[:, None])
+        elif self.chunking == "max":
+            rows = normalize_rows(np.maximum.reduceat(rows, offsets[:-1], axis=0))
         else:
-            raise ValueError(f"Unsupported input type for extract_text_from_pdf: {type(pdf_input)}")
+            return rows, offsets
+        return rows, np.arange(len(texts) + 1)
 
-        text = "\n".join(page.get_text("text") for page in doc)
-        doc.close()
-        return text
+    def prepare_contexts(self, contexts): #embedding_for_context for many contexts in one batched encode
+        #Similarities and rankings are then computed per context by the same code as a single request: a
+        #batched GEMM rounds differently from the per-query product (~1e-7) and could reorder near-tied authors
+        pending = [context for context in contexts if context.st_query_embedding is None]
+        if not pending:
+            return
+        rows, offsets = self.encode_queries([self.preprocess_text(context.raw_text) for context in pending])
+        for i, context in enumerate(pending):
+            context.st_query_embedding = rows[offsets[i]:offsets[i + 1]] if self.chunking == "maxsim" else rows[offsets[i]]
+
+    def compute_similarities(self, new_paper_text): #Cosine similarity of the new paper against every corpus paper
+        query = self.encode_query(new_paper_text)
+        with stage("similarity"):
+            return self.exact_index.similarities(query)
+
+    def embedding_for_context(self, context): #Query embedding for a QueryContext, encoded once per request
+        if context.st_query_embedding is None:
+            # Cached across requests per paper + model + chunking settings
+            key_parts = (self.model_name, self.encoder_backend, self.chunking, self.chunk_words, MAX_CHUNKS)
+            context.st_query_embedding = context.cached(
+                "st_embedding", key_parts, lambda: self.encode_query(self.preprocess_text(context.raw_text)))
+        return context.st_query_embedding
+
+    def similarities_for_context(self, context): #Full similarity vector for a QueryContext, computed once per request
+        if context.st_similarities is None:
+            query = self.embedding_for_context(context)
+            with stage("similarity"):
+                context.st_similarities = self.exact_index.similarities(query)
+        return context.st_similarities
+
+    def shortlist_authors(self, query): #Author ids to score exactly: the centroid index's best authors, or the authors of the ANN shortlisted papers
+        if self.ann_index.kind == "centroid":
+            return self.ann_index.shortlist(query, self.author_shortlist)
+        return self.author_index.authors_of_docs(search_passages(self.ann_index, query, self.top_m))
+
+    @timed("similarity")  # ANN shortlist + exact scores of the shortlisted authors
+    def shortlist_ranking(self, query): #fusion.AuthorRanking of the shortlisted authors, scored exactly over all their papers
+        author_ids = self.shortlist_authors(query)
+        max_scores, avg_scores, counts = self.author_index.aggregate_subset(
+            author_ids, lambda ids: self.exact_index.similarities_for(query, ids))
+        return AuthorRanking(self.author_index.authors, max_scores, avg_scores, counts, ids=author_ids)
+
+    def rank_from_embedding(self, query, top_k=10): #Author rankings via the ANN index: shortlist papers, score their authors exactly
+        return self.shortlist_ranking(query).top(top_k)
 
+    def author_ranking_for_context(self, context): #Full-depth ranking for fusion; approximate backends rank their shortlist only
+        if self.ann_index is None:
+            return self.ranking_from_similarities(self.similarities_for_context(context))
+        return self.shortlist_ranking(self.embedding_for_context(context))
+
+    @timed("aggregation")
+    def ranking_from_similarities(self, similarities): #Every author's max/avg similarity as a fusion.AuthorRanking
+        max_scores, avg_scores, counts = self.author_index.aggregate(similarities)
+        return AuthorRanking(self.author_index.authors, max_scores, avg_scores, counts)
+
+    def rankings_for_context(self, context, top_k=10): #Author rankings for a QueryContext using the configured backend
+        if self.ann_index is None:
+            return self.rank_from_similarities(self.similarities_for_context(context), top_k)
+        return self.rank_from_embedding(self.embedding_for_context(context), top_k)
 
     def get_rankings(self, new_paper_text, top_k=10): #Get reviewer rankings for new paper(author, rank, max_score, avg_score, num_papers)
+        similarities = self.compute_similarities(new_paper_text)
+        return self.rank_from_similarities(similarities, top_k)
 
-        # Truncate to 512 tokens
-        tokens = new_paper_text.split()[:512]
-        truncated_text = ' '.join(tokens)
-        
-        # Generate embedding
-        new_embedding = self.st_model.encode(truncated_text, convert_to_numpy=True)
-        new_embedding_2d = new_embedding.reshape(1, -1)
-        
-        # Compute similarities
-        similarities = cosine_similarity(new_embedding_2d, self.embeddings)[0]
-        paper_similarities = {self.all_paths[i]: similarities[i] 
-                            for i in range(len(self.all_paths))}    
-        
-        # Aggregate by author (store both max and avg)
-        author_scores = {}
-        for author, papers in self.author_papers.items():
-            scores = [paper_similarities[paper] for paper in papers 
-                    if paper in paper_similarities]      
-            
-            if scores:
-                author_scores[author] = {
-                    'max': float(np.max(scores)),
-                    'avg': float(np.mean(scores)),
-                    'count': len(scores)
-                }
-        
-        # Rank by maximum similarity
-        ranked_authors = sorted(author_scores.items(), 
-                            key=lambda x: x[1]['max'], 
-                            reverse=True)
+    @timed("aggregation")
+    def rank_from_similarities(self, similarities, top_k=10): #Aggregate a paper similarity vector into author rankings
+        # Aggregate by author (both max and avg) and rank by maximum similarity
+        max_scores, avg_scores, counts = self.author_index.aggregate(similarities)
+        top = top_k_indices(max_scores, top_k)
         
         # Return as (author, rank, max_score, avg_score, num_papers)
-        rankings = [(author, rank+1, scores['max'], scores['avg'], scores['count']) 
-                for rank, (author, scores) in enumerate(ranked_authors[:top_k])]
+        rankings = [(self.author_index.authors[i], rank+1, float(max_scores[i]), float(avg_scores[i]), int(counts[i]))
+                for rank, i in enumerate(top)]
         
         return rankings
     
     def recommend_from_pdf(self, pdf_input, top_k=10):
-        # Extract and preprocess
-        raw_text = self.extract_text_from_pdf(pdf_input)
-        processed_text = self.preprocess_text(raw_text)
-        
+        #pdf_input may also be a QueryContext, in which case its text and similarities are reused
+        if isinstance(pdf_input, QueryContext):
+            context = pdf_input
+        else:
+            context = QueryContext(raw_text=self.extract_text_from_pdf(pdf_input))
+
         # Get rankings
-        rankings = self.get_rankings(processed_text, top_k)
-        
+        rankings = self.rankings_for_context(context, top_k)
+
         return rankings
+
+# Resolved default embeddings path, looked up on disk once per snapshot switch
+_DEFAULT_PATH = artifacts.VersionCache(lambda version: str(Path(default_embeddings_path()).resolve()))
+
+def _registry_key(embeddings_path):
+    if embeddings_path is None:
+        return _DEFAULT_PATH.get()
+    return str(Path(embeddings_path).resolve())
+
+def get_recommender(embeddings_path=None): #Process-wide ReviewerRecommender for embeddings_path, loaded on first use
+    # Recommenders are read-only after construction, so one instance is shared by all threads.
+    # The default path follows the current snapshot: a newly published one gets a new recommender
+    # (sharing the loaded model) and the previous snapshot's is dropped.
+    global _DEFAULT_KEY
+    key = _registry_key(embeddings_path)
+    recommender = _RECOMMENDERS.get(key)
+    if recommender is None:
+        with _REGISTRY_LOCK:
+            recommender = _RECOMMENDERS.get(key)
+            if recommender is None:
+                recommender = ReviewerRecommender(key)
+                _RECOMMENDERS[key] = recommender
+                if embeddings_path is None:
+                    if _DEFAULT_KEY is not None and _DEFAULT_KEY != key:
+                        _RECOMMENDERS.pop(_DEFAULT_KEY, None)
+                    _DEFAULT_KEY = key
+    return recommender
+
+def active_embeddings_path(embeddings_path=None): #File the registry currently serves for embeddings_path (after any reload)
+    recommender = _RECOMMENDERS.get(_registry_key(embeddings_path))
+    return recommender.embeddings_path if recommender is not None else Path(_registry_key(embeddings_path))
+
+def warmup(embeddings_path=None): #Load embeddings + model and run one encode so the first request is not cold
+    recommender = get_recommender(embeddings_path)
+    recommender.st_model.encode("warmup", convert_to_numpy=True)
+    return recommender
+
+def reload_recommender(new_embeddings_path=None, embeddings_path=None): #Atomically swap in a recommender built from new_embeddings_path
+    #Callers of get_recommender(embeddings_path) keep the old instance until the new one is fully loaded.
+    #The model is reused when the new file was built with the same model_name.
+    key = _registry_key(embeddings_path)
+    source = new_embeddings_path if new_embeddings_path is not None else key
+    current = _RECOMMENDERS.get(key)
+    settings = {} if current is None else {
+        'st_model': current.st_model, 'index_backend': current.index_backend, 'top_m': current.top_m,
+        'author_shortlist': current.author_shortlist, 'encoder_backend': current.encoder_backend,
+        'num_threads': current.num_threads,
+        'chunking': current.chunking, 'chunk_words': current.chunk_words, 'batch_size': current.batch_size,
+    }
+    recommender = ReviewerRecommender(source, **settings)
+    if current is not None and recommender.model_name != current.model_name:
+        recommender.st_model = load_model(recommender.model_name, recommender.encoder_backend,
+                                          None if recommender.encoder_backend == "torch" else recommender.num_threads)
+    with _REGISTRY_LOCK:
+        _RECOMMENDERS[key] = recommender
+    artifacts.invalidate()  # files may have been rewritten in place: cached file versions are stale
+    return recommender
+
 # Standalone function for RRF integration : rankings: List of (author, rank, score) tuples
 def get_sentence_transformer_rankings(pdf_path, embeddings_path=None, top_k=10):
-    if embeddings_path is None:
-        BASE_DIR = Path(__file__).parent
-        embeddings_path = BASE_DIR / "PKL_files" / "sentence_transformer_embeddings.pkl"
-    
-    recommender = ReviewerRecommender(embeddings_path)
-    return recommender.recommend_from_pdf(pdf_path, top_k)
+    recommender = get_recommender(embeddings_path)
+    rankings = recommender.recommend_from_pdf(pdf_path, top_k)
+    if isinstance(pdf_path, QueryContext):
+        pdf_path.st_rankings = rankings
+    return rankings
 if __name__ == "__main__":
     # Initialize recommender
     recommender = ReviewerRecommender(r'C:\Users\Hrida\OneDrive\Desktop\Applied AI\Assignment-2\Main\PKL_files\sentence_transformer_embeddings.pkl')
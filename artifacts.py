@@ -0,0 +1,155 @@
+#Artifact paths: where the BM25 index, embeddings and author profiles live, and which snapshot is current
+#A flat PKL_files directory (the original layout) still works. Once corpus_index.py has published a
+#snapshot, the files are read from <root>/snapshots/<version>/ and <root>/CURRENT names the live version;
+#publishing swaps CURRENT with one os.replace, so readers see either the old or the new snapshot, never a mix.
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+
+ARTIFACT_DIR = Path(os.environ.get("RR_ARTIFACT_DIR") or Path(__file__).parent / "PKL_files")
+CURRENT_FILE = "CURRENT"
+SNAPSHOTS_DIR = "snapshots"
+STAGING_PREFIX = ".staging-"
+KEEP_SNAPSHOTS = 3        # published versions kept on disk by prune_snapshots (the current one always is)
+# current_version() is served from memory: CURRENT is stat()ed at most this often to notice versions
+# published by other processes, and only re-read when it changed. set_current() in this process applies at once.
+VERSION_CHECK_SECONDS = 1.0
+
+# File names inside a snapshot (or the flat directory)
+BM25_SPARSE_INDEX = "bm25_sparse_index.pkl"
+BM25_RANK_INDEX = "bm25_index.pkl"
+BM25_TERM_FREQUENCIES = "bm25_term_frequencies.npz"
+BM25_DOC_AUTHORS = "bm25_doc_authors.pkl"
+BM25_DOC_TITLES = "bm25_doc_titles.pkl"
+EMBEDDINGS_PICKLE = "sentence_transformer_embeddings.pkl"
+EMBEDDINGS_STORE = "st_embedding_store"
+AUTHOR_PROFILES = "author_profiles.pkl"
+LEMMA_CACHE = "lemma_cache.pkl"
+MANIFEST = "manifest.json"
+
+
+def artifact_root(root=None):
+    return Path(root) if root is not None else ARTIFACT_DIR
+
+
+_CURRENT = {}       # CURRENT path -> (version, (inode, mtime, size) or None, monotonic time of the last check)
+_GENERATION = [0]   # bumped by invalidate(); VersionCache values from an older generation are recomputed
+
+
+def _read_current(pointer):
+    try:
+        with open(pointer, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_version(root=None): #Version named by CURRENT, or None for the flat layout (cached, see VERSION_CHECK_SECONDS)
+    pointer = artifact_root(root) / CURRENT_FILE
+    key = str(pointer)
+    now = time.monotonic()
+    cached = _CURRENT.get(key)
+    if cached is not None and now - cached[2] < VERSION_CHECK_SECONDS:
+        return cached[0]
+    try:
+        stat = os.stat(pointer)
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        signature = None
+    if cached is not None and cached[1] == signature:
+        version = cached[0]
+    else:
+        version = _read_current(pointer) if signature is not None else None
+    _CURRENT[key] = (version, signature, now)
+    return version
+
+
+def invalidate(root=None): #Forget the cached CURRENT of root and every VersionCache value (after an in-place swap)
+    _CURRENT.pop(str(artifact_root(root) / CURRENT_FILE), None)
+    _GENERATION[0] += 1
+
+
+class VersionCache:  # One value per artifact root and snapshot version, recomputed when the snapshot switches
+    #Published snapshots never change, so their values are kept until the next switch or invalidate().
+    #In the flat layout files can be rewritten in place: values are recomputed every VERSION_CHECK_SECONDS.
+    def __init__(self, compute):
+        self.compute = compute      # compute(version, *args)
+        self._entry = None          # (key, value, monotonic time computed)
+
+    def get(self, *args):
+        version = current_version()
+        key = (str(ARTIFACT_DIR), version, _GENERATION[0], args)
+        entry = self._entry
+        now = time.monotonic()
+        if entry is None or entry[0] != key or (version is None and now - entry[2] >= VERSION_CHECK_SECONDS):
+            entry = (key, self.compute(version, *args), now)
+            self._entry = entry
+        return entry[1]
+
+
+def snapshot_dir(version, root=None):
+    return artifact_root(root) / SNAPSHOTS_DIR / version
+
+
+def artifact_dir(version=None, root=None): #Directory holding the files of version (default: the current one)
+    version = version if version is not None else current_version(root)
+    return snapshot_dir(version, root) if version else artifact_root(root)
+
+
+def artifact_path(name, version=None, root=None): #Path of one artifact file in the current (or given) snapshot
+    return artifact_dir(version, root) / name
+
+
+def new_version(): #Sortable, unique-per-microsecond version name
+    return datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+
+
+def staging_dir(version, root=None): #Where a snapshot is written before publish(); invisible to readers
+    path = artifact_root(root) / SNAPSHOTS_DIR / f"{STAGING_PREFIX}{version}"
+    path.mkdir(parents=True, exist_ok=False)
+    return path
+
+
+def publish(staged, version, root=None): #Move a fully written staging dir into place, then point CURRENT at it
+    target = snapshot_dir(version, root)
+    os.replace(staged, target)
+    set_current(version, root)
+    return target
+
+
+def set_current(version, root=None): #Atomically point CURRENT at an already published version (also used to roll back)
+    pointer = artifact_root(root) / CURRENT_FILE
+    tmp = pointer.with_name(f"{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, pointer)
+    invalidate(root)
+
+
+def list_versions(root=None): #Published snapshot versions, oldest first
+    base = artifact_root(root) / SNAPSHOTS_DIR
+    if not base.is_dir():
+        return []
+    return sorted(p.name for p in base.iterdir() if p.is_dir() and not p.name.startswith(STAGING_PREFIX))
+
+
+def prune_snapshots(keep=KEEP_SNAPSHOTS, root=None, min_age=60): #Delete old versions and stale staging dirs; returns removed names
+    #Processes that still have an old snapshot memory-mapped keep working on POSIX; where the OS refuses
+    #to delete open files the directory is left for the next prune.
+    current = current_version(root)
+    versions = [v for v in list_versions(root) if v != current]
+    doomed = versions[:max(0, len(versions) - max(keep - 1, 0))]
+    base = artifact_root(root) / SNAPSHOTS_DIR
+    doomed += [p.name for p in base.glob(f"{STAGING_PREFIX}*") if time.time() - p.stat().st_mtime > min_age] if base.is_dir() else []
+    removed = []
+    for name in doomed:
+        try:
+            shutil.rmtree(base / name)
+            removed.append(name)
+        except OSError as e:
+            print(f"✗ Could not remove snapshot {name}: {e}")
+    return removed
@@ -0,0 +1,93 @@
+#Author index: integer author ids + CSR offsets into corpus doc ids, for vectorized author aggregation
+import numpy as np
+
+
+class AuthorIndex:  # Built once at load; aggregates a per-document score vector to every author in one pass
+    def __init__(self, authors, doc_ids, offsets):
+        self.authors = list(authors)                              # author id -> author name
+        self.author_ids = {author: i for i, author in enumerate(self.authors)}
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int64)       # corpus doc ids grouped by author
+        self.offsets = np.asarray(offsets, dtype=np.int64)       # author i owns doc_ids[offsets[i]:offsets[i+1]]
+        self.counts = np.diff(self.offsets)
+        self.doc_author_ids = None                                # doc id -> author id, single-author corpora only
+
+    @classmethod
+    def from_doc_authors(cls, doc_authors): #One author per corpus document (bm25_doc_authors.pkl); ids in first-seen order
+        authors = list(dict.fromkeys(doc_authors))
+        ids = {author: i for i, author in enumerate(authors)}
+        doc_author_ids = np.fromiter((ids[a] for a in doc_authors), dtype=np.int64, count=len(doc_authors))
+        doc_ids = np.argsort(doc_author_ids, kind="stable")
+        counts = np.bincount(doc_author_ids, minlength=len(authors))
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        index = cls(authors, doc_ids, offsets)
+        index.doc_author_ids = doc_author_ids
+        return index
+
+    @classmethod
+    def from_author_papers(cls, author_papers, all_paths): #author -> paper paths (embeddings pickle); unknown paths are skipped
+        path_ids = {path: i for i, path in enumerate(all_paths)}
+        authors, doc_ids, offsets = [], [], [0]
+        for author, papers in author_papers.items():
+            ids = [path_ids[p] for p in papers if p in path_ids]
+            if ids:  # authors without any indexed paper get no id, as before
+                authors.append(author)
+                doc_ids.extend(ids)
+                offsets.append(len(doc_ids))
+        return cls(authors, doc_ids, offsets)
+
+    def __len__(self):
+        return len(self.authors)
+
+    def aggregate(self, doc_scores): #Returns (max, mean, count) arrays indexed by author id
+        if len(self.authors) == 0:
+            empty = np.zeros(0)
+            return empty, empty, self.counts
+        scores = np.asarray(doc_scores)[self.doc_ids]
+        starts = self.offsets[:-1]
+        max_scores = np.maximum.reduceat(scores, starts)
+        avg_scores = np.add.reduceat(scores, starts, dtype=np.float64) / self.counts
+        return max_scores, avg_scores, self.counts
+
+    def authors_of_docs(self, doc_ids): #Author ids owning any of the given docs, ascending
+        entry_authors = np.repeat(np.arange(len(self.authors)), self.counts)
+        return np.unique(entry_authors[np.isin(self.doc_ids, doc_ids)])
+
+    def aggregate_subset(self, author_ids, score_docs): #(max, mean, count) for a few authors; score_docs(doc ids) -> scores
+        author_ids = np.asarray(author_ids, dtype=np.int64)
+        if len(author_ids) == 0:
+            empty = np.zeros(0)
+            return empty, empty, np.zeros(0, dtype=np.int64)
+        counts = self.counts[author_ids]
+        doc_ids = np.concatenate([self.doc_ids[self.offsets[a]:self.offsets[a + 1]] for a in author_ids])
+        scores = np.asarray(score_docs(doc_ids))
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        max_scores = np.maximum.reduceat(scores, starts)
+        avg_scores = np.add.reduceat(scores, starts, dtype=np.float64) / counts
+        return max_scores, avg_scores, counts
+
+    def author_doc_ids(self, author_ids): #Sorted corpus doc ids of the given authors
+        if len(author_ids) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate([self.doc_ids[self.offsets[a]:self.offsets[a + 1]] for a in author_ids]))
+
+
+def min_max_normalize(values): #Min-max normalize to [0, 1]; a constant vector maps to all ones
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return values
+    lo, hi = values.min(), values.max()
+    if hi == lo:
+        return np.ones_like(values)
+    return (values - lo) / (hi - lo)
+
+
+def top_k_indices(values, k): #Indices of the k largest values, descending; ties keep index order like a stable sort
+    values = np.asarray(values)
+    if k is None or k >= len(values):
+        return np.argsort(-values, kind="stable")
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    kth = np.partition(values, len(values) - k)[len(values) - k]
+    candidates = np.flatnonzero(values >= kth)
+    order = np.argsort(-values[candidates], kind="stable")
+    return candidates[order][:k]
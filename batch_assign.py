@@ -0,0 +1,129 @@
+#Batch reviewer assignment: rank reviewers for a whole submission set (directory or manifest of PDFs)
+#PDFs are extracted and cleaned in a process pool while the previous batch is scored. Each batch of
+#submissions is encoded with one batched st_model.encode; every submission then goes through the same
+#retrievers, fusion and re-ranking as get_reranked_recommendations and is streamed out as JSONL (one
+#line per submission, in input order).
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+BATCH_SIZE = 64       # submissions encoded together
+
+
+def collect_submissions(source): #[(submission id, pdf path)] from a directory, a .txt list or a .jsonl manifest
+    #.jsonl lines are {"path": ..., "id": ...} ("id" defaults to the file stem); relative paths are
+    #resolved against the manifest's directory
+    source = Path(source)
+    if source.is_dir():
+        return [(p.stem, str(p)) for p in sorted(source.rglob("*")) if p.suffix.lower() == ".pdf"]
+    submissions = []
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if source.suffix.lower() == ".jsonl":
+                entry = json.loads(line)
+                path = source.parent / entry["path"]
+                submissions.append((str(entry.get("id", path.stem)), str(path)))
+            else:
+                path = source.parent / line
+                submissions.append((path.stem, str(path)))
+    return submissions
+
+
+def prepare_submission(pdf_path): #Worker: (raw text, cleaned BM25 text, error); runs in the process pool
+    from pdf_extraction import extract_text
+    from preprocessing import clean_paper_text
+    try:
+        raw_text = extract_text(pdf_path)
+        return raw_text, clean_paper_text(raw_text), None
+    except Exception as e:
+        return None, None, f"{type(e).__name__}: {e}"
+
+
+def batch_contexts(raw_texts, cleaned_texts, content_hashes=None): #QueryContexts of a batch, with their query embeddings encoded together
+    #Only the encode is shared. Similarities, BM25, any other registered retriever, fusion and
+    #re-ranking then run per submission in get_reranked_recommendations, with the configured backends and settings
+    from query_context import QueryContext
+    from Sentence_Transformer import get_recommender
+    contexts = []
+    for i, (raw_text, cleaned_text) in enumerate(zip(raw_texts, cleaned_texts)):
+        context = QueryContext(raw_text=raw_text)
+        context._query_tokens = cleaned_text.split()   # cleaned in the extraction worker
+        if content_hashes is not None:
+            context._content_hash = content_hashes[i]   # e.g. of the PDF bytes, so cache keys match a PDF upload
+        contexts.append(context)
+    if contexts:
+        get_recommender().prepare_contexts(contexts)
+    return contexts
+
+
+def assign_batch(raw_texts, cleaned_texts, top_k=10, content_hashes=None, use_cache=True): #Re-ranked results for each submission of a batch, as get_reranked_recommendations returns them
+    from startup import load_reranking_module
+    reranking = load_reranking_module()
+    return [reranking.get_reranked_recommendations(context, top_k=top_k, use_cache=use_cache)
+            for context in batch_contexts(raw_texts, cleaned_texts, content_hashes)]
+
+
+def _to_json(value): # NumPy scalars in the result dicts -> plain Python numbers
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def run_batch(submissions, out, top_k=10, batch_size=BATCH_SIZE, workers=None): #Stream one JSONL line per submission to out
+    import startup
+    startup.warmup()
+    workers = workers or os.cpu_count() or 1
+    done = failed = 0
+    start = time.perf_counter()
+    batches = [submissions[i:i + batch_size] for i in range(0, len(submissions), batch_size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        submit = lambda batch: [pool.submit(prepare_submission, path) for _, path in batch]
+        pending = submit(batches[0]) if batches else []
+        for i, batch in enumerate(batches):
+            prepared = [future.result() for future in pending]
+            # Extraction of the next batch overlaps with scoring this one
+            pending = submit(batches[i + 1]) if i + 1 < len(batches) else []
+            ok = [j for j, (_, _, error) in enumerate(prepared) if error is None]
+            ranked = dict(zip(ok, assign_batch([prepared[j][0] for j in ok], [prepared[j][1] for j in ok], top_k=top_k)))
+            for j, (submission_id, path) in enumerate(batch):
+                record = {"id": submission_id, "path": path}
+                if j in ranked:
+                    record["results"] = ranked[j]
+                    done += 1
+                else:
+                    record["error"] = prepared[j][2]
+                    failed += 1
+                out.write(json.dumps(record, default=_to_json, ensure_ascii=False) + "\n")
+            out.flush()
+            elapsed = time.perf_counter() - start
+            print(f"   {done + failed}/{len(submissions)} submissions ({(done + failed) / elapsed:.1f}/s)", file=sys.stderr)
+    return done, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank reviewers for every PDF in a directory or manifest (.txt/.jsonl)")
+    parser.add_argument("source", help="directory of PDFs, a .txt list of paths or a .jsonl manifest")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPU count)")
+    args = parser.parse_args()
+
+    submissions = collect_submissions(args.source)
+    print(f"Assigning reviewers for {len(submissions)} submissions", file=sys.stderr)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        done, failed = run_batch(submissions, out, top_k=args.top_k, batch_size=args.batch_size, workers=args.workers)
+    finally:
+        if args.output:
+            out.close()
+    print(f"✓ {done} ranked, {failed} failed", file=sys.stderr)
@@ -0,0 +1,8 @@
+#Stage micro-benchmarks on seeded synthetic corpora (see README "Benchmarks"): python -m benchmarks run|compare|generate
+#The pipeline modules are flat scripts in the repository root; make them importable from anywhere.
+import sys
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+if str(REPO_DIR) not in sys.path:
+    sys.path.insert(0, str(REPO_DIR))
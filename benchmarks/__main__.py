@@ -0,0 +1,70 @@
+#CLI: python -m benchmarks run [--sizes 1k,10k] [--out baseline.json] [--csv curves.csv] [--plot curves.png]
+#     python -m benchmarks compare baseline.json current.json [--threshold 0.1]   (exit status 1 on a regression)
+#     python -m benchmarks generate --papers N --authors M --root DIR              (corpus only, e.g. to try the app)
+import argparse
+import json
+import sys
+
+from benchmarks import stages
+from benchmarks.synthetic import SIZES, ensure_corpus
+
+parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Stage micro-benchmarks on synthetic corpora")
+commands = parser.add_subparsers(dest="command", required=True)
+
+run_parser = commands.add_parser("run", help="time every stage at each corpus size")
+run_parser.add_argument("--sizes", default="1k,10k", help=f"comma-separated presets from {', '.join(SIZES)}")
+run_parser.add_argument("--stages", help=f"comma-separated subset of {', '.join(stages.STAGE_BENCHMARKS)}")
+run_parser.add_argument("--repeats", type=int, default=stages.REPEATS)
+run_parser.add_argument("--seed", type=int, default=0)
+run_parser.add_argument("--work-dir", default=stages.WORK_DIR, help="generated corpora (default: .bench_cache, or $RR_BENCH_DIR)")
+run_parser.add_argument("--out", help="write the JSON report here (a baseline for compare)")
+run_parser.add_argument("--csv", help="write the scaling curves as CSV")
+run_parser.add_argument("--plot", help="write a log-log plot of the scaling curves (needs matplotlib)")
+
+compare_parser = commands.add_parser("compare", help="compare two JSON reports")
+compare_parser.add_argument("baseline")
+compare_parser.add_argument("current")
+compare_parser.add_argument("--threshold", type=float, default=stages.REGRESSION_THRESHOLD)
+
+generate_parser = commands.add_parser("generate", help="publish a synthetic corpus as a snapshot under --root")
+generate_parser.add_argument("--papers", type=int, required=True)
+generate_parser.add_argument("--authors", type=int, required=True)
+generate_parser.add_argument("--root", required=True)
+generate_parser.add_argument("--seed", type=int, default=0)
+generate_parser.add_argument("--store", choices=("float16", "int8", "pickle"), default="float16")
+
+args = parser.parse_args()
+
+if args.command == "run":
+    sizes = [label.strip() for label in args.sizes.split(",") if label.strip()]
+    unknown = [label for label in sizes if label not in SIZES]
+    if unknown:
+        sys.exit(f"Unknown sizes: {', '.join(unknown)} (choose from {', '.join(SIZES)})")
+    selected = set(args.stages.split(",")) if args.stages else None
+    report = stages.run(sizes, args.work_dir, args.repeats, args.seed, selected)
+    stages.print_curves(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        print(f"✓ Report written to {args.out}")
+    if args.csv:
+        stages.write_curves_csv(report, args.csv)
+    if args.plot:
+        stages.plot_curves(report, args.plot)
+
+elif args.command == "compare":
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+    print(f"baseline {baseline['meta'].get('commit')} ({baseline['meta']['created']}) -> "
+          f"current {current['meta'].get('commit')} ({current['meta']['created']})")
+    rows = stages.compare(baseline, current, threshold=args.threshold)
+    stages.print_comparison(rows)
+    if any(verdict == "regression" for *_, verdict in rows):
+        sys.exit(1)
+
+else:
+    version = ensure_corpus(args.root, args.papers, args.authors, seed=args.seed,
+                            store_dtype=None if args.store == "pickle" else args.store)
+    print(f"✓ Synthetic corpus {version} under {args.root}")
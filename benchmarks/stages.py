@@ -0,0 +1,271 @@
+#Stage micro-benchmarks: median/p90/min wall time of each pipeline stage on a synthetic corpus of each size
+#Every size is generated once under the work directory (as a snapshot, see synthetic.ensure_corpus) and
+#reused while its parameters match. Stage timers from instrumentation.py are switched off so only the
+#stage itself is measured. The query embedding comes from the stub encoder and encoding is not timed.
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks import REPO_DIR
+from benchmarks.stub_encoder import StubEncoder
+from benchmarks.synthetic import SIZES, VOCAB_SIZE, corpus_params, ensure_corpus, make_vocabulary, synthetic_paper
+
+WORK_DIR = Path(os.environ.get("RR_BENCH_DIR") or REPO_DIR / ".bench_cache")
+REPEATS = 20              # timed calls per stage
+WARMUP = 2                # untimed calls first (caches, page faults)
+QUERY_WORDS = 4000        # words in the synthetic submission
+RERANK_CANDIDATES = 40    # fused authors handed to rerank_results (both retrievers' RETRIEVAL_DEPTH)
+REGRESSION_THRESHOLD = 0.10   # compare(): relative slowdown of the median that counts as a regression
+MIN_DELTA_MS = 0.05       # compare(): differences below this are noise whatever the ratio
+RECALL_K = 10             # two-stage author retrieval: recall of the exhaustive top RECALL_K authors
+RECALL_QUERIES = 50       # perturbed corpus papers used as recall queries (plus the synthetic submission)
+RECALL_SHORTLISTS = (0.02, 0.05, 0.1, 0.2, 0.5)   # shortlist sizes measured, as fractions of the author count
+
+
+def measure(fn, repeats=REPEATS, warmup=WARMUP): #{"median_ms", "p90_ms", "min_ms", "repeats"} of fn()
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {"median_ms": round(statistics.median(times), 4), "p90_ms": round(times[int(0.9 * (len(times) - 1))], 4),
+            "min_ms": round(times[0], 4), "repeats": repeats}
+
+
+class Fixture:  # Loaded modules, indexes and one query's intermediate results for one corpus size
+    def __init__(self, root, seed=0, vocab_size=VOCAB_SIZE):
+        import artifacts
+        artifacts.ARTIFACT_DIR = Path(root)   # every loader resolves paths through artifacts at call time
+        import bm25_query
+        import startup
+        from RRF_Ensemble import RETRIEVAL_DEPTH, compute_rrf_scores, fuse_rankings
+        from Sentence_Transformer import ReviewerRecommender, default_embeddings_path
+
+        self.bm25_query = bm25_query
+        self.reranking = startup.load_reranking_module()
+        self.recommender = ReviewerRecommender(default_embeddings_path(), st_model=StubEncoder(seed=seed))
+        bm25_query.warmup()
+        self.reranking.get_author_profiles()
+
+        rng = np.random.default_rng(seed + 1)
+        self.raw_text, self.query_tokens = synthetic_paper(rng, make_vocabulary(vocab_size), QUERY_WORDS)
+        self.doc_scores = bm25_query.bm25_scores_for_query_tokens(self.query_tokens)
+        self.query = self.recommender.encode_query(self.recommender.preprocess_text(self.raw_text))
+        self.similarities = self.recommender.exact_index.similarities(self.query)
+        self.bm25_rankings = bm25_query.rank_authors_from_doc_scores(self.doc_scores, RETRIEVAL_DEPTH)
+        self.st_rankings = self.recommender.rank_from_similarities(self.similarities, RETRIEVAL_DEPTH)
+        self.rankings = {"BM25": self.bm25_rankings, "SentenceTransformer": self.st_rankings}
+        self.rrf_results = fuse_rankings(self.rankings, top_k=RERANK_CANDIDATES)
+        # Full-depth rankings as fused by rrf_ensemble, and every author re-ranked (RERANK_CANDIDATES = None)
+        self.author_rankings = {"BM25": bm25_query.author_ranking_from_doc_scores(self.doc_scores),
+                                "SentenceTransformer": self.recommender.ranking_from_similarities(self.similarities)}
+        self.all_rankings = {name: ranking.top() for name, ranking in self.author_rankings.items()}
+        self.all_rrf_results = [(author, score, {}) for author, score in sorted(
+            compute_rrf_scores(self.all_rankings).items(), key=lambda item: item[1], reverse=True)]
+        self._two_stage = None
+
+    @property
+    def two_stage(self): #Copy of the recommender using the author centroid index, built on first use
+        if self._two_stage is None:
+            import copy
+            from vector_index import AuthorCentroidIndex
+            recommender = copy.copy(self.recommender)
+            recommender.index_backend = "centroid"
+            recommender.ann_index = AuthorCentroidIndex.build(recommender.exact_index, recommender.author_index)
+            self._two_stage = recommender
+        return self._two_stage
+
+    def two_stage_recall(self, k=RECALL_K, n_queries=RECALL_QUERIES, fractions=RECALL_SHORTLISTS): #{"k", "authors", "queries", "configured_shortlist", "recall": [[shortlist, author recall], ...]}
+        #A shortlist of every author is exhaustive (recall 1 by construction), so only sizes from k up to
+        #below the author count are measured: the fractions of it, plus the configured AUTHOR_SHORTLIST
+        from vector_index import author_recall_at_k, sample_queries
+        recommender = self.two_stage
+        n_authors = len(recommender.author_index)
+        queries = [self.query, *sample_queries(recommender.exact_index.vectors, n_queries)]
+        sizes = {max(k, round(n_authors * fraction)) for fraction in fractions} | {recommender.author_shortlist}
+        recall = [[n, round(author_recall_at_k(recommender.ann_index, recommender.exact_index, recommender.author_index,
+                                               queries, k, n), 4)]
+                  for n in sorted(sizes) if n < n_authors]
+        return {"k": k, "authors": n_authors, "queries": len(queries), "configured_shortlist": recommender.author_shortlist,
+                "recall": recall}
+
+
+def _clean(fx):
+    from preprocessing import clean_paper_text
+    return lambda: clean_paper_text(fx.raw_text)
+
+
+def _rrf(fx):
+    from RRF_Ensemble import compute_rrf_scores
+    return lambda: compute_rrf_scores(fx.rankings)
+
+
+def _fusion(fx):
+    from fusion import AuthorRanking, fuse
+    def call():
+        # Fresh rankings each call, so their rank arrays are computed inside the timing as in a request
+        rankings = {name: AuthorRanking(r.authors, r.scores, r.avg_scores, r.counts) for name, r in fx.author_rankings.items()}
+        return fuse(rankings, top_k=RERANK_CANDIDATES)
+    return call
+
+
+# Stage name -> fixture -> zero-argument call to time
+STAGE_BENCHMARKS = {
+    "clean_paper_text": _clean,
+    "bm25_scores": lambda fx: lambda: fx.bm25_query.bm25_scores_for_query_tokens(fx.query_tokens),
+    "bm25_aggregation": lambda fx: lambda: fx.bm25_query.aggregate_doc_scores_to_authors(fx.doc_scores),
+    "st_similarity": lambda fx: lambda: fx.recommender.exact_index.similarities(fx.query),
+    "st_aggregation": lambda fx: lambda: fx.recommender.rank_from_similarities(fx.similarities, len(fx.st_rankings)),
+    "rrf": _rrf,
+    "fusion_full_depth": _fusion,
+    "st_two_stage": lambda fx: lambda: fx.two_stage.shortlist_ranking(fx.query),
+    "rerank": lambda fx: lambda: fx.reranking.rerank_results(fx.rrf_results, fx.bm25_rankings, fx.st_rankings, top_k=10),
+    "rerank_all_authors": lambda fx: lambda: fx.reranking.rerank_results(
+        fx.all_rrf_results, fx.all_rankings["BM25"], fx.all_rankings["SentenceTransformer"], top_k=10),
+}
+
+
+def run_size(label, n_papers, n_authors, work_dir=WORK_DIR, repeats=REPEATS, seed=0, stages=None): #{"papers", "authors", "corpus", "stages": {stage: timings}[, "recall"]}
+    import instrumentation
+    root = Path(work_dir) / label
+    root.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    ensure_corpus(root, n_papers, n_authors, seed=seed)
+    generate_seconds = time.perf_counter() - start
+    fx = Fixture(root, seed)
+    results = {}
+    enabled, instrumentation.INSTRUMENTATION_ENABLED = instrumentation.INSTRUMENTATION_ENABLED, False
+    try:
+        for name, make_call in STAGE_BENCHMARKS.items():
+            if stages and name not in stages:
+                continue
+            try:
+                results[name] = measure(make_call(fx), repeats)
+            except LookupError as e:   # clean_paper_text without the NLTK data
+                results[name] = {"skipped": str(e)}
+    finally:
+        instrumentation.INSTRUMENTATION_ENABLED = enabled
+    report = {"papers": n_papers, "authors": n_authors, "corpus": corpus_params(n_papers, n_authors, seed=seed),
+              "setup_seconds": round(generate_seconds, 2), "stages": results}
+    if "st_two_stage" in results:
+        report["recall"] = fx.two_stage_recall()
+    return report
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(sizes=("1k", "10k"), work_dir=WORK_DIR, repeats=REPEATS, seed=0, stages=None): #Baseline report: {"meta", "sizes": {label: run_size(...)}}
+    report = {"meta": {"created": datetime.now().isoformat(timespec="seconds"), "commit": _git_commit(),
+                       "python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+                       "cpu_count": os.cpu_count(), "repeats": repeats, "seed": seed},
+              "sizes": {}}
+    for label in sizes:
+        n_papers, n_authors = SIZES[label]
+        print(f"▶ {label}: {n_papers} papers, {n_authors} authors")
+        report["sizes"][label] = run_size(label, n_papers, n_authors, work_dir, repeats, seed, stages)
+    return report
+
+
+def scaling_curves(report): #{stage: [(papers, median ms), ...]} ordered by corpus size
+    curves = {}
+    for size in sorted(report["sizes"].values(), key=lambda s: s["papers"]):
+        for name, timing in size["stages"].items():
+            if "median_ms" in timing:
+                curves.setdefault(name, []).append((size["papers"], timing["median_ms"]))
+    return curves
+
+
+def scaling_exponent(points): #Slope of log(time) over log(papers) between the smallest and largest size (1.0 = linear)
+    if len(points) < 2 or points[0][1] <= 0 or points[-1][1] <= 0:
+        return None
+    (n0, t0), (n1, t1) = points[0], points[-1]
+    return float(np.log(t1 / t0) / np.log(n1 / n0))
+
+
+def print_curves(report):
+    curves = scaling_curves(report)
+    labels = sorted(report["sizes"], key=lambda label: report["sizes"][label]["papers"])
+    print(f"{'stage':<18}" + "".join(f"{label:>12}" for label in labels) + f"{'exponent':>10}")
+    for name, points in curves.items():
+        exponent = scaling_exponent(points)
+        print(f"{name:<18}" + "".join(f"{ms:>10.3f}ms" for _, ms in points)
+              + (f"{exponent:>10.2f}" if exponent is not None else f"{'-':>10}"))
+    for name, timing in next(iter(report["sizes"].values()), {}).get("stages", {}).items():
+        if "skipped" in timing:
+            print(f"{name:<18} skipped: {timing['skipped']}")
+    for label in labels:
+        recall = report["sizes"][label].get("recall")
+        if recall:
+            measured = ", ".join(f"{n}: {value:.4f}" for n, value in recall["recall"]) or "none below the author count"
+            configured = recall["configured_shortlist"]
+            note = " (exhaustive)" if configured >= recall["authors"] else ""
+            print(f"{label}: two-stage author recall@{recall['k']} vs exhaustive by shortlist size [{measured}] "
+                  f"of {recall['authors']} authors, {recall['queries']} queries; configured {configured}{note}")
+
+
+def write_curves_csv(report, path): #stage,papers,authors,median_ms,p90_ms,min_ms rows
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("stage,papers,authors,median_ms,p90_ms,min_ms\n")
+        for size in sorted(report["sizes"].values(), key=lambda s: s["papers"]):
+            for name, t in size["stages"].items():
+                if "median_ms" in t:
+                    f.write(f"{name},{size['papers']},{size['authors']},{t['median_ms']},{t['p90_ms']},{t['min_ms']}\n")
+
+
+def plot_curves(report, path): #Log-log scaling plot; needs matplotlib (optional dependency)
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(7, 5))
+    for name, points in scaling_curves(report).items():
+        ax.plot([n for n, _ in points], [ms for _, ms in points], marker="o", label=name)
+    ax.set(xscale="log", yscale="log", xlabel="papers", ylabel="median ms per call", title="Stage scaling")
+    ax.legend(fontsize="small")
+    fig.savefig(path, dpi=120, bbox_inches="tight")
+    plt.close(fig)
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD, min_delta_ms=MIN_DELTA_MS): #[(size, stage, base ms, current ms, ratio, verdict)] for stages in both reports
+    rows = []
+    for label, size in current["sizes"].items():
+        base_size = baseline["sizes"].get(label)
+        if base_size is None:
+            continue
+        if base_size.get("corpus") != size.get("corpus"):
+            print(f"⚠️ {label}: corpus parameters differ from the baseline's")
+        for name, timing in size["stages"].items():
+            base = base_size["stages"].get(name, {})
+            if "median_ms" not in timing or "median_ms" not in base:
+                continue
+            old, new = base["median_ms"], timing["median_ms"]
+            ratio = new / old if old > 0 else float("inf")
+            verdict = "ok"
+            if abs(new - old) >= min_delta_ms:
+                if ratio > 1 + threshold:
+                    verdict = "regression"
+                elif ratio < 1 - threshold:
+                    verdict = "improvement"
+            rows.append((label, name, old, new, ratio, verdict))
+    return rows
+
+
+def print_comparison(rows):
+    print(f"{'size':<6}{'stage':<18}{'baseline':>12}{'current':>12}{'ratio':>8}  verdict")
+    for label, name, old, new, ratio, verdict in rows:
+        marker = {"regression": "✗", "improvement": "✓"}.get(verdict, " ")
+        print(f"{label:<6}{name:<18}{old:>10.3f}ms{new:>10.3f}ms{ratio:>8.2f}  {marker} {verdict}")
@@ -0,0 +1,27 @@
+#Offline stand-in for SentenceTransformer: hashed bag-of-words vectors, no torch and no model download
+#Only the call interface matches (encode(), max_seq_length); the vectors are deterministic across processes
+#but carry no meaning, and its speed says nothing about the real model's.
+import zlib
+
+import numpy as np
+
+from benchmarks.synthetic import EMBED_DIM
+
+
+class StubEncoder:  # encode(str) -> (dim,), encode([str, ...]) -> (n, dim), like SentenceTransformer with convert_to_numpy
+    def __init__(self, dim=EMBED_DIM, buckets=1 << 14, seed=0, max_seq_length=256):
+        self.dim = dim
+        self.max_seq_length = max_seq_length
+        self.buckets = buckets
+        self.table = np.random.default_rng(seed).standard_normal((buckets, dim)).astype(np.float32)
+
+    def _encode_one(self, text):
+        ids = [zlib.crc32(word.encode("utf-8")) % self.buckets for word in text.split()[:self.max_seq_length]]
+        if not ids:
+            return np.zeros(self.dim, dtype=np.float32)
+        return self.table[ids].mean(axis=0)
+
+    def encode(self, sentences, convert_to_numpy=True, batch_size=32, **kwargs):
+        if isinstance(sentences, str):
+            return self._encode_one(sentences)
+        return np.stack([self._encode_one(text) for text in sentences]) if sentences else np.zeros((0, self.dim), np.float32)
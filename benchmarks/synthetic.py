@@ -0,0 +1,150 @@
+#Seeded synthetic corpus in the formats bm25_query, ReviewerRecommender and Re-Ranking load
+#Every author gets a topic (a slice of the vocabulary); a paper mixes Zipf-distributed background terms
+#with its author's topic terms, and its embedding is the author's topic vector plus noise. Papers per
+#author are Zipf-distributed, every author has at least one. The corpus is assembled as a
+#corpus_index.CorpusIndex and published as a regular snapshot, so nothing here writes artifact files itself.
+import json
+
+import numpy as np
+from scipy import sparse
+
+import artifacts
+from corpus_index import CorpusIndex
+from embedding_store import encode_rows
+
+# Preset sizes: label -> (papers, authors)
+SIZES = {
+    "1k": (1_000, 100),
+    "10k": (10_000, 1_000),
+    "100k": (100_000, 10_000),
+    "1m": (1_000_000, 100_000),
+}
+VOCAB_SIZE = 50_000
+TERMS_PER_DOC = 120       # mean distinct terms per paper
+TOPIC_TERMS = 300         # vocabulary slice an author's papers favour
+TOPIC_SHARE = 0.3         # fraction of a paper's terms drawn from its author's topic
+EMBED_DIM = 384
+EMBED_NOISE = 0.8         # paper embedding = topic vector + EMBED_NOISE * N(0, I), before normalization
+CHUNK_PAPERS = 50_000     # papers generated per block, bounds peak memory at the 1M size
+STUB_MODEL_NAME = "benchmark-stub-encoder"
+INSTITUTIONS = ["IIT", "IISc", "IIIT", "NIT", "BITS", "VIT", "University", "Research Lab", "Other"]
+SYLLABLES = ["ka", "lo", "mi", "ren", "tus", "vo", "zan", "pel", "dor", "qui", "sat", "nev", "bri", "gol",
+             "hux", "jem", "ful", "ter", "wis", "cor", "ban", "dex", "fin", "gra", "lum", "mor", "nol",
+             "pra", "sil", "tov", "ung", "yar", "zel", "cre", "dru", "fla", "gni", "plo", "sku", "tri"]
+
+
+def make_vocabulary(size=VOCAB_SIZE): #size distinct lowercase pseudo-words, the same for every seed
+    digits = 1
+    while len(SYLLABLES) ** digits < size:
+        digits += 1
+    words = []
+    for i in range(size):
+        parts = []
+        for _ in range(max(digits, 2)):
+            i, d = divmod(i, len(SYLLABLES))
+            parts.append(SYLLABLES[d])
+        words.append("".join(parts))
+    return words
+
+
+def corpus_params(n_papers, n_authors, seed=0, vocab_size=VOCAB_SIZE, terms_per_doc=TERMS_PER_DOC, dim=EMBED_DIM,
+                  store_dtype="float16"): #Everything the generated corpus depends on (recorded in its manifest)
+    return {"papers": n_papers, "authors": n_authors, "seed": seed, "vocab_size": vocab_size,
+            "terms_per_doc": terms_per_doc, "dim": dim, "store_dtype": store_dtype}
+
+
+def _zipf_probabilities(n, exponent=1.07):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _term_counts(rng, paper_author, topic_start, vocab_size, terms_per_doc): #papers x vocab count matrix, built per block
+    background = _zipf_probabilities(vocab_size)
+    blocks = []
+    for start in range(0, len(paper_author), CHUNK_PAPERS):
+        authors = paper_author[start:start + CHUNK_PAPERS]
+        lengths = np.maximum(rng.poisson(terms_per_doc, len(authors)), 10)
+        rows = np.repeat(np.arange(len(authors)), lengths)
+        terms = rng.choice(vocab_size, size=len(rows), p=background)
+        topical = rng.random(len(rows)) < TOPIC_SHARE
+        terms[topical] = topic_start[authors[rows[topical]]] + rng.integers(0, TOPIC_TERMS, topical.sum())
+        counts = rng.geometric(0.6, len(rows)).astype(np.float64)
+        # Duplicate (paper, term) draws are summed by the conversion
+        blocks.append(sparse.csr_matrix((counts, (rows, terms)), shape=(len(authors), vocab_size)))
+    return sparse.vstack(blocks, format="csr")
+
+
+def _embedding_rows(rng, paper_author, n_authors, dim, store_dtype): #(stored rows, scales) of topic vector + noise embeddings
+    topics = rng.standard_normal((n_authors, dim)).astype(np.float32)
+    rows, scales = [], []
+    for start in range(0, len(paper_author), CHUNK_PAPERS):
+        authors = paper_author[start:start + CHUNK_PAPERS]
+        vectors = topics[authors] + EMBED_NOISE * rng.standard_normal((len(authors), dim)).astype(np.float32)
+        if store_dtype is None:
+            rows.append(vectors)
+            continue
+        block, block_scales = encode_rows(vectors, store_dtype)
+        rows.append(block)
+        if block_scales is not None:
+            scales.append(block_scales)
+    return np.concatenate(rows), (np.concatenate(scales) if scales else None)
+
+
+def generate(n_papers, n_authors, seed=0, vocab_size=VOCAB_SIZE, terms_per_doc=TERMS_PER_DOC, dim=EMBED_DIM,
+             store_dtype="float16"): #CorpusIndex of a synthetic corpus; store_dtype None writes the embeddings pickle
+    if not 0 < n_authors <= n_papers:
+        raise ValueError(f"Need 0 < authors <= papers, got {n_authors} authors for {n_papers} papers")
+    rng = np.random.default_rng(seed)
+    words = make_vocabulary(vocab_size)
+
+    # Papers per author: one each, the rest Zipf-distributed over a shuffled author order
+    share = _zipf_probabilities(n_authors, exponent=0.8)[rng.permutation(n_authors)]
+    papers_per_author = 1 + rng.multinomial(n_papers - n_authors, share)
+    paper_author = np.repeat(np.arange(n_authors), papers_per_author)
+    topic_start = rng.integers(0, vocab_size - TOPIC_TERMS, n_authors)
+
+    tf = _term_counts(rng, paper_author, topic_start, vocab_size, terms_per_doc)
+    rows, scales = _embedding_rows(rng, paper_author, n_authors, dim, store_dtype)
+
+    authors = [f"Author {i:06d}" for i in range(n_authors)]
+    doc_authors = [authors[a] for a in paper_author]
+    all_paths = [f"{authors[a]}/paper_{i:07d}.pdf" for i, a in enumerate(paper_author)]
+    doc_titles = [f"Synthetic paper {i}" for i in range(n_papers)]
+    author_papers = {author: [] for author in authors}
+    for author, path in zip(doc_authors, all_paths):
+        author_papers[author].append(path)
+
+    institutions = rng.choice(len(INSTITUTIONS), n_authors)
+    latest_years = rng.integers(2005, 2026, n_authors)
+    recent = rng.binomial(papers_per_author, 0.3)
+    profiles = {author: {"num_papers": int(papers_per_author[i]), "primary_institution": INSTITUTIONS[institutions[i]],
+                         "recent_papers": int(recent[i]), "latest_year": int(latest_years[i])}
+                for i, author in enumerate(authors)}
+    return CorpusIndex(tf, {word: i for i, word in enumerate(words)}, doc_authors, doc_titles, rows, scales, all_paths,
+                       author_papers, STUB_MODEL_NAME, profiles, store_dtype=store_dtype)
+
+
+def ensure_corpus(root, n_papers, n_authors, **options): #Current snapshot version under root, generating and publishing it if its parameters differ
+    params = corpus_params(n_papers, n_authors, **options)
+    version = artifacts.current_version(root)
+    if version is not None:
+        manifest_path = artifacts.artifact_path(artifacts.MANIFEST, version, root)
+        with open(manifest_path, encoding="utf-8") as f:
+            if json.load(f).get("changes") == [{"op": "synthetic", **params}]:
+                return version
+    index = generate(n_papers, n_authors, **options)
+    index.changes = [{"op": "synthetic", **params}]
+    return index.publish(root=root)
+
+
+def synthetic_paper(rng, words, n_words=4000): #(raw text of a submission, its vocabulary tokens) on a random topic
+    topic_start = rng.integers(0, len(words) - TOPIC_TERMS)
+    background = rng.choice(len(words), n_words, p=_zipf_probabilities(len(words)))
+    topical = rng.random(n_words) < TOPIC_SHARE
+    background[topical] = topic_start + rng.integers(0, TOPIC_TERMS, topical.sum())
+    tokens = [words[i] for i in background]
+    lines = [" ".join(tokens[i:i + 12]) for i in range(0, len(tokens), 12)]
+    quarter = len(lines) // 4
+    text = "\n".join(["A Synthetic Submission", "Abstract", *lines[:quarter], "1 Introduction", *lines[quarter:],
+                      "References", "[1] A. Author. Some cited work. Journal of Examples, 2020."])
+    return text, tokens
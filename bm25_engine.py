@@ -0,0 +1,285 @@
+#Sparse BM25 engine: corpus stored as a CSC term-document weight matrix, a query is one sparse product
+import pickle
+import sys
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+from author_index import top_k_indices
+
+# Scores agree with rank_bm25 to this relative tolerance (of the query's largest score), not bit for bit:
+# each posting weight is computed exactly as BM25Okapi does, but compile_query sums a repeated query term
+# once, multiplied by its count, where get_scores adds it once per occurrence. Long queries drift by ~1e-11
+# relative, so documents rank_bm25 scores as exact ties may come out in a different order.
+SCORE_TOLERANCE = 1e-9
+
+
+def okapi_idf(df, corpus_size, epsilon=0.25): #BM25Okapi IDF from document frequencies, with rank_bm25's floor
+    #Negative IDFs (terms in more than half the documents) are raised to epsilon x the average IDF;
+    #the average only counts terms that occur somewhere, like rank_bm25's vocabulary
+    df = np.asarray(df, dtype=np.float64)
+    idf = np.log(corpus_size - df + 0.5) - np.log(df + 0.5)
+    present = df > 0
+    average_idf = float(idf[present].mean()) if present.any() else 0.0
+    idf[present & (idf < 0)] = epsilon * average_idf
+    return idf
+
+
+def rank_bm25_counts(bm25): #(docs x terms count matrix, term -> column) from a rank_bm25 index's doc_freqs
+    vocabulary = {term: i for i, term in enumerate(bm25.idf)}
+    indptr = [0]
+    indices, data = [], []
+    for frequencies in bm25.doc_freqs:
+        for term, freq in frequencies.items():
+            indices.append(vocabulary[term])
+            data.append(freq)
+        indptr.append(len(indices))
+    tf = sparse.csr_matrix(
+        (np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(bm25.doc_freqs), len(vocabulary)),
+    )
+    tf.sort_indices()
+    return tf, vocabulary
+
+
+class SparseBM25:  # Okapi BM25 with the same IDF floor and length norms as rank_bm25.BM25Okapi
+    def __init__(self, weights, vocabulary, idf, doc_len, avgdl, k1=1.5, b=0.75, epsilon=0.25):
+        # weights[d, t] = idf[t] * tf*(k1+1) / (tf + k1*(1-b+b*len(d)/avgdl)), precomputed per posting
+        self.weights = sparse.csc_matrix(weights)
+        self.weights.sort_indices()               # postings per term in doc-id order
+        self.vocabulary = vocabulary              # term -> column id
+        self.idf = np.asarray(idf, dtype=np.float64)
+        self.doc_len = np.asarray(doc_len)
+        self.avgdl = avgdl
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.corpus_size = self.weights.shape[0]
+
+    @classmethod
+    def from_term_frequencies(cls, tf, vocabulary, idf, doc_len, avgdl, k1=1.5, b=0.75, epsilon=0.25): #tf: docs x terms counts
+        tf = sparse.csr_matrix(tf, dtype=np.float64)
+        doc_len = np.asarray(doc_len)
+        idf = np.asarray(idf, dtype=np.float64)
+        # Same expression order as BM25Okapi.get_scores so each term contribution is bit-identical
+        length_norm = k1 * (1 - b + b * doc_len / avgdl)
+        rows = np.repeat(np.arange(tf.shape[0]), np.diff(tf.indptr))
+        data = idf[tf.indices] * (tf.data * (k1 + 1) / (tf.data + length_norm[rows]))
+        weights = sparse.csr_matrix((data, tf.indices, tf.indptr), shape=tf.shape)
+        return cls(weights, vocabulary, idf, doc_len, avgdl, k1=k1, b=b, epsilon=epsilon)
+
+    @classmethod
+    def from_counts(cls, tf, vocabulary, k1=1.5, b=0.75, epsilon=0.25): #Build from docs x terms counts alone (IDF, lengths derived)
+        tf = sparse.csr_matrix(tf, dtype=np.float64)
+        tf.sort_indices()
+        doc_len = np.asarray(tf.sum(axis=1)).ravel().astype(np.int64)
+        df = np.bincount(tf.indices, minlength=tf.shape[1])
+        avgdl = doc_len.sum() / tf.shape[0] if tf.shape[0] else 0.0
+        return cls.from_term_frequencies(tf, vocabulary, okapi_idf(df, tf.shape[0], epsilon), doc_len, avgdl,
+                                         k1=k1, b=b, epsilon=epsilon)
+
+    @classmethod
+    def from_rank_bm25(cls, bm25): #Convert a pickled rank_bm25.BM25Okapi index
+        if type(bm25).__name__ != "BM25Okapi":
+            raise ValueError(f"Only BM25Okapi indexes can be converted, got {type(bm25).__name__}")
+        tf, vocabulary = rank_bm25_counts(bm25)
+        idf = np.fromiter(bm25.idf.values(), dtype=np.float64, count=len(vocabulary))
+        return cls.from_term_frequencies(tf, vocabulary, idf, bm25.doc_len, bm25.avgdl,
+                                         k1=bm25.k1, b=bm25.b, epsilon=bm25.epsilon)
+
+    def term_counts(self): #docs x terms count matrix recovered from the posting weights (inverse of from_term_frequencies)
+        #Only needed for indexes saved without their counts; counts are integers, so rounding removes float error
+        weights = sparse.csr_matrix(self.weights)
+        if np.any(self.idf[weights.indices] == 0):
+            raise ValueError("Cannot recover term counts for terms with zero IDF")
+        length_norm = self.k1 * (1 - self.b + self.b * self.doc_len / self.avgdl)
+        rows = np.repeat(np.arange(weights.shape[0]), np.diff(weights.indptr))
+        ratio = weights.data / self.idf[weights.indices]
+        counts = np.rint(length_norm[rows] * ratio / ((self.k1 + 1) - ratio))
+        return sparse.csr_matrix((counts, weights.indices, weights.indptr), shape=weights.shape)
+
+    def compile_query(self, query_tokens, max_terms=None): #Collapse tokens to (term ids, query term frequencies)
+        #Out-of-vocabulary terms are dropped. Scores match rank_bm25 within SCORE_TOLERANCE (see above). With max_terms, only the max_terms distinct terms with the
+        #highest query-tf x corpus-idf are kept, bounding scoring work regardless of paper length.
+        counts = Counter(query_tokens)
+        term_ids = [self.vocabulary[t] for t in counts if t in self.vocabulary]
+        if not term_ids:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        weights = np.fromiter((counts[t] for t in counts if t in self.vocabulary), dtype=np.float64, count=len(term_ids))
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        if max_terms is not None and len(term_ids) > max_terms:
+            keep = np.argsort(-(weights * self.idf[term_ids]), kind="stable")[:max_terms]
+            term_ids, weights = term_ids[keep], weights[keep]
+        order = np.argsort(term_ids)
+        return term_ids[order], weights[order]
+
+    def score_query(self, term_ids, weights): #Doc scores for a compiled query
+        if len(term_ids) == 0:
+            return np.zeros(self.corpus_size)
+        # Column slice touches only the query terms' postings
+        return self.weights[:, term_ids] @ weights
+
+    def get_scores(self, query_tokens, max_terms=None): #Drop-in for BM25Okapi.get_scores: one score per corpus document
+        return self.score_query(*self.compile_query(query_tokens, max_terms=max_terms))
+
+    def score_queries(self, compiled_queries): #queries x docs scores for many compiled queries in one sparse product
+        indptr, indices, data = [0], [], []
+        for term_ids, weights in compiled_queries:
+            indices.append(term_ids)
+            data.append(weights)
+            indptr.append(indptr[-1] + len(term_ids))
+        queries = sparse.csc_matrix(
+            (np.concatenate(data) if data else np.zeros(0), np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64),
+             np.asarray(indptr, dtype=np.int64)),
+            shape=(self.weights.shape[1], len(compiled_queries)),
+        )
+        return (self.weights @ queries).T.toarray()
+
+    def term_upper_bounds(self): #Max posting weight per term (cached), the per-term score bound used by MaxScore
+        bounds = getattr(self, "_term_upper_bounds", None)
+        if bounds is None:
+            indptr, data = self.weights.indptr, self.weights.data
+            bounds = np.zeros(self.weights.shape[1])
+            nonempty = np.diff(indptr) > 0
+            if data.size:
+                bounds[nonempty] = np.maximum.reduceat(data, indptr[:-1][nonempty])
+            self._term_upper_bounds = bounds
+        return bounds
+
+    def has_negative_weights(self): #True when some posting weight is negative (cached); score bounds of 0 then do not hold
+        negative = getattr(self, "_has_negative_weights", None)
+        if negative is None:
+            negative = bool(self.weights.data.size and self.weights.data.min() < 0)
+            self._has_negative_weights = negative
+        return negative
+
+    def _add_postings(self, acc, term_id, weight, doc_ids): #acc[doc_ids] += term contribution, via binary search in the postings
+        lo, hi = self.weights.indptr[term_id], self.weights.indptr[term_id + 1]
+        if lo == hi or len(doc_ids) == 0:
+            return
+        postings = self.weights.indices[lo:hi]
+        pos = np.searchsorted(postings, doc_ids)
+        found = pos < len(postings)
+        found[found] = postings[pos[found]] == doc_ids[found]
+        acc[doc_ids[found]] += weight * self.weights.data[lo:hi][pos[found]]
+
+    def score_docs(self, term_ids, weights, doc_ids): #Exact scores for a sorted subset of documents only
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        acc = np.zeros(self.corpus_size)
+        for term_id, weight in zip(term_ids, weights):
+            self._add_postings(acc, term_id, weight, doc_ids)
+        return acc[doc_ids]
+
+    def top_k(self, term_ids, weights, k): #MaxScore top-k: (doc ids, scores) descending, without scoring every posting
+        #Terms are taken in decreasing order of their score bound and scored in growing blocks. Once the
+        #bound left in the unscored terms drops below the current k-th best score, no unseen document
+        #can enter the top-k; the remaining terms then only update surviving candidates, and candidates
+        #whose score plus the remaining bound falls below the k-th best are pruned after every term.
+        n = self.corpus_size
+        k = min(k, n)
+        if k <= 0 or len(term_ids) == 0:
+            top = np.arange(max(k, 0))
+            return top, np.zeros(len(top))
+        bounds = weights * self.term_upper_bounds()[term_ids]
+        order = np.argsort(-bounds, kind="stable")
+        remaining = float(bounds.sum())
+        slack = 1e-9 * max(1.0, remaining)   # float summation-order tolerance; keeps near-ties
+        acc = np.zeros(n)
+
+        # Essential terms: exhaustive sparse products over doubling blocks until unseen docs are ruled out
+        start, block, threshold = 0, 1, -np.inf
+        while start < len(order):
+            batch = order[start:start + block]
+            acc += self.weights[:, term_ids[batch]] @ weights[batch]
+            remaining -= float(bounds[batch].sum())
+            start += len(batch)
+            block = min(block * 2, 64)
+            # The k-th best never decreases, so only docs at or above the last one need partitioning
+            above = acc[acc >= threshold] if start > len(batch) else acc
+            threshold = np.partition(above, len(above) - k)[len(above) - k]
+            if remaining + slack < threshold:
+                break
+        if start >= len(order):
+            top = top_k_indices(acc, k)
+            return top, acc[top]
+
+        # Non-essential terms: only candidates that can still reach the top-k are looked up
+        candidates = np.flatnonzero(acc + remaining + slack >= threshold)
+        alive = np.zeros(n, dtype=bool)
+        for j in order[start:]:
+            term_id, weight = term_ids[j], weights[j]
+            remaining -= bounds[j]
+            lo, hi = self.weights.indptr[term_id], self.weights.indptr[term_id + 1]
+            if len(candidates) * np.log2(max(hi - lo, 2)) < hi - lo:
+                self._add_postings(acc, term_id, weight, candidates)
+            else:  # short posting list relative to the candidate set: a masked scan is cheaper
+                postings = self.weights.indices[lo:hi]
+                alive[candidates] = True
+                hit = alive[postings]
+                acc[postings[hit]] += weight * self.weights.data[lo:hi][hit]
+                alive[candidates] = False
+            scores = acc[candidates]
+            threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+            candidates = candidates[scores + remaining + slack >= threshold]
+        top = candidates[top_k_indices(acc[candidates], k)]
+        return top, acc[top]
+
+
+def check_top_k_exactness(engine, queries, k=100): #Compare MaxScore top-k with exhaustive scoring; returns mismatching query count
+    mismatches = 0
+    for query_tokens in queries:
+        term_ids, weights = engine.compile_query(query_tokens)
+        scores = engine.score_query(term_ids, weights)
+        expected = top_k_indices(scores, k)
+        docs, top_scores = engine.top_k(term_ids, weights, k)
+        tol = SCORE_TOLERANCE * max(1.0, float(np.max(np.abs(scores))) if len(scores) else 1.0)
+        # Same scores in the same order; doc ids may only differ between tied documents
+        same_scores = len(docs) == len(expected) and np.allclose(top_scores, scores[expected], rtol=0, atol=tol)
+        same_docs = same_scores and np.all((docs == expected) | np.isclose(scores[docs], scores[expected], rtol=0, atol=tol))
+        if not same_docs:
+            mismatches += 1
+    return mismatches
+
+
+def verify_against_rank_bm25(bm25, engine, n_queries=20, seed=0, tolerance=SCORE_TOLERANCE): #Max relative score difference over sampled corpus-doc queries
+    #Raises ValueError when it exceeds tolerance
+    rng = np.random.default_rng(seed)
+    worst = 0.0
+    for d in rng.choice(len(bm25.doc_freqs), size=min(n_queries, len(bm25.doc_freqs)), replace=False):
+        # Use a real document (with repeated terms) plus an unknown token as the query
+        query = [term for term, freq in bm25.doc_freqs[d].items() for _ in range(freq)] + ["<oov>"]
+        expected = np.asarray(bm25.get_scores(query))
+        scale = max(1.0, float(np.max(np.abs(expected))))
+        worst = max(worst, float(np.max(np.abs(engine.get_scores(query) - expected))) / scale)
+    if worst > tolerance:
+        raise ValueError(f"Scores differ from rank_bm25 by {worst:.3e} (relative), above the {tolerance:.0e} tolerance")
+    return worst
+
+
+def convert_index(bm25_path, out_path, check=True): #Convert bm25_index.pkl to a pickled SparseBM25
+    with open(bm25_path, "rb") as f:
+        bm25 = pickle.load(f)
+    engine = SparseBM25.from_rank_bm25(bm25)
+    if check:
+        worst = verify_against_rank_bm25(bm25, engine)
+        print(f"Max relative score difference vs rank_bm25: {worst:.3e} (tolerance {SCORE_TOLERANCE:.0e})")
+        queries = [[t for t, f in freqs.items() for _ in range(f)] for freqs in bm25.doc_freqs[:20]]
+        mismatches = sum(check_top_k_exactness(engine, queries, k=k) for k in (1, 10, 100))
+        print(f"MaxScore top-k mismatches vs exhaustive scoring: {mismatches}")
+        if mismatches:
+            raise ValueError("MaxScore top-k does not match exhaustive scoring")
+    with open(out_path, "wb") as f:
+        pickle.dump(engine, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return engine
+
+
+if __name__ == "__main__":
+    # python bm25_engine.py [bm25_index.pkl] [bm25_sparse_index.pkl]
+    PKL_DIR = Path(__file__).parent / "PKL_files"
+    src = Path(sys.argv[1]) if len(sys.argv) > 1 else PKL_DIR / "bm25_index.pkl"
+    dst = Path(sys.argv[2]) if len(sys.argv) > 2 else PKL_DIR / "bm25_sparse_index.pkl"
+    import bm25_engine  # pickle the class under its module name, not __main__
+    engine = bm25_engine.convert_index(src, dst)
+    print(f"✓ Wrote {dst} ({engine.corpus_size} docs, {len(engine.vocabulary)} terms, {engine.weights.nnz} postings)")
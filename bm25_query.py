@@ -1,118 +1,219 @@
 import pickle
-from collections import defaultdict
+import threading
 import numpy as np
-from pathlib import Path
-import fitz  # PyMuPDF
-import os
 
 # import your existing cleaner
-from preprocessing import clean_paper_text
-import os
+from preprocessing import load_lemma_cache
+from query_context import QueryContext
+from author_index import AuthorIndex, min_max_normalize, top_k_indices
 from pathlib import Path
 
+import artifacts
+from instrumentation import timed
+
 # Get script directory
 BASE_DIR = Path(__file__).parent
-PKL_DIR = BASE_DIR / "PKL_files"
-
-bm25 = pickle.load(open(PKL_DIR / "bm25_index.pkl", "rb"))
-doc_authors = pickle.load(open(PKL_DIR / "bm25_doc_authors.pkl", "rb"))
-doc_titles = pickle.load(open(PKL_DIR / "bm25_doc_titles.pkl", "rb"))
-
-def extract_text_from_pdf(pdf_input):
-    if hasattr(pdf_input, "read"):
-        pdf_input.seek(0)  # reset pointer before reading
-        pdf_bytes = pdf_input.read()
-        if not pdf_bytes:
-            raise ValueError("Uploaded file stream is empty after reset.")
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    elif isinstance(pdf_input, bytes):
-        doc = fitz.open(stream=pdf_input, filetype="pdf")
-    elif isinstance(pdf_input, (str, os.PathLike)):
-        doc = fitz.open(pdf_input)
-    else:
-        raise ValueError(f"Unsupported input type for extract_text_from_pdf: {type(pdf_input)}")
+PKL_DIR = BASE_DIR / "PKL_files"   # flat layout; index files are resolved through artifacts.artifact_path
+
+def load_bm25_index(version=None): #Sparse BM25 engine; converted from the rank_bm25 pickle when no converted index exists
+    from bm25_engine import SparseBM25
+    sparse_path = artifacts.artifact_path(artifacts.BM25_SPARSE_INDEX, version)
+    if sparse_path.exists():
+        with open(sparse_path, "rb") as f:
+            return pickle.load(f)
+    with open(artifacts.artifact_path(artifacts.BM25_RANK_INDEX, version), "rb") as f:
+        index = pickle.load(f)
+    try:
+        return SparseBM25.from_rank_bm25(index)
+    except ValueError:
+        return index  # non-Okapi variants keep rank_bm25's own get_scores
+
+# Max distinct query terms scored per paper (highest query-tf x idf first); None scores every term.
+# Lower values trade recall for latency on long submissions.
+QUERY_TERM_BUDGET = None
+
+# Author ranking backend for top-k calls (rank_authors_from_context): "exhaustive" scores every document,
+# "maxscore" only retrieves the top documents with MaxScore early termination (same authors and order;
+# scores are normalized by the best author's, see rank_authors_maxscore). Fusion and get_reranked_recommendations
+# always get the exhaustive full-depth ranking, whatever the backend.
+BM25_BACKEND = "exhaustive"
+
+# Index and doc metadata are unpickled on first use (or by startup.warmup), not at import. Entries are
+# keyed by snapshot version: once corpus_index publishes a new snapshot, the next access loads it and
+# the previous version's objects are dropped.
+_LOADED = {}
+_LOAD_LOCK = threading.RLock()   # loaders may call other getters
+
+def _load_once(name, loader, version=None):
+    version = version if version is not None else artifacts.current_version()
+    value = _LOADED.get((version, name))
+    if value is None:
+        with _LOAD_LOCK:
+            value = _LOADED.get((version, name))
+            if value is None:
+                for key in [key for key in _LOADED if key[0] != version]:
+                    del _LOADED[key]
+                value = loader(version)
+                _LOADED[(version, name)] = value
+    return value
 
-    text = "\n".join([p.get_text("text") for p in doc])
-    doc.close()
-    return text
+def _load_pickle(name, version):
+    with open(artifacts.artifact_path(name, version), "rb") as f:
+        return pickle.load(f)
 
+def _load_index(version): #Index plus the surface form -> lemma cache saved alongside it (if any)
+    index = load_bm25_index(version)
+    load_lemma_cache(artifacts.artifact_path(artifacts.LEMMA_CACHE, version))
+    return index
 
+def get_bm25(): #BM25 index (SparseBM25, or a rank_bm25 object for non-Okapi variants)
+    return _load_once("bm25", _load_index)
 
+def get_doc_authors(version=None): #Author of each corpus document
+    return _load_once("doc_authors", lambda version: _load_pickle(artifacts.BM25_DOC_AUTHORS, version), version)
 
+def get_doc_titles(): #Title of each corpus document
+    return _load_once("doc_titles", lambda version: _load_pickle(artifacts.BM25_DOC_TITLES, version))
 
-def bm25_scores_for_query_tokens(query_tokens): #Returns a list of scores aligned to the corpus docs
-    return bm25.get_scores(query_tokens)
+def get_author_index(): #doc -> author CSR, built once per snapshot
+    return _load_once("author_index", lambda version: AuthorIndex.from_doc_authors(get_doc_authors(version)))
+
+def warmup(): #Load the index and doc metadata now instead of on the first query
+    get_bm25()
+    get_doc_titles()
+    return get_author_index()
+
+_LAZY_ATTRIBUTES = {"bm25": get_bm25, "doc_authors": get_doc_authors, "doc_titles": get_doc_titles,
+                    "author_index": get_author_index}
+
+def __getattr__(name): # bm25_query.bm25 etc. keep working as module attributes, loaded on first access
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def extract_text_from_pdf(pdf_input): #Page-budgeted text, stopping once the references start (see pdf_extraction)
+    from pdf_extraction import extract_text
+    return extract_text(pdf_input)
+
+@timed("bm25_scoring")
+def bm25_scores_for_query_tokens(query_tokens, max_terms=None): #Returns a list of scores aligned to the corpus docs
+    #Duplicate tokens are collapsed into query-term weights; max_terms defaults to QUERY_TERM_BUDGET
+    from bm25_engine import SparseBM25
+    bm25 = get_bm25()
+    if not isinstance(bm25, SparseBM25):
+        return bm25.get_scores(query_tokens)
+    if max_terms is None:
+        max_terms = QUERY_TERM_BUDGET
+    return bm25.score_query(*bm25.compile_query(query_tokens, max_terms=max_terms))
 
 def aggregate_doc_scores_to_authors(doc_scores, agg="max"): # Aggregate per-document scores up to per-author scores.
     #Returns dict with max, avg, and count for each author.
-    author_scores = defaultdict(list)
-    for i, score in enumerate(doc_scores):
-        author = doc_authors[i]
-        author_scores[author].append(score)
-    
-    # Calculate both max and avg
-    author_stats = {}
-    for author, scores in author_scores.items():
-        author_stats[author] = {
-            'max': max(scores),
-            'avg': sum(scores) / len(scores),
-            'count': len(scores)
-        }
-    return author_stats
+    author_index = get_author_index()
+    max_scores, avg_scores, counts = author_index.aggregate(doc_scores)
+    return {
+        author: {'max': max_scores[i], 'avg': avg_scores[i], 'count': int(counts[i])}
+        for i, author in enumerate(author_index.authors)
+    }
 def normalize_scores(author_stats): #Min-max normalize both max and avg scores to [0, 1].
-    # Extract max and avg scores
-    max_scores = np.array([stats['max'] for stats in author_stats.values()])
-    avg_scores = np.array([stats['avg'] for stats in author_stats.values()])
-    
-    if len(max_scores) == 0:
+    if not author_stats:
         return author_stats
-    
-    # Normalize max scores
-    min_max, max_max = max_scores.min(), max_scores.max()
-    if max_max == min_max:
-        for author in author_stats:
-            author_stats[author]['max_normalized'] = 1.0
-    else:
-        for author in author_stats:
-            author_stats[author]['max_normalized'] = (
-                (author_stats[author]['max'] - min_max) / (max_max - min_max)
-            )
-    
-    # Normalize avg scores
-    min_avg, max_avg = avg_scores.min(), avg_scores.max()
-    if max_avg == min_avg:
-        for author in author_stats:
-            author_stats[author]['avg_normalized'] = 1.0
-    else:
-        for author in author_stats:
-            author_stats[author]['avg_normalized'] = (
-                (author_stats[author]['avg'] - min_avg) / (max_avg - min_avg)
-            )
+    max_normalized = min_max_normalize([stats['max'] for stats in author_stats.values()])
+    avg_normalized = min_max_normalize([stats['avg'] for stats in author_stats.values()])
+    for i, stats in enumerate(author_stats.values()):
+        stats['max_normalized'] = max_normalized[i]
+        stats['avg_normalized'] = avg_normalized[i]
     return author_stats
 
-def rank_authors_from_text(raw_text: str, k=10, agg="max"): #    Returns list of (author, rank, max_score, avg_score, num_papers) tuples
-    cleaned = clean_paper_text(raw_text)
-    query_tokens = cleaned.split()
-    doc_scores = bm25_scores_for_query_tokens(query_tokens)
-    author_stats = aggregate_doc_scores_to_authors(doc_scores, agg=agg)
-    author_stats = normalize_scores(author_stats)
-    
-    # Sort by max_normalized score
-    ranked = sorted(author_stats.items(), 
-                   key=lambda x: x[1]['max_normalized'], 
-                   reverse=True)[:k]
+def bm25_doc_scores_for_context(context): #BM25 doc scores for a QueryContext, scored once per request
+    if context.bm25_doc_scores is None:
+        context.bm25_doc_scores = bm25_scores_for_query_tokens(context.query_tokens)
+    return context.bm25_doc_scores
+
+@timed("aggregation")
+def rank_authors_from_doc_scores(doc_scores, k=10, agg="max"): #    Returns list of (author, rank, max_score, avg_score, num_papers) tuples
+    author_index = get_author_index()
+    max_scores, avg_scores, counts = author_index.aggregate(doc_scores)
+    max_normalized = min_max_normalize(max_scores)
+    avg_normalized = min_max_normalize(avg_scores)
     
-    # Format using NORMALIZED scores
-    rankings = [(author, rank+1, stats['max_normalized'], stats['avg_normalized'], stats['count']) 
-               for rank, (author, stats) in enumerate(ranked)] 
+    # Rank by max_normalized score, format using NORMALIZED scores
+    top = top_k_indices(max_normalized, k)
+    rankings = [(author_index.authors[i], rank+1, float(max_normalized[i]), float(avg_normalized[i]), int(counts[i]))
+               for rank, i in enumerate(top)]
     return rankings
+
+@timed("aggregation")
+def author_ranking_from_doc_scores(doc_scores): #Every author's normalized max/avg score as a fusion.AuthorRanking
+    from fusion import AuthorRanking
+    author_index = get_author_index()
+    max_scores, avg_scores, counts = author_index.aggregate(doc_scores)
+    return AuthorRanking(author_index.authors, min_max_normalize(max_scores), min_max_normalize(avg_scores), counts)
+
+@timed("bm25_scoring")  # scoring and aggregation are interleaved here
+def rank_authors_maxscore(query_tokens, k=10, max_terms=None): #Top-k authors from MaxScore top documents, without scoring every document
+    #Authors, order, counts and raw scores are those of exhaustive scoring. Normalization differs: max and avg
+    #are divided by the best author's (a floor of 0) instead of min-max over every author, since the true
+    #floor needs every document scored. Both agree whenever some author matches no query term (its max and
+    #avg are 0). The best avg is found by deepening until no unseen author (avg <= max <= deepest retrieved
+    #score) can beat the best avg seen; seen authors are scored exactly over all their papers.
+    if max_terms is None:
+        max_terms = QUERY_TERM_BUDGET
+    bm25, author_index = get_bm25(), get_author_index()
+    term_ids, weights = bm25.compile_query(query_tokens, max_terms=max_terms)
+    if bm25.has_negative_weights():   # no score bound: rank every author, normalized as above
+        max_scores, avg_scores, counts = author_index.aggregate(bm25.score_query(term_ids, weights))
+        author_ids = np.arange(len(author_index))
+    else:
+        k = min(k, len(author_index))
+        depth = max(k, 1)
+        while True:
+            docs, scores = bm25.top_k(term_ids, weights, depth)
+            author_ids = np.unique(author_index.doc_author_ids[docs])
+            max_scores, avg_scores, counts = author_index.aggregate_subset(
+                author_ids, lambda ids: bm25.score_docs(term_ids, weights, ids))
+            floor = scores[-1] if len(scores) else 0.0     # bound on every unseen author's max (and avg)
+            kth = np.sort(max_scores)[::-1][k - 1] if len(author_ids) >= k else -np.inf
+            # Strictly above the floor: an unseen author tied at the floor could outrank a seen one by id
+            if depth >= bm25.corpus_size or (kth > floor and avg_scores.max() > floor):
+                break
+            depth = min(depth * 2, bm25.corpus_size)
+
+    max_normalized = max_scores / max_scores.max() if max_scores.max() > 0 else np.ones(len(author_ids))
+    avg_normalized = avg_scores / avg_scores.max() if avg_scores.max() > 0 else np.ones(len(author_ids))
+    order = np.lexsort((author_ids, -max_normalized))[:k]  # by normalized max desc, ties in author-id order
+    return [(author_index.authors[author_ids[i]], rank+1, float(max_normalized[i]), float(avg_normalized[i]), int(counts[i]))
+            for rank, i in enumerate(order)]
+
+def rank_authors_from_context(context, k=10, agg="max", backend=None): #Rank authors reusing the context's cleaned tokens and doc scores
+    from bm25_engine import SparseBM25
+    backend = backend or BM25_BACKEND
+    if backend == "maxscore" and isinstance(get_bm25(), SparseBM25):
+        return rank_authors_maxscore(context.query_tokens, k=k)
+    if backend not in ("exhaustive", "maxscore"):
+        raise ValueError(f"Unknown BM25 backend: {backend}")
+    doc_scores = bm25_doc_scores_for_context(context)
+    return rank_authors_from_doc_scores(doc_scores, k=k, agg=agg)
+
+def author_ranking_for_context(context, depth=None, backend=None): #Full-depth ranking for fusion: every author, scored exhaustively
+    #Fusion and re-ranking read min-max normalized scores of authors far below any top-k cut, so the MaxScore
+    #backend does not apply here; depth and backend are accepted (and validated) for the retriever interface
+    backend = backend or BM25_BACKEND
+    if backend not in ("exhaustive", "maxscore"):
+        raise ValueError(f"Unknown BM25 backend: {backend}")
+    return author_ranking_from_doc_scores(bm25_doc_scores_for_context(context))
+
+def rank_authors_from_text(raw_text: str, k=10, agg="max", backend=None): #    Returns list of (author, rank, max_score, avg_score, num_papers) tuples
+    #backend: "exhaustive" or "maxscore" (defaults to BM25_BACKEND)
+    return rank_authors_from_context(QueryContext(raw_text=raw_text), k=k, agg=agg, backend=backend)
 def rank_authors_from_pdf(pdf_path: str, k=10, agg="max"): #Rank authors from PDF file
-    raw = extract_text_from_pdf(pdf_path)
-    return rank_authors_from_text(raw, k=k, agg=agg)
+    context = QueryContext.from_input(pdf_path)
+    return rank_authors_from_context(context, k=k, agg=agg)
 
 def get_bm25_rankings(pdf_path, k=10): #    Returns: List of (author, rank, max_score, avg_score, num_papers) tuples
-    raw = extract_text_from_pdf(pdf_path)
-    rankings = rank_authors_from_text(raw, k=k, agg="max")
+    #pdf_path may also be a QueryContext, in which case its text, tokens and doc scores are reused
+    context = QueryContext.from_input(pdf_path)
+    rankings = rank_authors_from_context(context, k=k, agg="max")
+    context.bm25_rankings = rankings
     return rankings
 
 if __name__ == "__main__":
@@ -0,0 +1,212 @@
+#Offline corpus build: <corpus>/<author>/<paper>.pdf|.txt -> every artifact the query modules load
+#Stages: "extract" (PDF text) and "clean" (clean_paper_text) run per paper in a process pool, "embed"
+#encodes papers in large batches, "assemble" builds the BM25 index, embeddings and profiles through
+#corpus_index.CorpusIndex and publishes them as a new snapshot (see artifacts.py). Every stage keeps one
+#checkpoint per paper under the work directory, keyed by the file's SHA-256 and the stage's settings, so a
+#crashed build or a corpus with a few new papers only redoes the papers that have no checkpoint yet.
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+import artifacts
+from pipeline_cache import cache_key, content_hash
+
+WORK_DIR = Path(os.environ.get("RR_BUILD_DIR") or Path(__file__).parent / ".build_cache")
+PAPER_SUFFIXES = (".pdf", ".txt")
+EMBED_BATCH_SIZE = 256     # papers per encode call (and per embedding checkpoint flush)
+ENCODE_BATCH_SIZE = 32     # st_model.encode batch_size within a call
+EXTRACTED_TEXTS = "extracted_texts.pkl"        # {paper path: raw text}
+PREPROCESSED_TEXTS = "preprocessing_texts.pkl"  # {paper path: clean_paper_text output}
+
+
+def collect_papers(corpus_dir): #[(author, title, paper path relative to corpus_dir, absolute path)], sorted
+    corpus_dir = Path(corpus_dir)
+    papers = []
+    for author_dir in sorted(p for p in corpus_dir.iterdir() if p.is_dir()):
+        for path in sorted(author_dir.iterdir()):
+            if path.suffix.lower() in PAPER_SUFFIXES:
+                papers.append((author_dir.name, path.stem, path.relative_to(corpus_dir).as_posix(), str(path)))
+    return papers
+
+
+def file_hash(path): #SHA-256 of a file, read in 1 MB blocks
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Checkpoints:  # One file per paper: <work_dir>/<stage>-<settings key>/<hash[:2]>/<hash><suffix>
+    def __init__(self, work_dir, stage, settings, suffix):
+        self.directory = Path(work_dir) / f"{stage}-{cache_key(*settings)[:12]}"
+        self.suffix = suffix
+
+    def path(self, digest):
+        return self.directory / digest[:2] / f"{digest}{self.suffix}"
+
+    def has(self, digest):
+        return self.path(digest).exists()
+
+    def _write(self, digest, write):
+        path = self.path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, path)  # a crash never leaves a truncated checkpoint behind
+
+    def write_text(self, digest, text):
+        self._write(digest, lambda f: f.write(text.encode("utf-8")))
+
+    def read_text(self, digest):
+        return self.path(digest).read_text(encoding="utf-8")
+
+    def write_array(self, digest, array):
+        self._write(digest, lambda f: np.save(f, array))
+
+    def read_array(self, digest):
+        return np.load(self.path(digest))
+
+
+def stage_checkpoints(work_dir, model_name): #(extract, clean, embed) checkpoints for the current settings
+    from corpus_index import EMBED_WORDS
+    from pdf_extraction import extraction_version
+    extract_settings = extraction_version()
+    # The cleaner's version is its source: editing preprocessing.py re-cleans, but never re-extracts
+    cleaner = content_hash((Path(__file__).parent / "preprocessing.py").read_bytes())
+    return (Checkpoints(work_dir, "extract", extract_settings, ".txt"),
+            Checkpoints(work_dir, "clean", (*extract_settings, cleaner), ".txt"),
+            Checkpoints(work_dir, "embed", (*extract_settings, model_name, EMBED_WORDS), ".npy"))
+
+
+def prepare_paper(path, digest, extracted, cleaned): #Worker: extract + clean one paper into its checkpoints; returns an error or None
+    from pdf_extraction import extract_text
+    from preprocessing import clean_paper_text
+    try:
+        if extracted.has(digest):
+            raw_text = extracted.read_text(digest)
+        else:
+            if path.lower().endswith(".pdf"):
+                raw_text = extract_text(path)
+            else:
+                with open(path, encoding="utf-8", errors="ignore") as f:
+                    raw_text = f.read()
+            extracted.write_text(digest, raw_text)
+        if not cleaned.has(digest):
+            cleaned.write_text(digest, clean_paper_text(raw_text))
+        return None
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def embed_papers(digests, extracted, embedded, model_name, batch_size=EMBED_BATCH_SIZE): #Encode papers without an embedding checkpoint
+    from corpus_index import embedding_text
+    from Sentence_Transformer import load_model
+    todo = [d for d in dict.fromkeys(digests) if not embedded.has(d)]
+    if not todo:
+        return 0
+    model = load_model(model_name)
+    for start in range(0, len(todo), batch_size):
+        batch = todo[start:start + batch_size]
+        vectors = model.encode([embedding_text(extracted.read_text(d)) for d in batch], convert_to_numpy=True,
+                               batch_size=ENCODE_BATCH_SIZE)
+        for digest, vector in zip(batch, np.asarray(vectors, dtype=np.float32)):
+            embedded.write_array(digest, vector)
+        print(f"   embedded {min(start + batch_size, len(todo))}/{len(todo)}")
+    return len(todo)
+
+
+def load_metadata(path): #{author: {"papers": {file name: year}, other profile fields...}} from a JSON file
+    if path is None:
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build(corpus_dir, model_name, work_dir=WORK_DIR, root=None, workers=None, store_dtype="float16",
+          metadata=None): #Run every stage and publish a snapshot; returns its version
+    from corpus_index import CorpusIndex
+    timings = {}
+    start = time.perf_counter()
+    papers = collect_papers(corpus_dir)
+    if not papers:
+        raise ValueError(f"No papers found under {corpus_dir}")
+    extracted, cleaned, embedded = stage_checkpoints(work_dir, model_name)
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        digests = list(pool.map(file_hash, [path for *_, path in papers], chunksize=16))
+        timings["hash"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        todo = [(path, digest) for (*_, path), digest in zip(papers, digests) if not cleaned.has(digest)]
+        print(f"Extracting and cleaning {len(todo)} of {len(papers)} papers ({len(papers) - len(todo)} checkpointed)")
+        futures = {pool.submit(prepare_paper, path, digest, extracted, cleaned): path for path, digest in todo}
+        errors = {}
+        for done, future in enumerate(as_completed(futures), 1):
+            error = future.result()
+            if error is not None:
+                errors[futures[future]] = error
+            if done % 100 == 0 or done == len(futures):
+                print(f"   {done}/{len(futures)} papers")
+        timings["extract+clean"] = time.perf_counter() - start
+    for path, error in errors.items():
+        print(f"✗ {path}: {error}")
+    ok = [(paper, digest) for paper, digest in zip(papers, digests) if paper[3] not in errors]
+
+    start = time.perf_counter()
+    encoded = embed_papers([digest for _, digest in ok], extracted, embedded, model_name)
+    timings["embed"] = time.perf_counter() - start
+    print(f"Encoded {encoded} papers ({len(ok) - encoded} checkpointed)")
+
+    start = time.perf_counter()
+    metadata = metadata or {}
+    index = CorpusIndex.empty(model_name, store_dtype=None if store_dtype == "pickle" else store_dtype)
+    raw_texts, cleaned_texts = {}, {}
+    for (author, title, rel_path, _), digest in ok:
+        raw_texts[rel_path] = extracted.read_text(digest)
+        cleaned_texts[rel_path] = cleaned.read_text(digest)
+        meta = metadata.get(author, {})
+        index.add_paper(author, title, tokens=cleaned_texts[rel_path].split(), path=rel_path,
+                        year=meta.get("papers", {}).get(Path(rel_path).name), institution=meta.get("primary_institution"),
+                        embedding=embedded.read_array(digest))
+    for author, meta in metadata.items():
+        fields = {key: value for key, value in meta.items() if key != "papers"}
+        if fields and author in index.profiles:
+            index.update_profile(author, **fields)
+    index.changes = [{"op": "build", "corpus": str(corpus_dir), "papers": len(ok), "failed": sorted(errors)}]
+    version = index.publish(root=root, extra_files={EXTRACTED_TEXTS: raw_texts, PREPROCESSED_TEXTS: cleaned_texts})
+    timings["assemble"] = time.perf_counter() - start
+    for name, seconds in timings.items():
+        print(f"   {name:<14} {seconds:8.1f} s")
+    return version
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build every index artifact from <corpus>/<author>/<paper>.pdf|.txt")
+    parser.add_argument("corpus", help="corpus directory with one sub-directory of papers per author")
+    parser.add_argument("--model", help="sentence-transformer model (default: the current snapshot's model)")
+    parser.add_argument("--root", help=f"artifact directory (default: {artifacts.ARTIFACT_DIR}, or $RR_ARTIFACT_DIR)")
+    parser.add_argument("--work-dir", default=WORK_DIR, help="checkpoint directory (default: .build_cache, or $RR_BUILD_DIR)")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPU count)")
+    parser.add_argument("--store", choices=("float16", "int8", "pickle"), default="float16", help="embedding format")
+    parser.add_argument("--metadata", help="JSON {author: {primary_institution, papers: {file name: year}, ...}}")
+    args = parser.parse_args()
+
+    model_name = args.model
+    if model_name is None:
+        from corpus_index import CorpusIndex
+        try:
+            model_name = CorpusIndex.load(root=args.root).model_name
+        except (FileNotFoundError, pickle.UnpicklingError) as e:
+            sys.exit(f"No existing corpus to take the model from ({e}); pass --model")
+    build(args.corpus, model_name, work_dir=args.work_dir, root=args.root, workers=args.workers,
+          store_dtype=args.store, metadata=load_metadata(args.metadata))
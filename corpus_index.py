@@ -0,0 +1,347 @@
+#Incremental corpus index: add papers, remove authors and edit profiles without re-tokenizing or re-encoding the corpus
+#The current snapshot is loaded once; edits only touch the affected rows (BM25 term counts, embedding rows,
+#author -> paper lists, profiles). publish() rebuilds BM25 statistics (document frequencies, Okapi IDF,
+#avgdl) from the stored term counts, encodes only the new papers, writes a new versioned snapshot and swaps
+#it in atomically (see artifacts.py). Running processes pick it up on their next request.
+import argparse
+import json
+import pickle
+import shutil
+import sys
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+import artifacts
+from bm25_engine import SparseBM25, rank_bm25_counts
+from embedding_store import encode_rows, is_store, load_store, write_store_rows
+
+EMBED_WORDS = 512        # words of each new paper that are encoded, as for a query without chunking
+ENCODE_BATCH_SIZE = 32
+RECENT_YEARS = 3         # a paper counts towards a profile's recent_papers when published this recently
+
+
+def embedding_text(raw_text): #Text encoded for a corpus paper: the query side's preprocess_text + 512-word truncation
+    return ' '.join(raw_text.lower().split()[:EMBED_WORDS])
+
+
+def _load_pickle(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def _dump_pickle(value, path):
+    with open(path, "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_term_counts(directory): #(docs x terms counts, vocabulary, BM25 parameters) from an artifact directory
+    #Prefers the counts saved with a snapshot, then the rank_bm25 pickle's doc_freqs, then counts
+    #recovered from a converted index's posting weights
+    directory = Path(directory)
+    sparse_path = directory / artifacts.BM25_SPARSE_INDEX
+    engine = _load_pickle(sparse_path) if sparse_path.exists() else None
+    if engine is not None and (directory / artifacts.BM25_TERM_FREQUENCIES).exists():
+        tf = sparse.load_npz(directory / artifacts.BM25_TERM_FREQUENCIES).tocsr()
+        return tf, engine.vocabulary, (engine.k1, engine.b, engine.epsilon)
+    rank_path = directory / artifacts.BM25_RANK_INDEX
+    if rank_path.exists():
+        bm25 = _load_pickle(rank_path)
+        if type(bm25).__name__ != "BM25Okapi":
+            raise ValueError(f"Only BM25Okapi indexes can be updated incrementally, got {type(bm25).__name__}")
+        tf, vocabulary = rank_bm25_counts(bm25)
+        return tf, vocabulary, (bm25.k1, bm25.b, bm25.epsilon)
+    if engine is None:
+        raise FileNotFoundError(f"No BM25 index in {directory}")
+    return engine.term_counts(), engine.vocabulary, (engine.k1, engine.b, engine.epsilon)
+
+
+class CorpusIndex:  # Mutable view of one snapshot; rows are kept as base row ids until publish() materializes them
+    def __init__(self, tf, vocabulary, doc_authors, doc_titles, st_rows, st_scales, all_paths, author_papers,
+                 model_name, profiles, store_dtype=None, bm25_params=(1.5, 0.75, 0.25), parent=None):
+        # BM25: kept rows of the base count matrix, then new documents as (term ids, counts)
+        self._tf = sparse.csr_matrix(tf)
+        self._bm25_base = list(range(self._tf.shape[0]))
+        self._bm25_new = []
+        self.vocabulary = dict(vocabulary)
+        self.doc_authors = list(doc_authors)
+        self.doc_titles = list(doc_titles)
+        self.k1, self.b, self.epsilon = bm25_params
+
+        # Embeddings: kept rows of the base matrix (stored form), then new rows (vector, or text still to encode)
+        self._st_rows = st_rows
+        self._st_scales = st_scales
+        self._st_base = list(range(len(all_paths)))
+        self._st_new = []
+        self.all_paths = list(all_paths)
+        self._known_paths = set(self.all_paths)
+        self.author_papers = {author: list(papers) for author, papers in author_papers.items()}
+        self.model_name = model_name
+        self.store_dtype = store_dtype     # "float16"/"int8" store, or None for the pickle format
+
+        self.profiles = {author: dict(profile) for author, profile in profiles.items()}
+        self.parent = parent
+        self.changes = []
+
+    @classmethod
+    def load(cls, version=None, root=None): #Index of a published snapshot (default: current) or of the flat layout
+        from preprocessing import load_lemma_cache
+        version = version if version is not None else artifacts.current_version(root)
+        directory = artifacts.artifact_dir(version, root)
+        tf, vocabulary, bm25_params = load_term_counts(directory)
+        store_path = directory / artifacts.EMBEDDINGS_STORE
+        if is_store(store_path):
+            saved = load_store(store_path)
+            store_dtype, scales = saved["dtype"], saved["scales"]
+        else:
+            saved = _load_pickle(directory / artifacts.EMBEDDINGS_PICKLE)
+            store_dtype, scales = None, None
+        profiles_path = directory / artifacts.AUTHOR_PROFILES
+        profiles = _load_pickle(profiles_path) if profiles_path.exists() else {}
+        load_lemma_cache(directory / artifacts.LEMMA_CACHE)
+        return cls(tf, vocabulary, _load_pickle(directory / artifacts.BM25_DOC_AUTHORS),
+                   _load_pickle(directory / artifacts.BM25_DOC_TITLES), saved["embeddings"], scales,
+                   saved["all_paths"], saved["author_papers"], saved["model_name"], profiles,
+                   store_dtype=store_dtype, bm25_params=bm25_params, parent=version)
+
+    @classmethod
+    def empty(cls, model_name, store_dtype="float16", dim=None): #New corpus with no documents (e.g. for a first build)
+        rows = np.zeros((0, dim or 0), dtype=np.float32 if store_dtype is None else store_dtype)
+        scales = np.zeros(0, dtype=np.float32) if store_dtype == "int8" else None
+        return cls(sparse.csr_matrix((0, 0)), {}, [], [], rows, scales, [], {}, model_name, {}, store_dtype=store_dtype)
+
+    def __len__(self):
+        return len(self.doc_authors)
+
+    def add_paper(self, author, title, text=None, tokens=None, path=None, year=None, institution=None,
+                  embedding=None): #Queue one paper of author
+        #tokens are the cleaned BM25 tokens (default: clean_paper_text(text).split()). The paper is encoded
+        #at publish() unless its embedding is given or path is already in the embedding corpus (a co-author's
+        #paper): then the existing row is shared, as in author_papers.
+        if tokens is None:
+            if text is None:
+                raise ValueError("add_paper needs the paper text or its cleaned tokens")
+            from preprocessing import clean_paper_text
+            tokens = clean_paper_text(text).split()
+        counts = Counter(tokens)
+        for term in counts:
+            if term not in self.vocabulary:
+                self.vocabulary[term] = len(self.vocabulary)
+        term_ids = np.fromiter((self.vocabulary[t] for t in counts), dtype=np.int64, count=len(counts))
+        self._bm25_new.append((term_ids, np.fromiter(counts.values(), dtype=np.float64, count=len(counts))))
+        self.doc_authors.append(author)
+        self.doc_titles.append(title)
+
+        path = str(path) if path is not None else f"{author}/{title}"
+        if path not in self._known_paths:
+            if embedding is not None:
+                self._st_new.append(np.asarray(embedding, dtype=np.float32))
+            else:
+                self._st_new.append(embedding_text(text if text is not None else ' '.join(tokens)))
+            self.all_paths.append(path)
+            self._known_paths.add(path)
+        papers = self.author_papers.setdefault(author, [])
+        if path not in papers:
+            papers.append(path)
+
+        profile = self.profiles.setdefault(author, {'num_papers': 0, 'primary_institution': institution or 'Other',
+                                                    'recent_papers': 0, 'latest_year': None})
+        profile['num_papers'] = profile.get('num_papers', 0) + 1
+        if year is not None:
+            profile['latest_year'] = max(year, profile.get('latest_year') or year)
+            if year > datetime.now().year - RECENT_YEARS:
+                profile['recent_papers'] = profile.get('recent_papers', 0) + 1
+        self.changes.append({"op": "add_paper", "author": author, "title": title, "path": path})
+
+    def remove_author(self, author): #Drop the author's documents, profile and any embedding row no other author shares
+        keep = [a != author for a in self.doc_authors]
+        if all(keep) and author not in self.author_papers and author not in self.profiles:
+            raise KeyError(f"Unknown author: {author}")
+        n_base = len(self._bm25_base)
+        self._bm25_base = [row for row, k in zip(self._bm25_base, keep[:n_base]) if k]
+        self._bm25_new = [row for row, k in zip(self._bm25_new, keep[n_base:]) if k]
+        self.doc_authors = [a for a, k in zip(self.doc_authors, keep) if k]
+        self.doc_titles = [t for t, k in zip(self.doc_titles, keep) if k]
+
+        removed = set(self.author_papers.pop(author, []))
+        shared = {p for papers in self.author_papers.values() for p in papers if p in removed}
+        dropped = removed - shared
+        if dropped:
+            keep = [p not in dropped for p in self.all_paths]
+            n_base = len(self._st_base)
+            self._st_base = [row for row, k in zip(self._st_base, keep[:n_base]) if k]
+            self._st_new = [row for row, k in zip(self._st_new, keep[n_base:]) if k]
+            self.all_paths = [p for p, k in zip(self.all_paths, keep) if k]
+            self._known_paths -= dropped
+        self.profiles.pop(author, None)
+        self.changes.append({"op": "remove_author", "author": author})
+
+    def update_profile(self, author, **fields): #Set profile fields (num_papers, primary_institution, recent_papers, latest_year)
+        self.profiles.setdefault(author, {}).update(fields)
+        self.changes.append({"op": "update_profile", "author": author, "fields": sorted(fields)})
+
+    def _term_counts(self): #docs x terms counts of the current rows, vocabulary compacted to terms that still occur
+        n_terms = len(self.vocabulary)
+        base = self._tf[self._bm25_base] if self._bm25_base else sparse.csr_matrix((0, self._tf.shape[1]))
+        base = sparse.csr_matrix((base.data, base.indices, base.indptr), shape=(base.shape[0], n_terms))
+        lengths = [len(ids) for ids, _ in self._bm25_new]
+        new = sparse.csr_matrix(
+            (np.concatenate([c for _, c in self._bm25_new]) if lengths else np.zeros(0),
+             np.concatenate([ids for ids, _ in self._bm25_new]) if lengths else np.zeros(0, dtype=np.int64),
+             np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)),
+            shape=(len(lengths), n_terms))
+        tf = sparse.vstack([base, new], format="csr")
+        tf.sort_indices()
+        # Terms whose last document was removed leave the vocabulary, as in an index built from scratch
+        live = np.bincount(tf.indices, minlength=n_terms) > 0
+        vocabulary = self.vocabulary
+        if not live.all():
+            new_ids = np.cumsum(live) - 1
+            tf = tf[:, np.flatnonzero(live)]
+            vocabulary = {term: int(new_ids[i]) for term, i in vocabulary.items() if live[i]}
+        return tf, vocabulary
+
+    def _embedding_rows(self, batch_size=ENCODE_BATCH_SIZE): #(rows, scales) in stored form; pending papers encoded in one batched call
+        pending = [i for i, row in enumerate(self._st_new) if isinstance(row, str)]
+        if pending:
+            from Sentence_Transformer import load_model
+            vectors = load_model(self.model_name).encode([self._st_new[i] for i in pending], convert_to_numpy=True,
+                                                         batch_size=batch_size)
+            for i, vector in zip(pending, np.asarray(vectors, dtype=np.float32)):
+                self._st_new[i] = vector
+        # Existing rows are copied as stored; only new rows are normalized/quantized
+        base = np.asarray(self._st_rows[self._st_base])
+        base_scales = np.asarray(self._st_scales[self._st_base]) if self._st_scales is not None else None
+        if not self._st_new:
+            return base, base_scales
+        new = np.stack(self._st_new)
+        if self.store_dtype is None:
+            return np.concatenate([base.reshape(-1, new.shape[1]), new.astype(base.dtype)]), None
+        new_rows, new_scales = encode_rows(new, self.store_dtype)
+        rows = np.concatenate([base.reshape(-1, new.shape[1]), new_rows])
+        scales = np.concatenate([base_scales, new_scales]) if base_scales is not None else None
+        return rows, scales
+
+    def check_consistency(self, engine, rows): #Raise ValueError if the materialized pieces disagree
+        if engine.corpus_size != len(self.doc_authors) or len(self.doc_titles) != len(self.doc_authors):
+            raise ValueError("BM25 documents, doc_authors and doc_titles are out of step")
+        if len(rows) != len(self.all_paths):
+            raise ValueError("Embedding rows and all_paths are out of step")
+        missing = [p for papers in self.author_papers.values() for p in papers if p not in self._known_paths]
+        if missing:
+            raise ValueError(f"{len(missing)} author papers have no embedding row (e.g. {missing[0]})")
+
+    def write(self, directory, extra_files=None): #Write every artifact of this index (+ extra {file name: object} pickles) to directory; returns the manifest
+        from preprocessing import save_lemma_cache
+        if not self.doc_authors:
+            raise ValueError("Cannot write an empty corpus")
+        directory = Path(directory)
+        tf, vocabulary = self._term_counts()
+        engine = SparseBM25.from_counts(tf, vocabulary, k1=self.k1, b=self.b, epsilon=self.epsilon)
+        rows, scales = self._embedding_rows()
+        self.check_consistency(engine, rows)
+
+        _dump_pickle(engine, directory / artifacts.BM25_SPARSE_INDEX)
+        sparse.save_npz(directory / artifacts.BM25_TERM_FREQUENCIES, tf)
+        _dump_pickle(self.doc_authors, directory / artifacts.BM25_DOC_AUTHORS)
+        _dump_pickle(self.doc_titles, directory / artifacts.BM25_DOC_TITLES)
+        if self.store_dtype is None:
+            _dump_pickle({'embeddings': rows, 'all_paths': self.all_paths, 'author_papers': self.author_papers,
+                          'model_name': self.model_name}, directory / artifacts.EMBEDDINGS_PICKLE)
+        else:
+            write_store_rows(directory / artifacts.EMBEDDINGS_STORE, rows, scales, self.all_paths,
+                             self.author_papers, self.model_name)
+        _dump_pickle(self.profiles, directory / artifacts.AUTHOR_PROFILES)
+        save_lemma_cache(directory / artifacts.LEMMA_CACHE)
+        for name, value in (extra_files or {}).items():
+            _dump_pickle(value, directory / name)
+        manifest = {
+            "parent": self.parent,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "documents": engine.corpus_size,
+            "terms": len(vocabulary),
+            "papers": len(self.all_paths),
+            "authors": len(self.author_papers),
+            "model_name": self.model_name,
+            "embeddings": self.store_dtype or "pickle",
+            "changes": self.changes,
+        }
+        with open(directory / artifacts.MANIFEST, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+
+        # Continue from the materialized state: later edits and publishes build on it
+        self._tf, self._bm25_base, self._bm25_new, self.vocabulary = tf, list(range(tf.shape[0])), [], dict(vocabulary)
+        self._st_rows, self._st_scales, self._st_base, self._st_new = rows, scales, list(range(len(rows))), []
+        return manifest
+
+    def publish(self, root=None, keep=artifacts.KEEP_SNAPSHOTS, extra_files=None): #Write a new snapshot and make it current; returns its version
+        version = artifacts.new_version()
+        staged = artifacts.staging_dir(version, root)
+        try:
+            manifest = self.write(staged, extra_files)
+        except BaseException:
+            shutil.rmtree(staged, ignore_errors=True)
+            raise
+        artifacts.publish(staged, version, root)
+        artifacts.prune_snapshots(keep, root)
+        print(f"✓ Published snapshot {version}: {manifest['documents']} documents, {manifest['papers']} papers, "
+              f"{manifest['authors']} authors ({len(self.changes)} changes)")
+        self.parent, self.changes = version, []
+        return version
+
+
+def _read_papers(manifest_path): #Paper records from a .jsonl manifest: {"author", "title", "pdf" or "text", "year", ...}
+    manifest_path = Path(manifest_path)
+    with open(manifest_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if "pdf" in record:
+                    from pdf_extraction import extract_text
+                    record["text"] = extract_text(manifest_path.parent / record.pop("pdf"))
+                yield record
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update the reviewer corpus and publish a new snapshot")
+    parser.add_argument("--root", help=f"artifact directory (default: {artifacts.ARTIFACT_DIR}, or $RR_ARTIFACT_DIR)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="add papers from a .jsonl manifest")
+    add.add_argument("manifest")
+    remove = commands.add_parser("remove-author", help="remove authors with their papers and profiles")
+    remove.add_argument("authors", nargs="+")
+    profile = commands.add_parser("set-profile", help="set profile fields, e.g. primary_institution=IIT num_papers=12")
+    profile.add_argument("author")
+    profile.add_argument("fields", nargs="+")
+    commands.add_parser("versions", help="list published snapshots")
+    rollback = commands.add_parser("rollback", help="make an older snapshot current again")
+    rollback.add_argument("version")
+    args = parser.parse_args()
+
+    if args.command == "versions":
+        current = artifacts.current_version(args.root)
+        for version in artifacts.list_versions(args.root):
+            print(("* " if version == current else "  ") + version)
+        sys.exit(0)
+    if args.command == "rollback":
+        if args.version not in artifacts.list_versions(args.root):
+            sys.exit(f"Unknown snapshot: {args.version}")
+        artifacts.set_current(args.version, args.root)
+        print(f"✓ Current snapshot is now {args.version}")
+        sys.exit(0)
+
+    index = CorpusIndex.load(root=args.root)
+    if args.command == "add":
+        fields = ("author", "title", "text", "tokens", "path", "year", "institution")
+        for record in _read_papers(args.manifest):
+            index.add_paper(**{key: record[key] for key in fields if key in record})
+    elif args.command == "remove-author":
+        for author in args.authors:
+            index.remove_author(author)
+    else:
+        updates = dict(field.split("=", 1) for field in args.fields)
+        index.update_profile(args.author, **{key: int(value) if value.isdigit() else value for key, value in updates.items()})
+    index.publish(root=args.root)
@@ -0,0 +1,122 @@
+#Memory-mapped embedding store: float16 or int8 rows in a raw .npy plus a small JSON metadata sidecar
+#Workers open the matrix with np.load(mmap_mode="r"), so they share pages through the OS page cache
+#instead of each unpickling a private copy of sentence_transformer_embeddings.pkl.
+import json
+import pickle
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from author_index import top_k_indices
+from vector_index import ExactIndex, content_hash, normalize_rows, sample_queries
+
+META_FILE = "meta.json"
+MATRIX_FILE = "embeddings.npy"
+SCALES_FILE = "scales.npy"
+
+
+def is_store(path): #True for a store directory (or its meta.json)
+    path = Path(path)
+    return (path / META_FILE).exists() or (path.name == META_FILE and path.exists())
+
+
+def quantize_int8(vectors): #Symmetric per-row int8: row ~= q * scale
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def write_store(out_dir, embeddings, all_paths, author_papers, model_name, dtype="float16"): #Rows are normalized before storing
+    rows, scales = encode_rows(embeddings, dtype)
+    return write_store_rows(out_dir, rows, scales, all_paths, author_papers, model_name)
+
+
+def encode_rows(embeddings, dtype="float16"): #(stored rows, scales or None): normalized, then cast or quantized
+    if dtype not in ("float16", "int8"):
+        raise ValueError(f"Unsupported store dtype: {dtype}")
+    vectors = normalize_rows(embeddings)
+    if dtype == "int8":
+        return quantize_int8(vectors)
+    return vectors.astype(np.float16), None
+
+
+def write_store_rows(out_dir, rows, scales, all_paths, author_papers, model_name): #Rows already in stored form (see encode_rows)
+    #Lets an updated store copy existing rows verbatim instead of re-normalizing and re-quantizing them
+    dtype = "int8" if rows.dtype == np.int8 else "float16"
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rows = np.asarray(rows, dtype=dtype)
+    scales = np.asarray(scales, dtype=np.float32) if dtype == "int8" else None
+    np.save(out_dir / MATRIX_FILE, rows)
+    if scales is not None:
+        np.save(out_dir / SCALES_FILE, scales)
+    meta = {
+        "model_name": model_name,
+        "dtype": dtype,
+        "count": int(rows.shape[0]),
+        "dim": int(rows.shape[1]),
+        "content_hash": content_hash(rows, scales),   # lets vector indexes detect rewritten rows
+        "all_paths": [str(p) for p in all_paths],
+        "author_papers": {author: [str(p) for p in papers] for author, papers in author_papers.items()},
+    }
+    # Metadata last: a store without meta.json is never picked up half-written
+    with open(out_dir / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return out_dir
+
+
+def load_store(path): #Same keys as the embeddings pickle; 'embeddings' is a read-only memmap
+    path = Path(path)
+    if path.name == META_FILE:
+        path = path.parent
+    with open(path / META_FILE, encoding="utf-8") as f:
+        meta = json.load(f)
+    scales = np.load(path / SCALES_FILE, mmap_mode="r") if meta["dtype"] == "int8" else None
+    return {
+        "embeddings": np.load(path / MATRIX_FILE, mmap_mode="r"),
+        "scales": scales,
+        "all_paths": meta["all_paths"],
+        "author_papers": meta["author_papers"],
+        "model_name": meta["model_name"],
+        "dtype": meta["dtype"],
+        "content_hash": meta.get("content_hash"),     # None for stores written before it was recorded
+    }
+
+
+def migrate_pickle(pkl_path, out_dir, dtype="float16"): #Convert sentence_transformer_embeddings.pkl to a store
+    with open(pkl_path, "rb") as f:
+        saved = pickle.load(f)
+    return write_store(out_dir, saved["embeddings"], saved["all_paths"], saved["author_papers"],
+                       saved["model_name"], dtype=dtype)
+
+
+def check_accuracy(pkl_path, store_dir, n_queries=100, k=10): #Quantized vs float32 similarities on perturbed corpus rows
+    with open(pkl_path, "rb") as f:
+        reference = ExactIndex(pickle.load(f)["embeddings"])
+    store = load_store(store_dir)
+    stored = ExactIndex(store["embeddings"], normalized=True, scales=store["scales"])
+    errors, overlap = [], 0
+    queries = sample_queries(reference.vectors, n_queries=n_queries)
+    for query in queries:
+        expected, actual = reference.similarities(query), stored.similarities(query)
+        errors.append(np.abs(expected - actual).max())
+        overlap += len(np.intersect1d(top_k_indices(expected, k), top_k_indices(actual, k)))
+    return {
+        "max_abs_error": float(np.max(errors)),
+        "mean_max_abs_error": float(np.mean(errors)),
+        f"recall@{k}": overlap / (k * len(queries)),
+    }
+
+
+if __name__ == "__main__":
+    # python embedding_store.py [sentence_transformer_embeddings.pkl] [store dir] [float16|int8]
+    PKL_DIR = Path(__file__).parent / "PKL_files"
+    pkl_path = Path(sys.argv[1]) if len(sys.argv) > 1 else PKL_DIR / "sentence_transformer_embeddings.pkl"
+    out_dir = Path(sys.argv[2]) if len(sys.argv) > 2 else PKL_DIR / "st_embedding_store"
+    dtype = sys.argv[3] if len(sys.argv) > 3 else "float16"
+    migrate_pickle(pkl_path, out_dir, dtype=dtype)
+    print(f"✓ Wrote {dtype} store to {out_dir}")
+    for name, value in check_accuracy(pkl_path, out_dir).items():
+        print(f"   {name}: {value:.6f}")
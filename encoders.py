@@ -0,0 +1,214 @@
+#Query encoder backends: the stock sentence-transformers model ("torch"), its transformer exported to ONNX and
+#run by onnxruntime ("onnx"), and a dynamically int8-quantized copy of that graph ("onnx-int8"). The ONNX
+#encoders tokenize, pool and normalize like the source model and expose the same encode() interface, so
+#ReviewerRecommender uses them unchanged. Corpus embeddings are still built with the torch model; exports
+#are made offline (python encoders.py export) and checked against it (python encoders.py parity).
+import argparse
+import json
+import pickle
+import time
+from pathlib import Path
+
+import numpy as np
+
+ENCODER_BACKEND = "torch"     # "torch", "onnx" or "onnx-int8"
+ONNX_DIR = Path(__file__).parent / "PKL_files" / "onnx_encoders"   # one sub-directory per exported model
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model_int8.onnx"}
+ENCODER_CONFIG = "encoder_config.json"
+ONNX_OPSET = 14
+# Parity: lowest acceptable cosine between a backend's embedding and the torch model's, per text
+PARITY_MIN_COSINE = {"onnx": 0.9999, "onnx-int8": 0.98}
+PARITY_TEXTS = [
+    "Graph neural networks for molecular property prediction",
+    "A survey of approximate nearest neighbour search over dense embeddings",
+    "We propose a convolutional architecture for low-light image enhancement trained without paired data.",
+    "Reviewer assignment as a constrained matching problem with load balancing and conflict-of-interest rules",
+    "Byzantine fault tolerant consensus in permissioned blockchains",
+    "transformer language models pretraining fine-tuning downstream tasks " * 40,
+]
+
+
+def export_dir(model_name, root=None): #Directory holding a model's ONNX export
+    return Path(root or ONNX_DIR) / model_name.replace("/", "__")
+
+
+def set_torch_threads(num_threads): #torch intra-op threads for the "torch" backend (None keeps torch's default)
+    if num_threads:
+        import torch
+        torch.set_num_threads(num_threads)
+
+
+class OnnxEncoder:  # SentenceTransformer.encode() over an exported ONNX transformer: tokenize, run, pool, normalize
+    def __init__(self, directory, backend="onnx", num_threads=None):
+        import onnxruntime
+        from transformers import AutoTokenizer
+        directory = Path(directory)
+        with open(directory / ENCODER_CONFIG, encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.backend = backend
+        self.max_seq_length = self.config["max_seq_length"]
+        self.tokenizer = AutoTokenizer.from_pretrained(str(directory))
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(str(directory / ONNX_FILES[backend]), options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def _pool(self, hidden, mask): #Sentence vectors from token states, as the model's Pooling module
+        mode = self.config["pooling"]
+        if mode == "cls":
+            return hidden[:, 0]
+        mask = mask[:, :, None].astype(hidden.dtype)
+        if mode == "max":
+            return np.where(mask > 0, hidden, -1e9).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+    def _encode_batch(self, texts):
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np")
+        feed = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        hidden = self.session.run(None, feed)[0]
+        vectors = self._pool(hidden, encoded["attention_mask"])
+        if self.config["normalize"]:
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors.astype(np.float32)
+
+    def encode(self, sentences, convert_to_numpy=True, batch_size=32, **kwargs):
+        if isinstance(sentences, str):
+            return self._encode_batch([sentences])[0]
+        if not sentences:
+            return np.zeros((0, self.config["dim"]), dtype=np.float32)
+        # Length-sorted batches pad less; rows are returned in input order
+        order = np.argsort([-len(text) for text in sentences], kind="stable")
+        vectors = np.empty((len(sentences), self.config["dim"]), dtype=np.float32)
+        for start in range(0, len(sentences), batch_size):
+            batch = order[start:start + batch_size]
+            vectors[batch] = self._encode_batch([sentences[i] for i in batch])
+        return vectors
+
+
+def load_encoder(model_name, backend=None, num_threads=None, root=None): #Encoder for model_name with encode()/max_seq_length
+    backend = backend or ENCODER_BACKEND
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer  # torch import deferred to first model load
+        set_torch_threads(num_threads)
+        return SentenceTransformer(model_name)
+    if backend not in ONNX_FILES:
+        raise ValueError(f"Unknown encoder backend: {backend}")
+    directory = export_dir(model_name, root)
+    if not (directory / ONNX_FILES[backend]).exists():
+        raise FileNotFoundError(f"No {backend} export of {model_name} in {directory}; run: python encoders.py export {model_name}")
+    return OnnxEncoder(directory, backend, num_threads)
+
+
+def _pooling_config(model): #(pooling mode, normalize) of a SentenceTransformer; only Transformer/Pooling/Normalize stacks export
+    modules = list(model)
+    names = [type(module).__name__ for module in modules]
+    if names[:2] != ["Transformer", "Pooling"] or any(name != "Normalize" for name in names[2:]):
+        raise ValueError(f"Cannot export module stack {names}: only Transformer, Pooling[, Normalize] is supported")
+    mode = modules[1].get_pooling_mode_str()
+    if mode not in ("cls", "mean", "max"):
+        raise ValueError(f"Unsupported pooling mode: {mode}")
+    return mode, "Normalize" in names
+
+
+def export(model_name, root=None, quantize=True): #Write model.onnx (+ model_int8.onnx), tokenizer and config; returns the directory
+    import torch
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name, device="cpu")
+    pooling, normalize = _pooling_config(model)
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    directory = export_dir(model_name, root)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "tokens"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "tokens"}
+
+    class HiddenStates(torch.nn.Module):  # The transformer returning only its token states
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, *inputs):
+            return self.inner(**dict(zip(input_names, inputs)))[0]
+
+    with torch.no_grad():
+        torch.onnx.export(HiddenStates(transformer), tuple(sample[name] for name in input_names),
+                          str(directory / ONNX_FILES["onnx"]), input_names=input_names,
+                          output_names=["last_hidden_state"], dynamic_axes=dynamic_axes, opset_version=ONNX_OPSET)
+    tokenizer.save_pretrained(str(directory))
+    config = {"model_name": model_name, "max_seq_length": model.max_seq_length, "pooling": pooling,
+              "normalize": normalize, "dim": model.get_sentence_embedding_dimension(), "inputs": input_names}
+    with open(directory / ENCODER_CONFIG, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    if quantize:
+        quantize_export(directory)
+    return directory
+
+
+def quantize_export(directory): #Dynamic int8 quantization of model.onnx (weights int8, activations quantized per call)
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    directory = Path(directory)
+    quantize_dynamic(str(directory / ONNX_FILES["onnx"]), str(directory / ONNX_FILES["onnx-int8"]),
+                     weight_type=QuantType.QInt8)
+
+
+def parity(model_name, backend, texts=PARITY_TEXTS, num_threads=None, root=None, repeats=3): #{"min_cosine", "mean_cosine", "torch_ms", "backend_ms", "speedup"}
+    reference = load_encoder(model_name, "torch", num_threads)
+    candidate = load_encoder(model_name, backend, num_threads, root)
+    results = []
+    for encoder in (reference, candidate):
+        encoder.encode(texts[:1], convert_to_numpy=True)   # warmup
+        start = time.perf_counter()
+        for _ in range(repeats):
+            vectors = np.asarray(encoder.encode(texts, convert_to_numpy=True), dtype=np.float32)
+        results.append((vectors, (time.perf_counter() - start) * 1000 / repeats))
+    (expected, torch_ms), (actual, backend_ms) = results
+    expected = expected / np.maximum(np.linalg.norm(expected, axis=1, keepdims=True), 1e-12)
+    actual = actual / np.maximum(np.linalg.norm(actual, axis=1, keepdims=True), 1e-12)
+    cosines = np.einsum("ij,ij->i", expected, actual)
+    return {"min_cosine": float(cosines.min()), "mean_cosine": float(cosines.mean()), "torch_ms": round(torch_ms, 2),
+            "backend_ms": round(backend_ms, 2), "speedup": round(torch_ms / backend_ms, 2) if backend_ms > 0 else None}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export query encoders to ONNX and check them against the torch model")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="export a sentence-transformers model to ONNX (+ int8)")
+    export_parser.add_argument("model_name", nargs="?", help="defaults to the model of the current embeddings")
+    export_parser.add_argument("--no-quantize", action="store_true")
+    parity_parser = commands.add_parser("parity", help="cosine drift and encode speed of a backend vs torch; exit 1 past the bound")
+    parity_parser.add_argument("model_name", nargs="?", help="defaults to the model of the current embeddings")
+    parity_parser.add_argument("--backend", choices=sorted(ONNX_FILES), default="onnx-int8")
+    parity_parser.add_argument("--threads", type=int)
+    parity_parser.add_argument("--min-cosine", type=float, help="defaults to PARITY_MIN_COSINE[backend]")
+    args = parser.parse_args()
+
+    model_name = args.model_name
+    if model_name is None:
+        from Sentence_Transformer import default_embeddings_path
+        from embedding_store import is_store, load_store
+        path = default_embeddings_path()
+        if is_store(path):
+            model_name = load_store(path)["model_name"]
+        else:
+            with open(path, "rb") as f:
+                model_name = pickle.load(f)["model_name"]
+
+    if args.command == "export":
+        print(f"✓ Exported {model_name} to {export(model_name, quantize=not args.no_quantize)}")
+    else:
+        result = parity(model_name, args.backend, num_threads=args.threads)
+        bound = args.min_cosine if args.min_cosine is not None else PARITY_MIN_COSINE[args.backend]
+        print(f"{args.backend} vs torch: min cosine {result['min_cosine']:.6f}, mean {result['mean_cosine']:.6f} "
+              f"(bound {bound}); encode {result['backend_ms']:.1f} ms vs {result['torch_ms']:.1f} ms, "
+              f"{result['speedup']}x")
+        if result["min_cosine"] < bound:
+            print("✗ Parity check failed")
+            raise SystemExit(1)
+        print("✓ Parity check passed")
@@ -0,0 +1,176 @@
+#Rank fusion over full-depth retriever output: every author a retriever scores takes part, not just its top 20
+#A retriever returns an AuthorRanking (scores for all of its authors, or for a shortlist). fuse() maps the
+#rankings onto one process-wide author id space, scores every author with array operations and only builds
+#tuples for the top_k. Retrievers are added with register_retriever() (RRF_Ensemble registers BM25 and the
+#sentence transformer); nothing in the fusion code names them.
+import threading
+
+import numpy as np
+
+FUSION_METHOD = "rrf"     # "rrf", "weighted" (RRF scaled by retriever weight) or "combsum" (sum of min-max scores)
+RRF_K = 60
+FUSION_DEPTH = None       # ranks deeper than this are ignored; None fuses every ranked author (20 = the old top-20 fusion)
+
+
+class AuthorRanking:  # One retriever's output: scores of authors[ids], ranked by score (ties by id)
+    def __init__(self, authors, scores, avg_scores=None, counts=None, ids=None, order=None):
+        self.authors = authors        # author id -> name; usually the retriever's shared AuthorIndex.authors
+        self.ids = np.arange(len(scores)) if ids is None else np.asarray(ids, dtype=np.int64)
+        self.scores = np.asarray(scores)
+        self.avg_scores = self.scores if avg_scores is None else np.asarray(avg_scores)
+        self.counts = np.zeros(len(self.ids), dtype=np.int64) if counts is None else np.asarray(counts)
+        self._order = None if order is None else np.asarray(order, dtype=np.int64)
+        self._ranks = None
+
+    @classmethod
+    def from_rankings(cls, rankings): #From (author, rank, max_score, avg_score, num_papers) tuples, keeping their order
+        rankings = sorted(rankings, key=lambda item: item[1])
+        return cls([item[0] for item in rankings], [item[2] for item in rankings], [item[3] for item in rankings],
+                   [item[4] for item in rankings], order=np.arange(len(rankings)))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def order(self): #Positions (into ids) from best to worst
+        if self._order is None:
+            self._order = np.argsort(-self.scores, kind="stable")
+        return self._order
+
+    @property
+    def ranks(self): #1-based rank of each position
+        if self._ranks is None:
+            self._ranks = np.empty(len(self.ids), dtype=np.int64)
+            self._ranks[self.order] = np.arange(1, len(self.ids) + 1)
+        return self._ranks
+
+    def entry(self, position): #(author, rank, score, avg_score, num_papers) tuple of one position
+        return (self.authors[self.ids[position]], int(self.ranks[position]), float(self.scores[position]),
+                float(self.avg_scores[position]), int(self.counts[position]))
+
+    def top(self, k=None): #Legacy ranking tuples of the k best authors (all for None)
+        return [self.entry(position) for position in self.order[:k]]
+
+
+def as_ranking(value): #AuthorRanking, or one built from a list of ranking tuples
+    return value if isinstance(value, AuthorRanking) else AuthorRanking.from_rankings(value or [])
+
+
+class AuthorSpace:  # Process-wide author name -> id map; each distinct author list is mapped once
+    MAX_MAPPED = 16
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self._mapped = {}     # id(author list) -> (author list, global ids)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def global_ids(self, authors): #Global id of every name in authors (cached while the same list object is passed)
+        entry = self._mapped.get(id(authors))
+        if entry is not None and entry[0] is authors:
+            return entry[1]
+        with self._lock:
+            for name in authors:
+                if name not in self.ids:
+                    self.ids[name] = len(self.names)
+                    self.names.append(name)
+            mapped = np.fromiter((self.ids[name] for name in authors), dtype=np.int64, count=len(authors))
+            if len(self._mapped) >= self.MAX_MAPPED:
+                self._mapped.clear()
+            self._mapped[id(authors)] = (authors, mapped)
+        return mapped
+
+
+AUTHOR_SPACE = AuthorSpace()
+
+
+def _contributions(ranking, positions, ranks, method, k, weight): #Fused-score contribution of each position
+    if method == "rrf":
+        return 1.0 / (k + ranks)
+    if method == "weighted":
+        return weight / (k + ranks)
+    if method == "combsum":
+        scores = ranking.scores[positions].astype(np.float64)
+        if len(scores) == 0:
+            return scores
+        lo, hi = scores.min(), scores.max()
+        return weight * (np.ones_like(scores) if hi == lo else (scores - lo) / (hi - lo))
+    raise ValueError(f"Unknown fusion method: {method}")
+
+
+def fuse(rankings, method=None, top_k=10, k=RRF_K, weights=None, depth=None, with_entries=True): #[(author, score, {retriever: ranking tuple})], best first
+    #rankings: {retriever name: AuthorRanking or ranking tuples}; weights: {retriever name: weight} (default 1).
+    #Ties are broken by the first retriever (in rankings order) that ranks the author, then by its rank there.
+    #with_entries=False leaves the per-retriever tuples out (None), e.g. when scoring every author.
+    method = method or FUSION_METHOD
+    depth = FUSION_DEPTH if depth is None else depth
+    weights = weights or {}
+    rankings = {name: as_ranking(ranking) for name, ranking in rankings.items()}
+    mapped = {name: AUTHOR_SPACE.global_ids(ranking.authors)[ranking.ids] for name, ranking in rankings.items()}
+    n = len(AUTHOR_SPACE)
+
+    fused = np.zeros(n)
+    first_retriever = np.full(n, len(rankings), dtype=np.int64)
+    first_rank = np.zeros(n, dtype=np.int64)
+    kept = {}
+    for r, (name, ranking) in enumerate(rankings.items()):
+        positions = np.flatnonzero(ranking.ranks <= depth) if depth is not None else np.arange(len(ranking))
+        ranks = ranking.ranks[positions]
+        authors = mapped[name][positions]
+        fused[authors] += _contributions(ranking, positions, ranks, method, k, weights.get(name, 1.0))
+        new = first_retriever[authors] == len(rankings)
+        first_retriever[authors[new]] = r
+        first_rank[authors[new]] = ranks[new]
+        kept[name] = (positions, authors)
+
+    # Top k among authors some retriever ranked; all tied at the k-th score are sorted before cutting
+    candidates = np.flatnonzero(first_retriever < len(rankings))
+    if top_k is not None and top_k < len(candidates):
+        if top_k <= 0:
+            return []
+        kth = np.partition(fused[candidates], len(candidates) - top_k)[len(candidates) - top_k]
+        candidates = candidates[fused[candidates] >= kth]
+    candidates = candidates[np.lexsort((first_rank[candidates], first_retriever[candidates], -fused[candidates]))][:top_k]
+
+    if not with_entries:
+        return [(AUTHOR_SPACE.names[a], float(fused[a]), None) for a in candidates]
+
+    # Each retriever's entry for the selected authors
+    entries = [{} for _ in candidates]
+    slot = np.full(n, -1, dtype=np.int64)
+    slot[candidates] = np.arange(len(candidates))
+    for name, ranking in rankings.items():
+        positions, authors = kept[name]
+        for position, i in zip(positions[slot[authors] >= 0], slot[authors][slot[authors] >= 0]):
+            entries[i][name] = ranking.entry(position)
+    return [(AUTHOR_SPACE.names[a], float(fused[a]), entry) for a, entry in zip(candidates, entries)]
+
+
+class Retriever:  # A registered retriever; run(context, depth) and run_in_process(raw_text, depth) return an AuthorRanking
+    def __init__(self, name, run, run_in_process=None, attribute=None, prefix=None, weight=1.0):
+        self.name = name
+        self.run = run                        # thread/sequential: gets the QueryContext
+        self.run_in_process = run_in_process  # process pool: gets the extracted text (must be picklable)
+        self.attribute = attribute            # QueryContext attribute its ranking tuples are stored in, if any
+        self.prefix = prefix or name.lower()  # key prefix in fused details: <prefix>_rank, <prefix>_score
+        self.weight = weight                  # used by the "weighted" and "combsum" methods
+
+
+RETRIEVERS = {}   # name -> Retriever, in registration (= tie-break) order
+
+
+def register_retriever(name, run, run_in_process=None, attribute=None, prefix=None, weight=1.0): #Add (or replace) a retriever
+    retriever = Retriever(name, run, run_in_process, attribute, prefix, weight)
+    RETRIEVERS[name] = retriever
+    return retriever
+
+
+def unregister_retriever(name):
+    RETRIEVERS.pop(name, None)
+
+
+def retriever_weights(): #{name: weight} of the registered retrievers
+    return {name: retriever.weight for name, retriever in RETRIEVERS.items()}
@@ -0,0 +1,234 @@
+#Pipeline instrumentation: wall time, call count and peak-RSS growth per stage (extraction, cleaning,
+#bm25_scoring, st_encoding, similarity, aggregation, fusion, reranking), exposed three ways: a per-request
+#breakdown (trace()), process-wide totals as Prometheus text (prometheus_text()) and an optional
+#cProfile/pyinstrument capture of one request. A stage costs two perf_counter and two getrusage calls.
+import argparse
+import contextlib
+import contextvars
+import functools
+import io
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: no getrusage, peak RSS is reported as 0
+    resource = None
+
+INSTRUMENTATION_ENABLED = os.environ.get("RR_INSTRUMENT", "1").lower() not in ("0", "false", "no")
+PROFILE_TOP_N = 30        # functions listed in a cProfile report
+
+STAGES = ("extraction", "cleaning", "bm25_scoring", "st_encoding", "similarity", "aggregation", "fusion", "reranking")
+
+
+def peak_rss(): #Peak resident set size of this process in bytes (0 where unavailable)
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024   # bytes on macOS, KiB on Linux
+
+
+def current_rss(): #Current resident set size in bytes from /proc (0 elsewhere)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+class Trace:  # Stage timings of one request (or one batch); shared by the threads working on it
+    def __init__(self):
+        self.stages = {}          # stage -> [calls, seconds, peak RSS growth in bytes]
+        self.start = time.perf_counter()
+        self.total = None
+        self.profile = None       # profiler report text, if one was requested
+
+    def add(self, name, seconds, rss_growth=0, calls=1):
+        with _LOCK:
+            entry = self.stages.setdefault(name, [0, 0.0, 0])
+            entry[0] += calls
+            entry[1] += seconds
+            entry[2] = max(entry[2], rss_growth)
+
+    def merge(self, other, record_totals=False): #Add another trace's stages (e.g. from a batch or a worker process)
+        #record_totals also adds them to this process's totals, for traces collected in another process
+        for name, (calls, seconds, rss_growth) in other.stages.items():
+            self.add(name, seconds, rss_growth, calls)
+            if record_totals:
+                _record_totals(name, seconds, rss_growth, calls)
+
+    def breakdown(self): #{"total_ms", "stages": {stage: {"ms", "calls", "peak_rss_growth_bytes"}}[, "profile"]}
+        total = self.total if self.total is not None else time.perf_counter() - self.start
+        result = {
+            "total_ms": round(total * 1000, 3),
+            "stages": {name: {"ms": round(seconds * 1000, 3), "calls": calls, "peak_rss_growth_bytes": rss_growth}
+                       for name, (calls, seconds, rss_growth) in self.stages.items()},
+        }
+        if self.profile is not None:
+            result["profile"] = self.profile
+        return result
+
+
+class StageTotals:  # Process-wide totals of one stage, for prometheus_text()
+    __slots__ = ("calls", "seconds", "max_seconds", "max_rss_growth")
+
+    def __init__(self):
+        self.calls, self.seconds, self.max_seconds, self.max_rss_growth = 0, 0.0, 0.0, 0
+
+
+_LOCK = threading.Lock()
+_TOTALS = {}
+_TRACE = contextvars.ContextVar("rr_trace", default=None)
+
+
+def _record_totals(name, seconds, rss_growth, calls=1):
+    with _LOCK:
+        totals = _TOTALS.get(name)
+        if totals is None:
+            totals = _TOTALS[name] = StageTotals()
+        totals.calls += calls
+        totals.seconds += seconds
+        totals.max_seconds = max(totals.max_seconds, seconds / calls)
+        totals.max_rss_growth = max(totals.max_rss_growth, rss_growth)
+
+
+def record(name, seconds, rss_growth=0): #Add one stage measurement to the totals and to the active trace
+    _record_totals(name, seconds, rss_growth)
+    trace = _TRACE.get()
+    if trace is not None:
+        trace.add(name, seconds, rss_growth)
+
+
+@contextlib.contextmanager
+def stage(name): #Time the enclosed block as one call of stage name
+    if not INSTRUMENTATION_ENABLED:
+        yield
+        return
+    start, peak = time.perf_counter(), peak_rss()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start, peak_rss() - peak)
+
+
+def timed(name): #Decorator: every call of the function is one call of stage name
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _start_profiler(kind):
+    if kind is None:
+        return None
+    if kind == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    if kind == "pyinstrument":
+        from pyinstrument import Profiler  # optional dependency
+        profiler = Profiler()
+        profiler.start()
+        return profiler
+    raise ValueError(f"Unknown profiler: {kind}")
+
+
+def _stop_profiler(profiler): #Report text of a started profiler
+    if profiler is None:
+        return None
+    if hasattr(profiler, "disable"):
+        import pstats
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        return out.getvalue()
+    profiler.stop()
+    return profiler.output_text()
+
+
+@contextlib.contextmanager
+def trace(profile=None): #Collect the stages run inside the block (this thread, plus work submitted via submit())
+    #profile: None, "cprofile" or "pyinstrument"; profilers only see the calling thread. A trace opened
+    #inside another one also adds its stages to the outer trace when it closes.
+    parent = _TRACE.get()
+    active = Trace()
+    token = _TRACE.set(active)
+    profiler = _start_profiler(profile)
+    try:
+        yield active
+    finally:
+        active.profile = _stop_profiler(profiler)
+        active.total = time.perf_counter() - active.start
+        _TRACE.reset(token)
+        if parent is not None:
+            parent.merge(active)
+
+
+def traced_call(fn, *args, **kwargs): #(fn(*args), Trace of the call); also usable as a process-pool task
+    with trace() as active:
+        result = fn(*args, **kwargs)
+    return result, active
+
+
+def submit(pool, fn, *args): #pool.submit that carries the active trace into a worker thread
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def stage_totals(): #{stage: {"calls", "seconds", "max_seconds", "max_rss_growth_bytes"}} for this process
+    with _LOCK:
+        return {name: {"calls": t.calls, "seconds": t.seconds, "max_seconds": t.max_seconds,
+                       "max_rss_growth_bytes": t.max_rss_growth} for name, t in _TOTALS.items()}
+
+
+def prometheus_text(): #Stage totals and process memory in the Prometheus text format
+    totals = stage_totals()
+    lines = ["# HELP rr_stage_seconds Wall time spent per pipeline stage", "# TYPE rr_stage_seconds summary"]
+    for name, t in totals.items():
+        lines += [f'rr_stage_seconds_sum{{stage="{name}"}} {t["seconds"]:.6f}',
+                  f'rr_stage_seconds_count{{stage="{name}"}} {t["calls"]}']
+    lines += ["# HELP rr_stage_seconds_max Slowest single call per stage", "# TYPE rr_stage_seconds_max gauge"]
+    lines += [f'rr_stage_seconds_max{{stage="{name}"}} {t["max_seconds"]:.6f}' for name, t in totals.items()]
+    lines += ["# HELP rr_stage_peak_rss_growth_bytes Largest peak-RSS increase caused by one call",
+              "# TYPE rr_stage_peak_rss_growth_bytes gauge"]
+    lines += [f'rr_stage_peak_rss_growth_bytes{{stage="{name}"}} {t["max_rss_growth_bytes"]}' for name, t in totals.items()]
+    lines += ["# TYPE rr_process_resident_memory_bytes gauge", f"rr_process_resident_memory_bytes {current_rss()}",
+              "# TYPE rr_process_peak_resident_memory_bytes gauge", f"rr_process_peak_resident_memory_bytes {peak_rss()}"]
+    return "\n".join(lines) + "\n"
+
+
+def reset(): #Clear the process-wide totals
+    with _LOCK:
+        _TOTALS.clear()
+
+
+def print_breakdown(breakdown):
+    print(f"Total: {breakdown['total_ms']:.1f} ms")
+    for name, s in sorted(breakdown["stages"].items(), key=lambda item: -item[1]["ms"]):
+        print(f"   {name:<14} {s['ms']:10.1f} ms  {s['calls']:6d} calls  +{s['peak_rss_growth_bytes'] / 2**20:8.1f} MiB peak RSS")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline once on a PDF and print the per-stage breakdown")
+    parser.add_argument("pdf")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--profile", choices=("cprofile", "pyinstrument"))
+    parser.add_argument("--cold", action="store_true", help="skip warmup, so loading counts against the stages")
+    args = parser.parse_args()
+
+    import instrumentation  # the pipeline modules record into the imported module, not __main__
+    import startup
+    module = startup.load_reranking_module()
+    if not args.cold:
+        startup.warmup()
+    with contextlib.redirect_stdout(io.StringIO()), instrumentation.trace(profile=args.profile) as active:
+        module.get_reranked_recommendations(args.pdf, top_k=args.top_k, use_cache=False)
+    breakdown = active.breakdown()
+    print_breakdown(breakdown)
+    if "profile" in breakdown:
+        print(breakdown["profile"])
@@ -0,0 +1,97 @@
+#Shared PDF text extraction: page generator, page/character budgets, early stop at the references
+#and a multi-process extractor for batch jobs. bm25_query and ReviewerRecommender both delegate here.
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from instrumentation import timed
+
+# Budgets per PDF (None = unlimited). Supplementary-laden PDFs stop here instead of costing unbounded
+# time and memory; a typical 40-page paper is far below both.
+MAX_PAGES = 200
+MAX_CHARS = 2_000_000
+
+# Stop reading once the references/bibliography begin after the paper's first section start:
+# clean_paper_text cuts there anyway, so the BM25 query is unchanged. Extraction never stops before
+# MIN_WORDS_BEFORE_STOP words, which keeps the default 512-word sentence-transformer query unchanged.
+STOP_AT_REFERENCES = True
+MIN_WORDS_BEFORE_STOP = 512
+
+
+def open_pdf(pdf_input): #fitz Document from a path, raw bytes or a file-like upload (e.g. Streamlit UploadedFile)
+    import fitz  # PyMuPDF
+    if hasattr(pdf_input, "read"):
+        try:
+            pdf_input.seek(0)  # reset pointer before reading
+        except Exception:
+            pass
+        pdf_bytes = pdf_input.read()
+        if not pdf_bytes:
+            raise ValueError("⚠️ Uploaded PDF stream is empty. Try re-uploading the file.")
+        return fitz.open(stream=pdf_bytes, filetype="pdf")
+    if isinstance(pdf_input, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=bytes(pdf_input), filetype="pdf")
+    if isinstance(pdf_input, (str, os.PathLike)):
+        return fitz.open(pdf_input)
+    raise ValueError(f"Unsupported input type for extract_text_from_pdf: {type(pdf_input)}")
+
+
+def iter_pages(pdf_input, max_pages=None): #Yield page texts one at a time; the document is closed when the generator ends
+    doc = open_pdf(pdf_input)
+    try:
+        for i, page in enumerate(doc):
+            if max_pages is not None and i >= max_pages:
+                break
+            yield page.get_text("text")
+    finally:
+        doc.close()
+
+
+def _references_started(pages): #True when the references begin after the first section start of the text so far
+    from preprocessing import SECTION_END_RE, SECTION_START_RE, normalize
+    # Same normalization and markers as strip_front_matter/strip_back_matter; the text so far ends at a
+    # page break ("\n" in the joined text), so a marker found here is also found in the full text
+    text = normalize("\n".join(pages))
+    start = SECTION_START_RE.search(text)
+    return start is not None and SECTION_END_RE.search(text, start.start()) is not None
+
+
+@timed("extraction")
+def extract_text(pdf_input, max_pages=None, max_chars=None, stop_at_references=None): #Page texts joined by newlines, within the budgets
+    from preprocessing import SECTION_END_RE, normalize
+    max_pages = MAX_PAGES if max_pages is None else max_pages
+    max_chars = MAX_CHARS if max_chars is None else max_chars
+    stop_at_references = STOP_AT_REFERENCES if stop_at_references is None else stop_at_references
+    pages, chars, words = [], 0, 0
+    for text in iter_pages(pdf_input, max_pages=max_pages):
+        if max_chars is not None and chars + len(text) > max_chars:
+            pages.append(text[:max(0, max_chars - chars)])
+            break
+        pages.append(text)
+        chars += len(text) + 1
+        words += len(text.split())
+        # Full check only on pages that contain an end marker themselves
+        if (stop_at_references and words >= MIN_WORDS_BEFORE_STOP and SECTION_END_RE.search(normalize(text))
+                and _references_started(pages)):
+            break
+    return "\n".join(pages)
+
+
+def extraction_version(): #Settings that change extracted text, for cache keys
+    return (MAX_PAGES, MAX_CHARS, STOP_AT_REFERENCES, MIN_WORDS_BEFORE_STOP)
+
+
+def _extract_safely(pdf_path, max_pages, max_chars, stop_at_references):
+    try:
+        return extract_text(pdf_path, max_pages, max_chars, stop_at_references), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def extract_many(pdf_paths, workers=None, max_pages=None, max_chars=None, stop_at_references=None): #Yield (path, text, error) in input order
+    #Extraction runs in a process pool; a PDF that fails yields text None and the error message
+    pdf_paths = list(pdf_paths)
+    args = (max_pages, max_chars, stop_at_references)
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        results = pool.map(_extract_safely, pdf_paths, *[[a] * len(pdf_paths) for a in args], chunksize=4)
+        for path, (text, error) in zip(pdf_paths, results):
+            yield path, text, error
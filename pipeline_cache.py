@@ -0,0 +1,269 @@
+#Pipeline cache: per-request intermediates keyed on a SHA-256 of the PDF bytes, so re-uploads of the same paper are free
+#Layers: "text" (extracted PDF text), "tokens" (cleaned BM25 tokens), "st_embedding" (query embedding) and
+#"rankings" (final re-ranked results). Each layer's key also carries the versions it depends on, so a rebuilt
+#index or another model never serves stale entries. An in-memory LRU is backed by an optional disk tier.
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+CACHE_ENABLED = True
+CACHE_MAX_ENTRIES = 1024
+CACHE_MAX_BYTES = 256 * 1024 * 1024          # in-memory tier
+CACHE_DIR = os.environ.get("RR_CACHE_DIR")   # disk tier directory; None keeps the cache in memory only
+DISK_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+DISK_RESCAN_EVERY = 256   # disk writes between directory rescans (picks up entries other processes wrote)
+DISK_PRUNE_TO = 0.9       # pruning frees space down to this fraction of the budget, so it is not rerun every write
+
+LAYERS = ("text", "tokens", "st_embedding", "rankings")
+
+
+def read_pdf_bytes(pdf_input): #Raw bytes of a PDF path, bytes object or file-like upload
+    if isinstance(pdf_input, (bytes, bytearray, memoryview)):
+        return bytes(pdf_input)
+    if hasattr(pdf_input, "read"):
+        try:
+            pdf_input.seek(0)
+        except Exception:
+            pass
+        data = pdf_input.read()
+        try:
+            pdf_input.seek(0)  # leave the stream readable for anyone else
+        except Exception:
+            pass
+        if not data:
+            raise ValueError("Uploaded PDF stream is empty. Try re-uploading the file.")
+        return data
+    if isinstance(pdf_input, (str, os.PathLike)):
+        with open(pdf_input, "rb") as f:
+            return f.read()
+    raise ValueError(f"Unsupported input type for read_pdf_bytes: {type(pdf_input)}")
+
+
+def content_hash(data): #SHA-256 hex digest of bytes (or of a str's UTF-8 encoding)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(*parts): #Stable key from a content hash plus any version parts
+    return hashlib.sha256("\x1f".join(map(str, parts)).encode("utf-8")).hexdigest()
+
+
+def file_version(*paths): #Cheap version of on-disk artifacts: (name, size, mtime) of each existing file
+    #A store directory contributes the files inside it
+    parts = []
+    for path in paths:
+        path = Path(path)
+        files = sorted(path.iterdir()) if path.is_dir() else [path]
+        for f in files:
+            if f.exists():
+                stat = f.stat()
+                parts.append(f"{f.name}:{stat.st_size}:{stat.st_mtime_ns}")
+            else:
+                parts.append(f"{f.name}:missing")
+    return "|".join(parts)
+
+
+def sizeof(value): #Approximate memory footprint used for the byte budget
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (str, bytes)):
+        return len(value) + 64
+    if isinstance(value, (list, tuple)):
+        return 64 + sum(sizeof(v) for v in value)
+    if isinstance(value, dict):
+        return 64 + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class LRUCache:  # Thread-safe in-memory LRU bounded by entry count and approximate bytes
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value):
+        size = sizeof(value)
+        if size > self.max_bytes:
+            return  # would evict everything else; not worth keeping
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+class DiskCache:  # Pickled entries under directory/<layer>/<key>.pkl; least recently used files are pruned past max_bytes
+    #The total size is tracked per write; the directory is only scanned when the total passes max_bytes
+    #or every rescan_every writes (entries written by other processes sharing the directory)
+    def __init__(self, directory, max_bytes=DISK_CACHE_MAX_BYTES, rescan_every=DISK_RESCAN_EVERY):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.rescan_every = rescan_every
+        self._bytes = None     # tracked total size; None until the first scan
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, layer, key):
+        return self.directory / layer / f"{key}.pkl"
+
+    def get(self, layer, key, default=None):
+        path = self._path(layer, key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path)  # mtime doubles as last-access time for pruning
+            return value
+        except FileNotFoundError:
+            return default
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, IndexError, ValueError,
+                TypeError):
+            # Truncated, corrupt or written by incompatible code (renamed class, other numpy): a miss
+            self._discard(path)
+            return default
+
+    def _discard(self, path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        with self._lock:
+            if self._bytes is not None:
+                self._bytes -= size
+
+    def put(self, layer, key, value):
+        path = self._path(layer, key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        size = tmp.stat().st_size
+        try:
+            replaced = path.stat().st_size
+        except OSError:
+            replaced = 0
+        os.replace(tmp, path)  # readers never see a half-written entry
+        with self._lock:
+            self._writes += 1
+            rescan = self._bytes is None or self._writes % self.rescan_every == 0
+            if not rescan:
+                self._bytes += size - replaced
+                rescan = self._bytes > self.max_bytes
+        if rescan:
+            self.prune()
+
+    def prune(self): #Scan the directory; past max_bytes, delete least recently used entries down to DISK_PRUNE_TO of it
+        with self._lock:
+            files = []
+            for p in self.directory.glob("*/*.pkl"):
+                try:
+                    files.append((p.stat(), p))
+                except OSError:   # removed meanwhile
+                    pass
+            total = sum(stat.st_size for stat, _ in files)
+            target = self.max_bytes if total <= self.max_bytes else DISK_PRUNE_TO * self.max_bytes
+            for stat, path in sorted(files, key=lambda item: item[0].st_mtime_ns):
+                if total <= target:
+                    break
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+                total -= stat.st_size
+            self._bytes = total
+
+    def clear(self):
+        for path in self.directory.glob("*/*.pkl"):
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self._bytes = 0
+
+
+class PipelineCache:  # Memory LRU per layer in front of an optional shared disk tier
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, cache_dir=CACHE_DIR,
+                 disk_max_bytes=DISK_CACHE_MAX_BYTES):
+        self.memory = {layer: LRUCache(max_entries, max_bytes // len(LAYERS)) for layer in LAYERS}
+        self.disk = DiskCache(cache_dir, disk_max_bytes) if cache_dir else None
+        self.hits = dict.fromkeys(LAYERS, 0)
+        self.misses = dict.fromkeys(LAYERS, 0)
+
+    def get(self, layer, key): #Cached value or None; disk hits are promoted to memory
+        value = self.memory[layer].get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(layer, key)
+            if value is not None:
+                self.memory[layer].put(key, value)
+        if value is None:
+            self.misses[layer] += 1
+        else:
+            self.hits[layer] += 1
+        return value
+
+    def put(self, layer, key, value):
+        self.memory[layer].put(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.put(layer, key, value)
+            except OSError as e:
+                print(f"✗ Could not write {layer} cache entry: {e}")
+
+    def get_or_compute(self, layer, key, compute): #Cached value, or compute() stored under key
+        value = self.get(layer, key)
+        if value is None:
+            value = compute()
+            self.put(layer, key, value)
+        return value
+
+    def clear(self):
+        for cache in self.memory.values():
+            cache.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        return {layer: {"hits": self.hits[layer], "misses": self.misses[layer], "entries": len(self.memory[layer])}
+                for layer in LAYERS}
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_cache(): #Process-wide PipelineCache, or None when CACHE_ENABLED is off
+    global _CACHE
+    if not CACHE_ENABLED:
+        return None
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = PipelineCache()
+    return _CACHE
@@ -1,14 +1,37 @@
-import os, re, string
-import nltk
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from wordfreq import zipf_frequency
-
-# One-time downloads (safe to leave in your script)
-nltk.download('punkt', quiet=True)
-nltk.download('punkt_tab', quiet=True)   # needed by recent NLTK
-nltk.download('stopwords', quiet=True)
-nltk.download('wordnet', quiet=True)
+import os, re, string, pickle, threading
+from collections import OrderedDict
+from instrumentation import timed
+
+# NLTK (and its data) is only touched on first use. Resources are looked up locally; nothing is
+# downloaded unless RR_NLTK_DOWNLOAD=1 is set.
+NLTK_DOWNLOAD = os.environ.get('RR_NLTK_DOWNLOAD', '').lower() in ('1', 'true', 'yes')
+NLTK_RESOURCES = {  # download name -> accepted data paths (punkt_tab is needed by recent NLTK)
+    'punkt_tab': ['tokenizers/punkt_tab', 'tokenizers/punkt'],
+    'stopwords': ['corpora/stopwords'],
+    'wordnet': ['corpora/wordnet'],
+}
+_NLTK_CHECKED = set()
+
+def ensure_nltk_resources(*names): #Raise a LookupError with the install command for missing NLTK data
+    import nltk
+    for name in names:
+        if name in _NLTK_CHECKED:
+            continue
+        if not any(_nltk_has(path) for path in NLTK_RESOURCES[name]):
+            if not NLTK_DOWNLOAD:
+                raise LookupError(f"NLTK resource '{name}' is not installed. Run "
+                                  f"'python -m nltk.downloader {name}' or set RR_NLTK_DOWNLOAD=1.")
+            nltk.download(name, quiet=True)
+        _NLTK_CHECKED.add(name)
+
+def _nltk_has(path):
+    import nltk
+    try:
+        nltk.data.find(path)
+        return True
+    except LookupError:
+        return False
+
 CUSTOM_STOPWORDS = {
     'discussion', 'conclusion', 'introduction', 'results', 'result',
     'figure', 'table', 'paper', 'manuscript', 'publication', 'author',
@@ -21,9 +44,37 @@ CUSTOM_STOPWORDS = {
     'conference', 'vol', 'no', 'et', 'al'
 }
 
-STOP = set(stopwords.words('english')).union(CUSTOM_STOPWORDS)
+_STOP = None
+_LEMM = None
 
-LEMM = WordNetLemmatizer()
+def get_stopwords(): #NLTK English stopwords + CUSTOM_STOPWORDS, loaded on first use
+    global _STOP
+    if _STOP is None:
+        ensure_nltk_resources('stopwords')
+        from nltk.corpus import stopwords
+        _STOP = set(stopwords.words('english')).union(CUSTOM_STOPWORDS)
+    return _STOP
+
+def get_lemmatizer(): #WordNetLemmatizer, created on first use
+    global _LEMM
+    if _LEMM is None:
+        ensure_nltk_resources('wordnet')
+        from nltk.stem import WordNetLemmatizer
+        _LEMM = WordNetLemmatizer()
+    return _LEMM
+
+def __getattr__(name): # STOP and LEMM stay importable as module attributes
+    if name == 'STOP':
+        return get_stopwords()
+    if name == 'LEMM':
+        return get_lemmatizer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def warmup(): #Load stopwords and WordNet now instead of on the first paper
+    get_stopwords()
+    get_lemmatizer().lemmatize('warmup')   # WordNet itself loads lazily on the first lookup
+
+LEMMA_CACHE_SIZE = 200_000   # distinct surface forms kept in the shared lemma cache
 
 
 
@@ -50,13 +101,127 @@ AFFILIATION_HINTS = [
 ]
 EMAIL_ORCIDs = [r'\b@', r'\borcid\b', r'\b0000-\d{4}-\d{4}-\d{4}\b']
 
+# ---------- Compiled patterns (built once at import) ----------
+# Each list above becomes one alternation: a single search finds the earliest match of any pattern,
+# the same position the original per-pattern finditer/min() scans returned.
+
+def _alternation(patterns):
+    return '|'.join(f'(?:{p})' for p in patterns)
+
+SECTION_START_RE = re.compile(_alternation(SECTION_STARTS), re.I | re.M)
+SECTION_END_RE = re.compile(_alternation(SECTION_ENDS), re.I)
+EMAIL_ORCID_RE = re.compile(_alternation(EMAIL_ORCIDs), re.I)
+AFFILIATION_RE = re.compile('|'.join(map(re.escape, AFFILIATION_HINTS)))   # substring match on lowercased lines
+COUNTRY_RE = re.compile(r'\bindia\b|\busa\b|\buk\b|\bsingapore\b|\bchina\b|\baustralia\b', re.I)
+SECTIONISH_RE = re.compile(r'(abstract|introduction|keywords|index terms)\b', re.I)
+
+HYPHEN_BREAK_RE = re.compile(r'-\s*\n\s*')
+NEWLINES_RE = re.compile(r'\n+')
+
+# Applied in order: a later pattern may match text an earlier substitution produced
+NOISE_PATTERNS = [
+    re.compile(r'\[[0-9,\s\-]+\]'),                          # [12], [1, 2]
+    re.compile(r'\(\s*[A-Z][A-Za-z\-]+,\s*\d{4}\s*\)'),      # (Smith, 2020)
+    re.compile(r'(figure|fig\.?|table)\s+\d+[:.\-]?', re.I),
+    re.compile(r'http\S+|www\.\S+'),
+    re.compile(r'\d{1,4}\s*(%|°[CF]|km|mm|cm|m|hz|khz|mhz|ghz)\b', re.I),
+]
+
+DIGITS_RE = re.compile(r'\d+')
+PUNCT_TABLE = str.maketrans('', '', string.punctuation)
+ASCII_PUNCT_RE = re.compile(f'[{re.escape(string.punctuation)}]')
+
+# The Treebank rules NLTK's word_tokenize still applies once ASCII punctuation is gone: padding around
+# non-ASCII quotes and dashes, and the MacIntyre CONTRACTIONS2 splits that need no apostrophe
+QUOTE_DASH_RE = re.compile(r'[«“‘„»”’\u2012-\u2015]')
+CONTRACTIONS_RE = re.compile(
+    r'(?i)\b(can)(not)\b|\b(gim)(me)\b|\b(gon)(na)\b|\b(got)(ta)\b|\b(lem)(me)\b|\b(wan)(na)(?=\s|$)')
+
+# ---------- Tokenization and lemmatization ----------
+
+def _split_contraction(m):
+    return ' ' + ' '.join(g for g in m.groups() if g) + ' '
+
+def tokenize(text: str) -> list:
+    """
+    Same tokens as nltk.word_tokenize for text whose ASCII punctuation was already stripped.
+    Without '.', '?' or '!' punkt finds a single sentence and only the Treebank rules above can
+    fire, so they are applied directly and the result is split on whitespace.
+    """
+    if ASCII_PUNCT_RE.search(text):
+        import nltk
+        ensure_nltk_resources('punkt_tab')
+        return nltk.word_tokenize(text)            # general text: full NLTK path
+    text = QUOTE_DASH_RE.sub(r' \g<0> ', text)
+    text = CONTRACTIONS_RE.sub(_split_contraction, text)
+    return text.split()
+
+class LemmaCache:  # Bounded LRU of surface form -> lemma, shared by every request in the process
+    def __init__(self, max_entries=LEMMA_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lemmas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._lemmas)
+
+    def lookup(self, words): #{word: lemma} for distinct words; each miss is lemmatized once
+        found, missing = {}, []
+        with self._lock:
+            for w in words:
+                lemma = self._lemmas.get(w)
+                if lemma is None:
+                    missing.append(w)
+                else:
+                    self._lemmas.move_to_end(w)
+                    found[w] = lemma
+        lemmatizer = get_lemmatizer() if missing else None
+        computed = {w: lemmatizer.lemmatize(w) for w in missing}   # POS-agnostic, outside the lock
+        if computed:
+            self.update(computed)
+            found.update(computed)
+        return found
+
+    def update(self, lemmas):
+        with self._lock:
+            self._lemmas.update(lemmas)
+            while len(self._lemmas) > self.max_entries:
+                self._lemmas.popitem(last=False)
+
+    def save(self, path): #Persist next to the index so a fresh process starts warm
+        with self._lock:
+            lemmas = dict(self._lemmas)
+        with open(path, 'wb') as f:
+            pickle.dump(lemmas, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            self.update(pickle.load(f))
+
+LEMMA_CACHE = LemmaCache()
+
+def save_lemma_cache(path):
+    LEMMA_CACHE.save(path)
+
+def load_lemma_cache(path): #Warm the shared cache from a saved file; missing files are ignored
+    if os.path.exists(path):
+        LEMMA_CACHE.load(path)
+
 def normalize(text: str) -> str:
     # unify newlines/spaces, fix hyphenation at line breaks
     text = text.replace('\u00ad', '')           # soft hyphen
-    text = re.sub(r'-\s*\n\s*', '', text)       # remove linebreak hyphenation
-    text = re.sub(r'\n+', '\n', text)
+    text = HYPHEN_BREAK_RE.sub('', text)        # remove linebreak hyphenation
+    text = NEWLINES_RE.sub('\n', text)
     return text
 
+def looks_like_front_matter(ln_strip: str) -> bool: #Affiliation/email/address-like line
+    return bool(
+        AFFILIATION_RE.search(ln_strip.lower()) or
+        EMAIL_ORCID_RE.search(ln_strip) or
+        (',' in ln_strip and len(ln_strip) < 140 and not ln_strip.endswith('.')) or
+        COUNTRY_RE.search(ln_strip)
+    )
+
 def strip_front_matter(raw: str) -> str:
     """
     Remove author/affiliation block without requiring an abstract.
@@ -74,35 +239,20 @@ def strip_front_matter(raw: str) -> str:
             title_line = ln.strip()
             break
 
-
-
-    # Try #1: jump to first clear section start
-    starts = [m.start() for pat in SECTION_STARTS for m in re.finditer(pat, t, flags=re.I|re.M)]
-    if starts:
-        t = t[min(starts):]   # cut before the earliest section marker
+    # Try #1: jump to first clear section start (one scan for all markers)
+    start = SECTION_START_RE.search(t)
+    if start:
+        t = t[start.start():]   # cut before the earliest section marker
     else:
-        # Try #2: heuristic line filtering at the top
-        lines = t.splitlines()
-        kept = []
-        dropping = True
-        for ln in lines:
+        # Try #2: heuristic line filtering at the top; everything from the first "normal" paragraph is kept
+        first_kept = len(lines)
+        for i, ln in enumerate(lines):
             ln_strip = ln.strip()
-            # heuristics that suggest "front matter"
-            looks_affil = (
-                any(h in ln_strip.lower() for h in AFFILIATION_HINTS) or
-                any(re.search(p, ln_strip, flags=re.I) for p in EMAIL_ORCIDs) or
-                (',' in ln_strip and len(ln_strip) < 140 and not ln_strip.endswith('.')) or
-                re.search(r'\bindia\b|\busa\b|\buk\b|\bsingapore\b|\bchina\b|\baustralia\b', ln_strip, flags=re.I)
-            )
-            # once we encounter a "normal" paragraph, stop dropping
             longish_sentence = len(ln_strip) > 120 and ln_strip.endswith('.')
-            sectionish = re.search(r'(abstract|introduction|keywords|index terms)\b', ln_strip, re.I)
-            if dropping and (looks_affil or not longish_sentence) and not sectionish:
-                continue
-            else:
-                dropping = False
-                kept.append(ln)
-        t = '\n'.join(kept)
+            if SECTIONISH_RE.search(ln_strip) or (longish_sentence and not looks_like_front_matter(ln_strip)):
+                first_kept = i
+                break
+        t = '\n'.join(lines[first_kept:])
     if title_line:
         t = title_line + "\n" + t
 
@@ -110,38 +260,77 @@ def strip_front_matter(raw: str) -> str:
 
 def strip_back_matter(text: str) -> str:
     # Cut at References/Bibliography/etc. if present
-    ends = [m.start() for pat in SECTION_ENDS for m in re.finditer(pat, text, flags=re.I)]
-    return text[:min(ends)] if ends else text
+    end = SECTION_END_RE.search(text)
+    return text[:end.start()] if end else text
 
 def remove_noise(text: str) -> str:
-    # citations like [12], (Smith, 2020), figure/table captions noise, urls
-    text = re.sub(r'\[[0-9,\s\-]+\]', ' ', text)                       # [12], [1, 2]
-    text = re.sub(r'\(\s*[A-Z][A-Za-z\-]+,\s*\d{4}\s*\)', ' ', text)   # (Smith, 2020)
-    text = re.sub(r'(figure|fig\.?|table)\s+\d+[:.\-]?', ' ', text, flags=re.I)
-    text = re.sub(r'http\S+|www\.\S+', ' ', text)
-    text = re.sub(r'\d{1,4}\s*(%|°[CF]|km|mm|cm|m|hz|khz|mhz|ghz)\b', ' ', text, flags=re.I)
+    # citations like [12], (Smith, 2020), figure/table captions noise, urls, units
+    for pattern in NOISE_PATTERNS:
+        text = pattern.sub(' ', text)
     return text
 
 def basic_preprocess(text: str) -> str:
     # lower, drop punctuation/digits, tokenize, stopword-remove, simple lemma (no POS)
-    text = text.lower()
-    text = re.sub(r'\d+', ' ', text)
-    text = text.translate(str.maketrans('', '', string.punctuation))
-    tokens = nltk.word_tokenize(text)            # requires punkt + punkt_tab
-    tokens = [w for w in tokens if w not in STOP and len(w) > 2]
-    tokens = [LEMM.lemmatize(w) for w in tokens] # POS-agnostic lemmatization
-    tokens = [w for w in tokens if w.isalpha() and len(w) > 2 and len(w) < 20]
-    tokens = [w for w in tokens if w not in STOP]
-
-    return ' '.join(tokens)
+    text = DIGITS_RE.sub(' ', text.lower()).translate(PUNCT_TABLE)
+    tokens = tokenize(text)
+    # Filter, lemmatize and re-filter once per distinct surface form, then map every occurrence
+    stop = get_stopwords()
+    distinct = set(tokens)
+    lemmas = LEMMA_CACHE.lookup([w for w in distinct if len(w) > 2 and w not in stop])
+    keep = {}
+    for w in distinct:
+        lemma = lemmas.get(w)
+        keep[w] = lemma if lemma is not None and 2 < len(lemma) < 20 and lemma.isalpha() and lemma not in stop else None
+    return ' '.join([keep[w] for w in tokens if keep[w] is not None])
 
+@timed("cleaning")
 def clean_paper_text(raw_text: str) -> str:
     t = strip_front_matter(raw_text)     # drop authors/affiliations block
     t = strip_back_matter(t)             # drop references/appendix etc.
     t = remove_noise(t)                  # drop citations/urls/units
-    t = normalize(t)
+    t = normalize(t)                     # noise removal can expose new line-break hyphens
     t = basic_preprocess(t)              # simple lemma, no POS
     return t
+
+GOLDEN_SAMPLES = [
+    # front matter with a section start, citations, units, urls and a references cut
+    "Deep Residual Learning for Image Recognition\nKaiming He, Xiangyu Zhang\nMicrosoft Research, USA\n"
+    "kaiming@microsoft.com\nAbstract\nDeeper neural net-\nworks are more difficult to train [1, 2]. We present "
+    "a residual learning framework (He, 2016) as shown in Figure 3: results on ImageNet at 224 mm and 50 % error.\n"
+    "See http://example.org/resnet and www.example.com.\n\n\nWe analyze it; it's the networks' depth.\n"
+    "References\n[1] Y. LeCun. Gradient-based learning.",
+    # no section marker: heuristic front-matter dropping
+    "A Study of Things in Many Places\nDepartment of Physics, IIT Delhi, India\nORCID 0000-0002-1825-0097\n"
+    "short line\nThis long paragraph describes the methods we used to measure the spectral lines of distant "
+    "galaxies with a new telescope design.\nMore text about \u00adsoft hyphens and Table 2. Values at 10 GHz "
+    "were recorded; Acknowledgments follow.",
+    # numbered section heading and no back matter
+    "Title With Enough Words\n\n  1. Introduction\nGraph networks, (Smith, 2020) and [3-5] are studied; "
+    "fig. 4 shows 30°C results.\nAppendix-\n  ending text",
+    "",
+]
+
+def check_golden(texts=None): #Texts whose clean_paper_text output differs from the original cleaner (empty = identical)
+    import preprocessing_reference
+    ensure_nltk_resources('punkt_tab')   # the reference tokenizes with nltk.word_tokenize
+    texts = GOLDEN_SAMPLES if texts is None else texts
+    return [text for text in texts if clean_paper_text(text) != preprocessing_reference.clean_paper_text(text)]
+
+if __name__ == "__main__":
+    # python preprocessing.py [paper.txt|paper.pdf ...]: golden check of the compiled cleaner
+    import sys
+    texts = list(GOLDEN_SAMPLES)
+    for path in sys.argv[1:]:
+        if path.lower().endswith('.pdf'):
+            from pdf_extraction import extract_text
+            texts.append(extract_text(path))
+        else:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                texts.append(f.read())
+    mismatches = check_golden(texts)
+    print(f"{len(texts) - len(mismatches)}/{len(texts)} texts byte-identical to the original cleaner")
+    sys.exit(1 if mismatches else 0)
+
 # def process_corpus(base_dir: str, overwrite=True):
 #     for author in os.listdir(base_dir):
 #         ap = os.path.join(base_dir, author)
@@ -0,0 +1,99 @@
+#Frozen copy of the original (pre-compilation) text cleaner, kept only as the golden reference for
+#preprocessing.check_golden: the optimized clean_paper_text must reproduce this output byte for byte.
+import re, string
+import nltk
+
+from preprocessing import SECTION_STARTS, SECTION_ENDS, AFFILIATION_HINTS, EMAIL_ORCIDs, STOP, LEMM
+
+def normalize(text: str) -> str:
+    # unify newlines/spaces, fix hyphenation at line breaks
+    text = text.replace('\u00ad', '')           # soft hyphen
+    text = re.sub(r'-\s*\n\s*', '', text)       # remove linebreak hyphenation
+    text = re.sub(r'\n+', '\n', text)
+    return text
+
+def strip_front_matter(raw: str) -> str:
+    """
+    Remove author/affiliation block without requiring an abstract.
+    Strategy:
+      1) Find the first real section start (Abstract/Introduction/1. Introduction/I. INTRODUCTION).
+         If found, keep from there.
+      2) Else, drop the leading lines that look like affiliations/emails until we hit a 'normal' paragraph.
+    """
+    t = normalize(raw)
+    # Extract first non-empty line as potential title
+    lines = t.splitlines()
+    title_line = ""
+    for ln in lines:
+        if ln.strip() and len(ln.strip().split()) > 2:   # must be a meaningful line
+            title_line = ln.strip()
+            break
+
+
+
+    # Try #1: jump to first clear section start
+    starts = [m.start() for pat in SECTION_STARTS for m in re.finditer(pat, t, flags=re.I|re.M)]
+    if starts:
+        t = t[min(starts):]   # cut before the earliest section marker
+    else:
+        # Try #2: heuristic line filtering at the top
+        lines = t.splitlines()
+        kept = []
+        dropping = True
+        for ln in lines:
+            ln_strip = ln.strip()
+            # heuristics that suggest "front matter"
+            looks_affil = (
+                any(h in ln_strip.lower() for h in AFFILIATION_HINTS) or
+                any(re.search(p, ln_strip, flags=re.I) for p in EMAIL_ORCIDs) or
+                (',' in ln_strip and len(ln_strip) < 140 and not ln_strip.endswith('.')) or
+                re.search(r'\bindia\b|\busa\b|\buk\b|\bsingapore\b|\bchina\b|\baustralia\b', ln_strip, flags=re.I)
+            )
+            # once we encounter a "normal" paragraph, stop dropping
+            longish_sentence = len(ln_strip) > 120 and ln_strip.endswith('.')
+            sectionish = re.search(r'(abstract|introduction|keywords|index terms)\b', ln_strip, re.I)
+            if dropping and (looks_affil or not longish_sentence) and not sectionish:
+                continue
+            else:
+                dropping = False
+                kept.append(ln)
+        t = '\n'.join(kept)
+    if title_line:
+        t = title_line + "\n" + t
+
+    return t
+
+def strip_back_matter(text: str) -> str:
+    # Cut at References/Bibliography/etc. if present
+    ends = [m.start() for pat in SECTION_ENDS for m in re.finditer(pat, text, flags=re.I)]
+    return text[:min(ends)] if ends else text
+
+def remove_noise(text: str) -> str:
+    # citations like [12], (Smith, 2020), figure/table captions noise, urls
+    text = re.sub(r'\[[0-9,\s\-]+\]', ' ', text)                       # [12], [1, 2]
+    text = re.sub(r'\(\s*[A-Z][A-Za-z\-]+,\s*\d{4}\s*\)', ' ', text)   # (Smith, 2020)
+    text = re.sub(r'(figure|fig\.?|table)\s+\d+[:.\-]?', ' ', text, flags=re.I)
+    text = re.sub(r'http\S+|www\.\S+', ' ', text)
+    text = re.sub(r'\d{1,4}\s*(%|°[CF]|km|mm|cm|m|hz|khz|mhz|ghz)\b', ' ', text, flags=re.I)
+    return text
+
+def basic_preprocess(text: str) -> str:
+    # lower, drop punctuation/digits, tokenize, stopword-remove, simple lemma (no POS)
+    text = text.lower()
+    text = re.sub(r'\d+', ' ', text)
+    text = text.translate(str.maketrans('', '', string.punctuation))
+    tokens = nltk.word_tokenize(text)            # requires punkt + punkt_tab
+    tokens = [w for w in tokens if w not in STOP and len(w) > 2]
+    tokens = [LEMM.lemmatize(w) for w in tokens] # POS-agnostic lemmatization
+    tokens = [w for w in tokens if w.isalpha() and len(w) > 2 and len(w) < 20]
+    tokens = [w for w in tokens if w not in STOP]
+
+    return ' '.join(tokens)
+
+def clean_paper_text(raw_text: str) -> str:
+    t = strip_front_matter(raw_text)     # drop authors/affiliations block
+    t = strip_back_matter(t)             # drop references/appendix etc.
+    t = remove_noise(t)                  # drop citations/urls/units
+    t = normalize(t)
+    t = basic_preprocess(t)              # simple lemma, no POS
+    return t
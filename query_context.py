@@ -0,0 +1,67 @@
+#Query context: carries per-request intermediates through retrieval, fusion and re-ranking
+import pipeline_cache
+
+
+class QueryContext:  # One uploaded paper; each stage computes its input at most once and caches it here
+    def __init__(self, pdf_input=None, raw_text=None, cache=None):
+        if pdf_input is None and raw_text is None:
+            raise ValueError("QueryContext needs either a pdf_input or raw_text")
+        self.pdf_input = pdf_input
+        self._raw_text = raw_text
+        self._query_tokens = None
+        self._pdf_bytes = None
+        self._content_hash = None
+        # Cross-request cache keyed on content_hash; defaults to the process-wide pipeline cache
+        self.cache = cache if cache is not None else pipeline_cache.get_cache()
+
+        # Filled in lazily by the retrievers
+        self.bm25_doc_scores = None   # BM25 score per corpus document
+        self.st_query_embedding = None  # normalized sentence-transformer query vector
+        self.st_similarities = None   # cosine similarity per corpus paper
+        self.bm25_rankings = None     # (author, rank, max_score, avg_score, num_papers) tuples
+        self.st_rankings = None
+        self.author_rankings = {}     # retriever name -> full-depth fusion.AuthorRanking
+        self.failed_retrievers = []   # retrievers left out of fusion (timeout/error), see rrf_ensemble
+        self.timings = None           # per-stage breakdown (instrumentation.Trace.breakdown) of the last request
+
+    @classmethod
+    def from_input(cls, pdf_input): #Reuse an existing context, otherwise wrap the PDF path/bytes/stream
+        if isinstance(pdf_input, cls):
+            return pdf_input
+        return cls(pdf_input=pdf_input)
+
+    @property
+    def pdf_bytes(self): #PDF contents, read once (None for text-only contexts)
+        if self._pdf_bytes is None and self.pdf_input is not None:
+            self._pdf_bytes = pipeline_cache.read_pdf_bytes(self.pdf_input)
+        return self._pdf_bytes
+
+    @property
+    def content_hash(self): #SHA-256 of the PDF bytes, or of the text when no PDF was given
+        if self._content_hash is None:
+            if self.pdf_input is not None:
+                self._content_hash = pipeline_cache.content_hash(self.pdf_bytes)
+            else:
+                self._content_hash = "text:" + pipeline_cache.content_hash(self._raw_text)
+        return self._content_hash
+
+    def cached(self, layer, key_parts, compute): #compute() through the pipeline cache under content_hash + key_parts
+        if self.cache is None:
+            return compute()
+        from pdf_extraction import extraction_version  # every layer derives from the extracted text
+        key = pipeline_cache.cache_key(self.content_hash, *extraction_version(), *key_parts)
+        return self.cache.get_or_compute(layer, key, compute)
+
+    @property
+    def raw_text(self): #Extracted PDF text (extracted once)
+        if self._raw_text is None:
+            from bm25_query import extract_text_from_pdf
+            self._raw_text = self.cached("text", (), lambda: extract_text_from_pdf(self.pdf_bytes))
+        return self._raw_text
+
+    @property
+    def query_tokens(self): #Cleaned BM25 query tokens (cleaned once)
+        if self._query_tokens is None:
+            from preprocessing import clean_paper_text
+            self._query_tokens = self.cached("tokens", (), lambda: clean_paper_text(self.raw_text).split())
+        return self._query_tokens
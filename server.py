@@ -0,0 +1,323 @@
+#HTTP reviewer-recommendation service: the model and indexes stay resident, and concurrent requests are
+#micro-batched into one shared query encode (batch_assign.batch_contexts); each request then runs
+#the same retrievers, fusion and re-ranking as get_reranked_recommendations, so results match the in-process app.
+#Built on asyncio streams from the standard library, so serving adds no dependency.
+#   POST /recommend?top_k=10   body: the PDF bytes (application/pdf) or JSON {"text": ..., "top_k": ...}
+#   GET  /health               snapshot version and queue depth
+#   GET  /metrics              Prometheus text format (server counters + per-stage totals from instrumentation)
+#Requests beyond MAX_PENDING (being extracted, queued or scored) get 429 with Retry-After.
+import argparse
+import asyncio
+import copy
+import json
+import os
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import instrumentation
+
+SERVER_HOST = os.environ.get("RR_SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("RR_SERVER_PORT", "8000"))
+MAX_BATCH_SIZE = 16        # requests scored together
+MAX_WAIT_MS = 10           # how long the first request of a batch waits for others
+MAX_PENDING = 64           # admitted requests (extracting, queued or scoring); more get 429
+MAX_BODY_BYTES = 50 * 1024 * 1024
+EXTRACT_WORKERS = None     # PDF extraction/cleaning processes; None = CPU count
+MAX_TOP_K = 100
+RETRY_AFTER_SECONDS = 1
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 411: "Length Required",
+               413: "Payload Too Large", 422: "Unprocessable Entity", 429: "Too Many Requests",
+               500: "Internal Server Error"}
+
+
+class HTTPError(Exception):  # Raised by handlers; becomes a JSON {"error": message} response
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class MicroBatcher:  # Queue of (payload, future); the worker takes up to max_batch items, waiting max_wait for stragglers
+    #Futures resolve to (result, Trace of the whole batch)
+    def __init__(self, run_batch, max_batch=MAX_BATCH_SIZE, max_wait=MAX_WAIT_MS / 1000):
+        self.run_batch = run_batch          # list of payloads -> list of results, called in a worker thread
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch")  # one batch at a time
+        self.batches = 0
+        self.batched_requests = 0
+
+    def submit(self, payload): #Future resolved with this payload's result
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((payload, future))
+        return future
+
+    async def _next_batch(self):
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self): #Worker loop; a failing batch fails each of its requests, not the loop
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            self.batches += 1
+            self.batched_requests += len(batch)
+            try:
+                results, batch_trace = await loop.run_in_executor(
+                    self.executor, instrumentation.traced_call, self.run_batch, [payload for payload, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result((result, batch_trace))
+
+
+def prepare_text(raw_text): #Worker: (raw text, cleaned BM25 text, error) for pre-extracted text
+    from preprocessing import clean_paper_text
+    try:
+        return raw_text, clean_paper_text(raw_text), None
+    except Exception as e:
+        return None, None, f"{type(e).__name__}: {e}"
+
+
+def score_batch(payloads): #[(raw text, cleaned text, top_k, content hash)] -> re-ranked results (or the exception) per request
+    from batch_assign import batch_contexts
+    from startup import load_reranking_module
+    reranking = load_reranking_module()
+    contexts = batch_contexts([raw for raw, _, _, _ in payloads], [cleaned for _, cleaned, _, _ in payloads],
+                              [digest for _, _, _, digest in payloads])
+    results = []
+    for context, (_, _, top_k, _) in zip(contexts, payloads):
+        try:  # one failing request (e.g. every retriever failed) does not fail the others
+            results.append(reranking.get_reranked_recommendations(context, top_k=top_k))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+class RecommendationServer:  # Admission control, extraction pool, rankings cache and the micro-batcher
+    def __init__(self, max_pending=MAX_PENDING, max_batch=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS,
+                 extract_workers=EXTRACT_WORKERS):
+        self.max_pending = max_pending
+        self.pending = 0
+        self.batcher = MicroBatcher(score_batch, max_batch=max_batch, max_wait=max_wait_ms / 1000)
+        self.extract_pool = ProcessPoolExecutor(max_workers=extract_workers or os.cpu_count() or 1)
+        self.reranking = None
+        self.responses = {}            # status -> count
+        self.rejected = 0
+        self.cache_hits = 0
+        self.latency_sum = 0.0
+        self.latency_count = 0
+
+    async def start(self): #Preload everything, then start the batch worker
+        import startup
+        loop = asyncio.get_running_loop()
+        self.reranking = startup.load_reranking_module()
+        report = await loop.run_in_executor(None, startup.warmup)
+        startup.print_report("Warmup:", report)
+        self.worker = asyncio.create_task(self.batcher.run())
+
+    def _rankings_key(self, content_hash, top_k):
+        # Same key as get_reranked_recommendations: both paths compute the same rankings
+        return self.reranking.rankings_cache_key(content_hash, top_k)
+
+    async def recommend(self, pdf_bytes=None, raw_text=None, top_k=10, request_trace=None): #Re-ranked results for one request
+        #Stages of the extraction worker and of the shared batch are added to request_trace
+        import pipeline_cache
+        from batch_assign import prepare_submission
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPError(429, f"Server busy: {self.pending} requests pending")
+        self.pending += 1
+        request_trace = request_trace if request_trace is not None else instrumentation.Trace()
+        try:
+            loop = asyncio.get_running_loop()
+            cache = pipeline_cache.get_cache()
+            # As QueryContext.content_hash: the paper is cached under the same key as an in-process upload
+            digest = pipeline_cache.content_hash(pdf_bytes) if pdf_bytes is not None else \
+                "text:" + pipeline_cache.content_hash(raw_text)
+            if cache is not None:
+                key = await loop.run_in_executor(None, self._rankings_key, digest, top_k)
+                cached = cache.get("rankings", key)
+                if cached is not None:
+                    self.cache_hits += 1
+                    return copy.deepcopy(cached)  # callers may mutate results; the cached entry must not change
+            prepare, argument = (prepare_submission, pdf_bytes) if pdf_bytes is not None else (prepare_text, raw_text)
+            (raw, cleaned, error), worker_trace = await loop.run_in_executor(
+                self.extract_pool, instrumentation.traced_call, prepare, argument)
+            request_trace.merge(worker_trace, record_totals=True)  # measured in the worker process
+            if error is not None:
+                raise HTTPError(422, f"Could not read the paper: {error}")
+            queued = time.perf_counter()
+            # get_reranked_recommendations stores the results in the cache (unless degraded)
+            results, batch_trace = await self.batcher.submit((raw, cleaned, top_k, digest))
+            request_trace.merge(batch_trace)
+            request_trace.add("queue", time.perf_counter() - queued - batch_trace.total)
+            return results
+        finally:
+            self.pending -= 1
+
+    def metrics(self): #Prometheus text exposition
+        lines = [
+            "# TYPE rr_pending_requests gauge", f"rr_pending_requests {self.pending}",
+            "# TYPE rr_queue_depth gauge", f"rr_queue_depth {self.batcher.queue.qsize()}",
+            "# TYPE rr_rejected_total counter", f"rr_rejected_total {self.rejected}",
+            "# TYPE rr_cache_hits_total counter", f"rr_cache_hits_total {self.cache_hits}",
+            "# TYPE rr_batches_total counter", f"rr_batches_total {self.batcher.batches}",
+            "# TYPE rr_batched_requests_total counter", f"rr_batched_requests_total {self.batcher.batched_requests}",
+            "# TYPE rr_request_seconds summary", f"rr_request_seconds_sum {self.latency_sum:.6f}",
+            f"rr_request_seconds_count {self.latency_count}",
+            "# TYPE rr_responses_total counter",
+        ]
+        lines += [f'rr_responses_total{{status="{status}"}} {count}' for status, count in sorted(self.responses.items())]
+        return "\n".join(lines) + "\n" + instrumentation.prometheus_text()
+
+    async def handle_request(self, method, path, query, headers, body): #(status, content type, body bytes)
+        import artifacts
+        if path == "/health":
+            return 200, "application/json", json.dumps({
+                "status": "ok", "snapshot": artifacts.current_version(), "pending": self.pending}).encode()
+        if path == "/metrics":
+            return 200, "text/plain; version=0.0.4", self.metrics().encode()
+        if path != "/recommend":
+            raise HTTPError(404, f"No route for {path}")
+        if method != "POST":
+            raise HTTPError(405, "Use POST /recommend")
+        top_k = query.get("top_k", ["10"])[0]
+        content_type = headers.get("content-type", "").split(";")[0].strip()
+        pdf_bytes = raw_text = None
+        if content_type == "application/json":
+            try:
+                payload = json.loads(body)
+                raw_text = payload["text"]
+            except (ValueError, KeyError, TypeError):
+                raise HTTPError(400, 'JSON body must be {"text": ..., "top_k": ...}')
+            top_k = payload.get("top_k", top_k)
+        else:
+            pdf_bytes = body
+        try:
+            top_k = int(top_k)
+        except (TypeError, ValueError):
+            raise HTTPError(400, "top_k must be an integer")
+        if not 1 <= top_k <= MAX_TOP_K:
+            raise HTTPError(400, f"top_k must be between 1 and {MAX_TOP_K}")
+        if not body:
+            raise HTTPError(400, "Empty request body")
+        from batch_assign import _to_json
+        request_trace = instrumentation.Trace()
+        results = await self.recommend(pdf_bytes=pdf_bytes, raw_text=raw_text, top_k=top_k, request_trace=request_trace)
+        body = {"results": results, "timings": request_trace.breakdown()}
+        return 200, "application/json", json.dumps(body, default=_to_json, ensure_ascii=False).encode()
+
+    async def handle_connection(self, reader, writer): #One HTTP/1.1 request per connection (Connection: close)
+        start = time.perf_counter()
+        status, content_type, body, extra = 500, "application/json", b"", {}
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            if len(request_line) != 3:
+                raise HTTPError(400, "Malformed request line")
+            method, target, _ = request_line
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = headers.get("content-length")
+            if method == "POST" and length is None:
+                raise HTTPError(411, "Content-Length required")
+            if length is not None:
+                try:
+                    length = int(length)
+                except ValueError:
+                    raise HTTPError(400, "Content-Length must be an integer")
+                if length < 0:
+                    raise HTTPError(400, "Content-Length must not be negative")
+                if length > MAX_BODY_BYTES:
+                    raise HTTPError(413, f"Body larger than {MAX_BODY_BYTES} bytes")
+            request_body = await reader.readexactly(length) if length else b""
+            url = urllib.parse.urlsplit(target)
+            status, content_type, body = await self.handle_request(method, url.path, urllib.parse.parse_qs(url.query),
+                                                                   headers, request_body)
+        except HTTPError as e:
+            status, body = e.status, json.dumps({"error": str(e)}).encode()
+            if e.status == 429:
+                extra["Retry-After"] = str(RETRY_AFTER_SECONDS)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as e:
+            status, body = 500, json.dumps({"error": f"{type(e).__name__}: {e}"}).encode()
+        self.responses[status] = self.responses.get(status, 0) + 1
+        self.latency_sum += time.perf_counter() - start
+        self.latency_count += 1
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}", f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}", "Connection: close"] + [f"{k}: {v}" for k, v in extra.items()]
+        try:
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host=SERVER_HOST, port=SERVER_PORT, **settings): #Run the service until cancelled
+    app = RecommendationServer(**settings)
+    await app.start()
+    server = await asyncio.start_server(app.handle_connection, host, port)
+    print(f"✓ Serving reviewer recommendations on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def recommend_remote(server_url, pdf_input, top_k=10, timeout=300): #Client: results from a running server for a PDF path/bytes/upload
+    from pipeline_cache import read_pdf_bytes
+    request = urllib.request.Request(f"{server_url.rstrip('/')}/recommend?top_k={int(top_k)}", data=read_pdf_bytes(pdf_input),
+                                     headers={"Content-Type": "application/pdf"}, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())["results"]
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read()).get("error", e.reason)
+        except ValueError:
+            message = e.reason
+        raise RuntimeError(f"Recommendation server returned {e.code}: {message}") from None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve reviewer recommendations over HTTP with request micro-batching")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING)
+    parser.add_argument("--extract-workers", type=int, default=EXTRACT_WORKERS)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, max_pending=args.max_pending, max_batch=args.max_batch,
+                          max_wait_ms=args.max_wait_ms, extract_workers=args.extract_workers))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,73 @@
+#Startup helpers: every module defers its heavy work (NLTK data, pickles, torch, the ST model) to first use.
+#warmup() preloads all of it on request (server start, Streamlit's load_pipeline) and reports how long each
+#step took; import_time_report() shows what a bare import of each pipeline module costs.
+import importlib
+import importlib.util
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+
+# Pipeline modules in dependency order; Re-Ranking.py is loaded from its path (hyphenated file name)
+PIPELINE_MODULES = [
+    "preprocessing", "author_index", "fusion", "artifacts", "pipeline_cache", "query_context", "bm25_engine", "vector_index",
+    "embedding_store", "encoders", "bm25_query", "Sentence_Transformer", "RRF_Ensemble",
+]
+RERANKING_MODULE = "re_ranking_module"
+
+
+def load_reranking_module(): #Re-Ranking.py as a module, loaded once per process
+    module = sys.modules.get(RERANKING_MODULE)
+    if module is None:
+        path = BASE_DIR / "Re-Ranking.py"
+        if not path.exists():
+            raise FileNotFoundError(f"Could not find {path}")
+        spec = importlib.util.spec_from_file_location(RERANKING_MODULE, str(path))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[RERANKING_MODULE] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[RERANKING_MODULE]
+            raise
+    return module
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def import_time_report(): #Seconds per module import, in dependency order; modules imported earlier report ~0
+    report = {name: _timed(lambda: importlib.import_module(name)) for name in PIPELINE_MODULES}
+    report["Re-Ranking"] = _timed(load_reranking_module)
+    return report
+
+
+def warmup(embeddings_path=None): #Preload NLTK data, BM25 index, profiles, embeddings and the ST model; seconds per step
+    import bm25_query
+    import preprocessing
+    import Sentence_Transformer
+    steps = [
+        ("nltk", preprocessing.warmup),
+        ("bm25_index", bm25_query.warmup),
+        ("author_profiles", lambda: load_reranking_module().get_profile_table()),
+        ("sentence_transformer", lambda: Sentence_Transformer.warmup(embeddings_path)),
+    ]
+    return {name: _timed(step) for name, step in steps}
+
+
+def print_report(title, report):
+    print(title)
+    for name, seconds in report.items():
+        print(f"   {name:<22} {seconds * 1000:9.1f} ms")
+    print(f"   {'total':<22} {sum(report.values()) * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    # python startup.py [--warmup]: import-time breakdown, plus warmup timings with --warmup
+    print_report("Import time per module:", import_time_report())
+    if "--warmup" in sys.argv[1:]:
+        print_report("Warmup:", warmup())
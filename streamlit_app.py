@@ -1,32 +1,38 @@
 import streamlit as st
-import tempfile
-from pathlib import Path
-import importlib.util
+import os
 import pandas as pd
 import io
 import traceback
 
 
-def load_module_from_path(path: Path, module_name: str):
-    spec = importlib.util.spec_from_file_location(module_name, str(path))
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
-    return module
+# With RR_SERVER_URL set (e.g. http://127.0.0.1:8000), the app is a thin client of server.py and loads no models
+SERVER_URL = os.environ.get("RR_SERVER_URL")
 
 
-@st.cache_data(show_spinner=False)
-def run_rerank_pipeline(pdf_path: str, top_k: int = 10):
-    repo_root = Path(__file__).resolve().parent
-    rerank_file = repo_root / "Re-Ranking.py"
-    if not rerank_file.exists():
-        raise FileNotFoundError(f"Could not find {rerank_file}")
+@st.cache_resource(show_spinner=False)
+def load_pipeline():
+    # Loaded once per server process: imports are cheap, so everything the pipeline defers
+    # (NLTK data, BM25 index, author profiles, embeddings + model) is preloaded here explicitly.
+    import startup
 
-    mod = load_module_from_path(rerank_file, "re_ranking_module")
+    mod = startup.load_reranking_module()
+    startup.warmup()
+    return mod
 
-    if not hasattr(mod, "get_reranked_recommendations"):
-        raise AttributeError("Module does not expose get_reranked_recommendations(pdf_path, top_k)")
 
-    results = mod.get_reranked_recommendations(pdf_path, top_k=top_k)
+def run_rerank_pipeline(pdf_input, top_k: int = 10):
+    # Repeat uploads are served by the pipeline cache, keyed on a hash of the PDF bytes
+    # (st.cache_data keyed on a fresh temp path never hit)
+    if SERVER_URL:
+        from server import recommend_remote
+        results = recommend_remote(SERVER_URL, pdf_input, top_k=top_k)
+    else:
+        mod = load_pipeline()
+
+        if not hasattr(mod, "get_reranked_recommendations"):
+            raise AttributeError("Module does not expose get_reranked_recommendations(pdf_input, top_k)")
+
+        results = mod.get_reranked_recommendations(pdf_input, top_k=top_k)
 
     df = pd.DataFrame(results)
     if not df.empty and 'boosts' in df.columns:
@@ -131,6 +137,10 @@ def main():
     st.markdown("<h1>Reviewer Recommendation </h1>", unsafe_allow_html=True)
     st.markdown("<p>Upload a research paper (PDF) or enter a path to get the top reviewer recommendations.</p>", unsafe_allow_html=True)
 
+    if not SERVER_URL:
+        with st.spinner("⏳ Loading models and indexes..."):
+            load_pipeline()
+
     # --- 📥 Input Section ---
     st.markdown("<hr style='margin-top:15px;margin-bottom:25px;'>", unsafe_allow_html=True)
     col1, col2 = st.columns([2, 1])
@@ -151,16 +161,12 @@ def main():
                 return
 
             if uploaded is not None:
-                tmpdir = tempfile.mkdtemp(prefix="rr_engine_")
-                tmp_path = Path(tmpdir) / uploaded.name
-                with open(tmp_path, "wb") as f:
-                    f.write(uploaded.getbuffer())
-                pdf_path = str(tmp_path)
+                pdf_input = uploaded.getvalue()
             else:
-                pdf_path = manual_path
+                pdf_input = manual_path
 
             with st.spinner("⏳ Running re-ranking pipeline (this may take a while)..."):
-                results, df = run_rerank_pipeline(pdf_path, top_k=top_k)
+                results, df = run_rerank_pipeline(pdf_input, top_k=top_k)
 
             if not results:
                 st.info("ℹ️ No results returned from the pipeline.")
@@ -0,0 +1,39 @@
+#Tests import the flat top-level modules the same way the scripts do. Pipeline tests run on a small
+#seeded synthetic corpus (benchmarks.synthetic) with the stub encoder, so no model or NLTK data is needed.
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+CORPUS_PAPERS = 2000
+CORPUS_AUTHORS = 200
+
+
+@pytest.fixture(scope="session")
+def corpus_root(tmp_path_factory): #Artifact root holding a published synthetic snapshot, made current for the session
+    import artifacts
+    from benchmarks.synthetic import ensure_corpus
+    root = tmp_path_factory.mktemp("artifacts")
+    ensure_corpus(root, CORPUS_PAPERS, CORPUS_AUTHORS, seed=0)
+    previous, artifacts.ARTIFACT_DIR = artifacts.ARTIFACT_DIR, root
+    yield root
+    artifacts.ARTIFACT_DIR = previous
+
+
+@pytest.fixture(scope="session")
+def stub_model(corpus_root): #Stub encoder registered as the shared model of the synthetic corpus
+    import Sentence_Transformer
+    from benchmarks.stub_encoder import StubEncoder
+    from benchmarks.synthetic import STUB_MODEL_NAME
+    key = (STUB_MODEL_NAME, "torch", None)
+    Sentence_Transformer._MODELS[key] = StubEncoder()
+    yield Sentence_Transformer._MODELS[key]
+    Sentence_Transformer._MODELS.pop(key, None)
+
+
+@pytest.fixture(scope="session")
+def vocabulary():
+    from benchmarks.synthetic import make_vocabulary
+    return make_vocabulary()
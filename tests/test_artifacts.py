@@ -0,0 +1,61 @@
+#Steady-state requests read the snapshot version and pipeline version from memory, not from disk
+import builtins
+import os
+
+import pytest
+
+import artifacts
+
+
+@pytest.fixture
+def no_disk(monkeypatch): #Makes any open() or stat() fail
+    def fail(*args, **kwargs):
+        raise AssertionError(f"disk access: {args[:1]}")
+    def patch():
+        monkeypatch.setattr(builtins, "open", fail)
+        monkeypatch.setattr(os, "stat", fail)
+    return patch
+
+
+def test_cached_lookups_do_not_touch_disk(corpus_root, stub_model, no_disk):
+    import bm25_query
+    import startup
+    import Sentence_Transformer
+    reranking = startup.load_reranking_module()
+    warm = (reranking.pipeline_version(), bm25_query.get_bm25(), bm25_query.get_author_index(),
+            reranking.get_author_profiles(), Sentence_Transformer.get_recommender())
+    no_disk()
+    assert (reranking.pipeline_version(), bm25_query.get_bm25(), bm25_query.get_author_index(),
+            reranking.get_author_profiles(), Sentence_Transformer.get_recommender()) == warm
+
+
+def test_set_current_applies_at_once(tmp_path):
+    (tmp_path / artifacts.SNAPSHOTS_DIR / "v1").mkdir(parents=True)
+    (tmp_path / artifacts.SNAPSHOTS_DIR / "v2").mkdir()
+    assert artifacts.current_version(tmp_path) is None
+    artifacts.set_current("v1", tmp_path)
+    assert artifacts.current_version(tmp_path) == "v1"
+    artifacts.set_current("v2", tmp_path)
+    assert artifacts.current_version(tmp_path) == "v2"
+
+
+def test_other_process_publishes_are_seen_after_the_check_interval(tmp_path, monkeypatch):
+    artifacts.set_current("v1", tmp_path)
+    assert artifacts.current_version(tmp_path) == "v1"
+    (tmp_path / artifacts.CURRENT_FILE).write_text("v2-longer\n", encoding="utf-8")   # as another process would
+    assert artifacts.current_version(tmp_path) == "v1"
+    clock = artifacts.time.monotonic() + artifacts.VERSION_CHECK_SECONDS
+    monkeypatch.setattr(artifacts.time, "monotonic", lambda: clock)
+    assert artifacts.current_version(tmp_path) == "v2-longer"
+
+
+def test_version_cache_recomputes_per_snapshot(corpus_root, monkeypatch):
+    calls = []
+    cache = artifacts.VersionCache(lambda version: calls.append(version) or len(calls))
+    assert cache.get() == cache.get() == 1
+    current = artifacts.current_version()
+    monkeypatch.setattr(artifacts, "current_version", lambda root=None: current + "-next")
+    assert cache.get() == 2
+    artifacts.invalidate()
+    assert cache.get() == 3
+    assert calls == [current, current + "-next", current + "-next"]
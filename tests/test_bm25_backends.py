@@ -0,0 +1,89 @@
+#MaxScore BM25 backend against exhaustive scoring: same top documents, and the same authors in the same
+#order with scores normalized by the best author's, without ever scoring the whole corpus
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_paper
+from bm25_engine import check_top_k_exactness
+
+
+def _queries(vocabulary, seed=0): #Short keyword queries (most authors unmatched) and long submissions
+    rng = np.random.default_rng(seed)
+    short = [[vocabulary[t] for t in rng.integers(0, len(vocabulary), int(rng.integers(1, 40)))] for _ in range(15)]
+    long = [synthetic_paper(rng, vocabulary, int(rng.integers(200, 4000)))[1] for _ in range(5)]
+    return short + long
+
+
+def _long_queries(vocabulary, seed=0): #Paper-length submissions: every author matches some query term
+    rng = np.random.default_rng(seed)
+    return [synthetic_paper(rng, vocabulary, n)[1] for n in (50, 200, 1000, 4000) for _ in range(5)]
+
+
+def _reference(doc_scores, k): #Exhaustive aggregation, normalized by the best author's max/avg, top k by max then id
+    import bm25_query
+    author_index = bm25_query.get_author_index()
+    max_scores, avg_scores, counts = author_index.aggregate(doc_scores)
+    max_normalized = max_scores / max_scores.max() if max_scores.max() > 0 else np.ones(len(max_scores))
+    avg_normalized = avg_scores / avg_scores.max() if avg_scores.max() > 0 else np.ones(len(avg_scores))
+    order = np.lexsort((np.arange(len(max_scores)), -max_normalized))[:k]
+    return [(author_index.authors[i], rank + 1, float(max_normalized[i]), float(avg_normalized[i]), int(counts[i]))
+            for rank, i in enumerate(order)]
+
+
+def _exhaustive(engine, tokens): #Exhaustive doc scores, bypassing a patched score_query
+    term_ids, weights = engine.compile_query(tokens)
+    return type(engine).score_query(engine, term_ids, weights)
+
+
+@pytest.fixture
+def pruned_only(corpus_root, monkeypatch): #Fails any full-corpus scoring; records the deepest MaxScore retrieval
+    import bm25_query
+    engine = bm25_query.get_bm25()
+    depths = []
+    top_k = engine.top_k
+
+    def recording_top_k(term_ids, weights, k):
+        depths.append(k)
+        return top_k(term_ids, weights, k)
+
+    def no_full_scoring(*args):
+        raise AssertionError("MaxScore path scored the whole corpus")
+
+    monkeypatch.setattr(engine, "top_k", recording_top_k)
+    monkeypatch.setattr(engine, "score_query", no_full_scoring)
+    return engine, depths
+
+
+def test_maxscore_top_k_matches_exhaustive(corpus_root, vocabulary):
+    import bm25_query
+    engine = bm25_query.get_bm25()
+    for k in (1, 10, 100):
+        assert check_top_k_exactness(engine, _queries(vocabulary), k=k) == 0
+
+
+@pytest.mark.parametrize("k", [1, 10, 40])
+def test_long_queries_take_the_pruned_path(vocabulary, pruned_only, k):
+    import bm25_query
+    engine, depths = pruned_only
+    for tokens in _long_queries(vocabulary, seed=k):
+        doc_scores = _exhaustive(engine, tokens)
+        exhaustive = bm25_query.rank_authors_from_doc_scores(doc_scores, k=k)
+        depths.clear()
+        ranked = bm25_query.rank_authors_maxscore(tokens, k=k)
+        assert max(depths) < engine.corpus_size
+        assert ranked == _reference(doc_scores, k)
+        assert [(a, r, n) for a, r, _, _, n in ranked] == [(a, r, n) for a, r, _, _, n in exhaustive]
+
+
+@pytest.mark.parametrize("k", [1, 10, 40])
+def test_identical_to_exhaustive_when_an_author_is_unmatched(corpus_root, vocabulary, k):
+    import bm25_query
+    author_index = bm25_query.get_author_index()
+    exercised = 0
+    for tokens in _queries(vocabulary, seed=k)[:15]:
+        doc_scores = bm25_query.bm25_scores_for_query_tokens(tokens)
+        if author_index.aggregate(doc_scores)[0].min() > 0:
+            continue
+        exercised += 1
+        assert bm25_query.rank_authors_maxscore(tokens, k=k) == bm25_query.rank_authors_from_doc_scores(doc_scores, k=k)
+    assert exercised
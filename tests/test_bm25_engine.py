@@ -0,0 +1,56 @@
+#SparseBM25 against rank_bm25.BM25Okapi on a small seeded corpus
+import numpy as np
+import pytest
+
+from author_index import top_k_indices
+from benchmarks.synthetic import make_vocabulary, synthetic_paper
+from bm25_engine import SCORE_TOLERANCE, SparseBM25, verify_against_rank_bm25
+
+rank_bm25 = pytest.importorskip("rank_bm25")
+
+
+@pytest.fixture(scope="module")
+def corpus(): #(tokenized documents, BM25Okapi, converted SparseBM25)
+    rng = np.random.default_rng(0)
+    words = make_vocabulary(2000)
+    docs = [synthetic_paper(rng, words, int(rng.integers(20, 400)))[1] for _ in range(300)]
+    bm25 = rank_bm25.BM25Okapi(docs)
+    return docs, bm25, SparseBM25.from_rank_bm25(bm25)
+
+
+def _queries(docs, rng, n=10): #Long queries with repeated terms plus an out-of-vocabulary token
+    return [[t for d in rng.choice(len(docs), 3, replace=False) for t in docs[d]] + ["<oov>"] for _ in range(n)]
+
+
+def test_scores_match_rank_bm25_within_tolerance(corpus):
+    docs, bm25, engine = corpus
+    for query in _queries(docs, np.random.default_rng(1)):
+        expected = np.asarray(bm25.get_scores(query))
+        scale = max(1.0, float(np.max(np.abs(expected))))
+        assert np.max(np.abs(engine.get_scores(query) - expected)) <= SCORE_TOLERANCE * scale
+    assert verify_against_rank_bm25(bm25, engine) <= SCORE_TOLERANCE
+
+
+def test_ranking_matches_rank_bm25_outside_ties(corpus):
+    docs, bm25, engine = corpus
+    for query in _queries(docs, np.random.default_rng(2)):
+        expected = np.asarray(bm25.get_scores(query))
+        actual = engine.get_scores(query)
+        top = top_k_indices(actual, 20)
+        # Any reordering against rank_bm25 must be between scores equal within the tolerance
+        tol = SCORE_TOLERANCE * max(1.0, float(np.max(np.abs(expected))))
+        assert np.all(np.abs(expected[top] - expected[top_k_indices(expected, 20)]) <= tol)
+
+
+def test_from_counts_matches_conversion(corpus):
+    _, bm25, engine = corpus
+    rebuilt = SparseBM25.from_counts(engine.term_counts(), engine.vocabulary)
+    assert np.allclose(rebuilt.idf, engine.idf)
+    assert abs((rebuilt.weights - engine.weights)).max() <= SCORE_TOLERANCE
+
+
+def test_verify_rejects_drift(corpus):
+    _, bm25, engine = corpus
+    drifted = SparseBM25(engine.weights * (1 + 1e-6), engine.vocabulary, engine.idf, engine.doc_len, engine.avgdl)
+    with pytest.raises(ValueError):
+        verify_against_rank_bm25(bm25, drifted)
@@ -0,0 +1,98 @@
+#Incremental corpus edits must publish the same corpus as building the final paper set from scratch
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import make_vocabulary, synthetic_paper
+from bm25_engine import SCORE_TOLERANCE
+from corpus_index import CorpusIndex, load_term_counts
+import artifacts
+
+DIM = 16
+
+
+def _papers(seed, n, authors): #[(author, title, tokens, embedding)] on a few topics
+    rng = np.random.default_rng(seed)
+    words = make_vocabulary(3000)
+    return [(authors[int(rng.integers(len(authors)))], f"paper {seed}-{i}",
+             synthetic_paper(rng, words, int(rng.integers(30, 300)))[1], rng.standard_normal(DIM).astype(np.float32))
+            for i in range(n)]
+
+
+def _build(papers, store_dtype): #From-scratch CorpusIndex of papers, in order
+    index = CorpusIndex.empty("test-model", store_dtype=store_dtype, dim=DIM)
+    for author, title, tokens, embedding in papers:
+        index.add_paper(author, title, tokens=tokens, embedding=embedding, year=2020)
+    return index
+
+
+def _snapshot(root): #(SparseBM25, doc_authors, doc_titles, embedding rows, all_paths, author_papers, profiles) of the current version
+    import pickle
+    from embedding_store import load_store
+    directory = artifacts.artifact_dir(artifacts.current_version(root), root)
+
+    def load(name):
+        with open(directory / name, "rb") as f:
+            return pickle.load(f)
+
+    if (directory / artifacts.EMBEDDINGS_STORE).exists():
+        saved = load_store(directory / artifacts.EMBEDDINGS_STORE)
+    else:
+        saved = load(artifacts.EMBEDDINGS_PICKLE)
+    return (load(artifacts.BM25_SPARSE_INDEX), load(artifacts.BM25_DOC_AUTHORS), load(artifacts.BM25_DOC_TITLES),
+            np.asarray(saved["embeddings"]), saved["all_paths"], saved["author_papers"], load(artifacts.AUTHOR_PROFILES))
+
+
+@pytest.mark.parametrize("store_dtype", [None, "float16", "int8"])
+def test_incremental_edits_match_full_rebuild(tmp_path, store_dtype):
+    authors = [f"Author {i}" for i in range(12)]
+    base, added = _papers(0, 120, authors), _papers(1, 30, authors + ["Newcomer"])
+    removed = {"Author 3", "Author 7"}
+
+    _build(base, store_dtype).publish(root=tmp_path / "incremental")
+    incremental = CorpusIndex.load(root=tmp_path / "incremental")
+    for author in sorted(removed):
+        incremental.remove_author(author)
+    for author, title, tokens, embedding in added:
+        incremental.add_paper(author, title, tokens=tokens, embedding=embedding, year=2020)
+    incremental.publish(root=tmp_path / "incremental")
+
+    final = [paper for paper in base if paper[0] not in removed] + added
+    _build(final, store_dtype).publish(root=tmp_path / "scratch")
+
+    got, expected = _snapshot(tmp_path / "incremental"), _snapshot(tmp_path / "scratch")
+    assert got[1:3] == expected[1:3]
+    assert np.array_equal(got[3], expected[3])
+    assert got[4:] == expected[4:]
+    engine, reference = got[0], expected[0]
+    assert engine.vocabulary.keys() == reference.vocabulary.keys()
+    for _, _, tokens, _ in _papers(2, 10, authors):
+        expected_scores = reference.get_scores(tokens)
+        tol = SCORE_TOLERANCE * max(1.0, float(np.max(np.abs(expected_scores))))
+        assert np.max(np.abs(engine.get_scores(tokens) - expected_scores)) <= tol
+
+
+def test_rebuilt_statistics_match_rank_bm25(tmp_path):
+    rank_bm25 = pytest.importorskip("rank_bm25")
+    papers = _papers(3, 80, [f"Author {i}" for i in range(5)])
+    index = _build(papers[:60], None)
+    index.publish(root=tmp_path)
+    index = CorpusIndex.load(root=tmp_path)
+    index.remove_author("Author 0")
+    for author, title, tokens, embedding in papers[60:]:
+        index.add_paper(author, title, tokens=tokens, embedding=embedding)
+    index.publish(root=tmp_path)
+    engine = _snapshot(tmp_path)[0]
+    kept = [p for p in papers[:60] if p[0] != "Author 0"] + papers[60:]
+    reference = rank_bm25.BM25Okapi([tokens for _, _, tokens, _ in kept])
+    for _, _, tokens, _ in _papers(4, 10, ["x"]):
+        expected = np.asarray(reference.get_scores(tokens))
+        tol = SCORE_TOLERANCE * max(1.0, float(np.max(np.abs(expected))))
+        assert np.max(np.abs(engine.get_scores(tokens) - expected)) <= tol
+    tf, vocabulary, _ = load_term_counts(artifacts.artifact_dir(artifacts.current_version(tmp_path), tmp_path))
+    assert tf.shape == (len(kept), len(vocabulary))
+
+
+def test_remove_unknown_author_raises(tmp_path):
+    index = _build(_papers(5, 5, ["A"]), None)
+    with pytest.raises(KeyError):
+        index.remove_author("Nobody")
@@ -0,0 +1,82 @@
+#ONNX query encoders against the torch model. The export/parity tests need onnx, onnxruntime, torch,
+#sentence-transformers and the model (set RR_TEST_ENCODER_MODEL for another one) and skip without them;
+#the pooling and batch-order tests run anywhere on a fake session.
+import os
+
+import numpy as np
+import pytest
+
+import encoders
+
+MODEL_NAME = os.environ.get("RR_TEST_ENCODER_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+
+@pytest.fixture(scope="module")
+def export_root(tmp_path_factory):
+    for module in ("onnx", "onnxruntime", "torch", "transformers", "sentence_transformers"):
+        pytest.importorskip(module)
+    root = tmp_path_factory.mktemp("onnx_encoders")
+    try:
+        encoders.export(MODEL_NAME, root=root)
+    except OSError as e:   # model not cached and no network
+        pytest.skip(f"Cannot load {MODEL_NAME}: {e}")
+    return root
+
+
+@pytest.mark.parametrize("backend", sorted(encoders.ONNX_FILES))
+def test_parity_with_torch(export_root, backend):
+    result = encoders.parity(MODEL_NAME, backend, root=export_root, repeats=1)
+    assert result["min_cosine"] >= encoders.PARITY_MIN_COSINE[backend], result
+
+
+@pytest.mark.parametrize("backend", sorted(encoders.ONNX_FILES))
+def test_batches_keep_input_order(export_root, backend):
+    encoder = encoders.load_encoder(MODEL_NAME, backend, root=export_root)
+    texts = encoders.PARITY_TEXTS
+    batched = encoder.encode(texts, batch_size=2)
+    single = np.vstack([encoder.encode(text) for text in texts])
+    assert np.allclose(batched, single, atol=1e-4)
+
+
+class _FakeTokenizer:  # Token ids are word lengths; padding to the longest text of the batch
+    def __call__(self, texts, padding, truncation, max_length, return_tensors):
+        words = [text.split()[:max_length] for text in texts]
+        width = max(len(w) for w in words)
+        ids = np.array([[len(t) for t in w] + [0] * (width - len(w)) for w in words], dtype=np.int64)
+        return {"input_ids": ids, "attention_mask": (ids > 0).astype(np.int64)}
+
+
+class _FakeSession:  # Token state: (token id, position) repeated over dim
+    def __init__(self, dim):
+        self.dim = dim
+
+    def run(self, outputs, feed):
+        ids = feed["input_ids"].astype(np.float32)
+        positions = np.broadcast_to(np.arange(ids.shape[1], dtype=np.float32), ids.shape)
+        return [np.stack([ids, positions] * (self.dim // 2), axis=-1)]
+
+
+def _fake_encoder(pooling, normalize=False, dim=4):
+    encoder = object.__new__(encoders.OnnxEncoder)
+    encoder.config = {"pooling": pooling, "normalize": normalize, "dim": dim, "max_seq_length": 8}
+    encoder.max_seq_length = 8
+    encoder.tokenizer = _FakeTokenizer()
+    encoder.session = _FakeSession(dim)
+    encoder.input_names = ["input_ids", "attention_mask"]
+    return encoder
+
+
+def test_pooling_ignores_padding():
+    texts = ["a bb", "ccc dddd eeeee"]
+    assert np.allclose(_fake_encoder("mean").encode(texts)[0], [1.5, 0.5, 1.5, 0.5])   # padded token left out
+    assert np.allclose(_fake_encoder("max").encode(texts)[0], [2, 1, 2, 1])
+    assert np.allclose(_fake_encoder("cls").encode(texts)[1], [3, 0, 3, 0])
+    assert np.allclose(np.linalg.norm(_fake_encoder("mean", normalize=True).encode(texts), axis=1), 1.0)
+
+
+def test_length_sorted_batches_return_input_order():
+    encoder = _fake_encoder("mean")
+    texts = ["a", "bb cc dd", "eee", "f gg hhh iiii", "jj kk"]
+    batched = encoder.encode(texts, batch_size=2)
+    assert np.allclose(batched, np.vstack([encoder.encode(text) for text in texts]))
+    assert encoder.encode([]).shape == (0, 4)
@@ -0,0 +1,42 @@
+#Disk tier of the pipeline cache: unreadable entries are misses, pruning keeps the size budget
+import pickle
+
+import pytest
+
+from pipeline_cache import DiskCache
+
+
+class _Gone:  # Pickled by reference; deleting the attribute afterwards makes the entry unloadable
+    pass
+
+
+@pytest.mark.parametrize("payload", [b"", b"not a pickle", pickle.dumps({"a": 1})[:-3]])
+def test_corrupt_entry_is_a_miss_and_dropped(tmp_path, payload):
+    cache = DiskCache(tmp_path)
+    cache.put("rankings", "k", [1, 2])
+    path = tmp_path / "rankings" / "k.pkl"
+    path.write_bytes(payload)
+    assert cache.get("rankings", "k") is None
+    assert not path.exists()
+
+
+def test_entry_of_removed_class_is_a_miss(tmp_path, monkeypatch):
+    cache = DiskCache(tmp_path)
+    cache.put("rankings", "k", _Gone())
+    monkeypatch.delattr(__import__(__name__), "_Gone")
+    assert cache.get("rankings", "k", default="miss") == "miss"
+    assert cache.get("rankings", "absent", default="miss") == "miss"
+
+
+def test_size_budget_without_rescanning_every_write(tmp_path, monkeypatch):
+    cache = DiskCache(tmp_path, max_bytes=200_000, rescan_every=1000)
+    scans = []
+    prune = cache.prune
+    monkeypatch.setattr(cache, "prune", lambda: scans.append(1) or prune())
+    for i in range(600):
+        cache.put("text", f"k{i}", "x" * 1000)
+    files = list(tmp_path.glob("*/*.pkl"))
+    assert sum(p.stat().st_size for p in files) <= 200_000
+    assert cache._bytes == sum(p.stat().st_size for p in files)
+    assert len(scans) <= 60     # one scan per ~10% of the budget written, not one per write
+    assert cache.get("text", "k599") == "x" * 1000
@@ -0,0 +1,73 @@
+#Golden-output test: the precompiled clean_paper_text must reproduce the original cleaner byte for byte
+#on fuzzed paper-like documents. Both need the NLTK stopwords, WordNet and punkt_tab data; the test is
+#skipped when they are not installed.
+import numpy as np
+import pytest
+
+import preprocessing
+
+try:
+    preprocessing.ensure_nltk_resources('stopwords', 'wordnet', 'punkt_tab')
+    import preprocessing_reference
+except (LookupError, ImportError) as e:
+    pytest.skip(f"NLTK data unavailable: {e}", allow_module_level=True)
+
+N_DOCUMENTS = 300
+
+TITLES = ["Deep Residual Learning for Image Recognition", "A Survey of Graph Neural Networks",
+          "Attention Is All You Need", "On the Spectral Lines of Distant Galaxies", "Short Title"]
+FRONT_MATTER = ["Kaiming He, Xiangyu Zhang", "Department of Computer Science, IIT Delhi, India",
+                "Microsoft Research, Redmond, USA", "jane.doe@university.edu", "ORCID 0000-0002-1825-0097",
+                "School of Engineering, National University of Singapore", "short line", "Google Brain"]
+HEADINGS = ["Abstract", "1. Introduction", "1 Introduction", "I. INTRODUCTION", "II. INTRODUCTION", "Background",
+            "Keywords: graphs, learning", "Index Terms - networks"]
+BACK_MATTER = ["References", "REFERENCES", "Bibliography", "Acknowledgments", "Acknowledgements", "Appendix A"]
+WORDS = ("the model networks learning residual graph spectral deeper training datasets results better "
+         "we propose analyze cannot gonna gimme wanna lemme gotta studies running ran mice geese "
+         "children analyses criteria phenomena it's don't networks' author's").split()
+NOISE = ["[1]", "[2, 3]", "[4-7]", "(Smith, 2020)", "( Vaswani, 2017 )", "Figure 3:", "fig. 2", "Table 1.",
+         "http://example.org/x", "www.example.com/a?b=1", "224 mm", "50 %", "30°C", "10 GHz", "5 km", "3.5",
+         "e.g.", "i.e.,", "“quoted”", "‘single’", "a—b", "x–y", "«guillemets»", "α-β", "naïve", "café",
+         "U.S.A.", "Dr.", "(", ")", ";", ":", "!", "?", "...", "--", "'", '"', "&", "#", "$5", "100%"]
+
+
+def _sentence(rng): #Words mixed with citations, units, urls, punctuation, unicode and contractions
+    parts = []
+    for _ in range(int(rng.integers(3, 25))):
+        parts.append(str(rng.choice(NOISE)) if rng.random() < 0.2 else str(rng.choice(WORDS)))
+    text = " ".join(parts)
+    if rng.random() < 0.2:   # hyphenation across a line break
+        cut = int(rng.integers(1, max(2, len(text))))
+        text = text[:cut] + "-\n" + text[cut:]
+    if rng.random() < 0.1:
+        text = text.replace(" ", "­", 1)
+    return text + str(rng.choice([".", "", "!", "?"]))
+
+
+def fuzzed_paper(rng): #Front matter, optional section heading, body paragraphs and optional back matter
+    lines = [str(rng.choice(TITLES))]
+    lines += [str(rng.choice(FRONT_MATTER)) for _ in range(int(rng.integers(0, 5)))]
+    if rng.random() < 0.7:
+        lines.append(str(rng.choice(HEADINGS)))
+    for _ in range(int(rng.integers(1, 12))):
+        lines.append(" ".join(_sentence(rng) for _ in range(int(rng.integers(1, 4)))))
+        if rng.random() < 0.15:
+            lines.append(str(rng.choice(HEADINGS)))
+        if rng.random() < 0.1:
+            lines.append("")
+    if rng.random() < 0.6:
+        lines.append(str(rng.choice(BACK_MATTER)))
+        lines += [_sentence(rng) for _ in range(int(rng.integers(0, 3)))]
+    separator = "\n\n" if rng.random() < 0.2 else "\n"
+    return separator.join(lines)
+
+
+def test_builtin_samples_match_reference():
+    assert preprocessing.check_golden() == []
+
+
+def test_fuzzed_corpus_matches_reference():
+    rng = np.random.default_rng(0)
+    texts = [fuzzed_paper(rng) for _ in range(N_DOCUMENTS)]
+    for text in texts:
+        assert preprocessing.clean_paper_text(text) == preprocessing_reference.clean_paper_text(text), text
@@ -0,0 +1,97 @@
+#The vectorized rerank_results must return exactly what the original per-author loop returned
+import random
+
+import pytest
+
+import startup
+
+PREMIER = ['IIT', 'IISc', 'IIIT', 'NIT', 'BITS', 'VIT']
+
+
+def _ladder(value, tiers, default): #First (minimum, factor) the value reaches, as the original if/elif chains
+    for minimum, factor in tiers:
+        if value >= minimum:
+            return factor
+    return default
+
+
+def reference_rerank(reranking, rrf_results, bm25_rankings, st_rankings, top_k): #The pre-vectorization loop, with its literal thresholds
+    reranked = []
+    for author, rrf_score, _ in rrf_results:
+        info = reranking.get_author_info(author, bm25_rankings, st_rankings)
+        boosts = {
+            'experience': _ladder(info['num_papers'], [(30, 1.07), (20, 1.05), (10, 1.02), (5, 1.01)], 1.00),
+            'institution': 1.02 if info['institution'] in PREMIER else 1.00,
+            'recency': _ladder(info['recent_papers'], [(3, 1.015), (1, 1.025)], 1.04),
+            'consistency': _ladder(info['avg_similarity'], [(0.7, 1.05), (0.5, 1.025)], 1.00),
+            'penalty': 0.95 if info['num_papers'] <= 2 else 1.00,
+        }
+        final_score = rrf_score
+        for name in ('experience', 'institution', 'recency', 'consistency', 'penalty'):
+            final_score *= boosts[name]
+        reranked.append({'author': author, 'final_score': final_score, 'rrf_score': rrf_score,
+                         'num_papers': info['num_papers'], 'institution': info['institution'],
+                         'recent_papers': info['recent_papers'], 'latest_year': info['latest_year'],
+                         'avg_similarity': info['avg_similarity'], 'boosts': boosts})
+    reranked.sort(key=lambda x: x['final_score'], reverse=True)
+    top_results = reranked[:top_k]
+    for i, result in enumerate(top_results):
+        max_score = top_results[0]['final_score']
+        result['rank'] = i + 1
+        result['tier'] = reranking.assign_tier(i + 1)
+        result['score'] = round((result['final_score'] / max_score) * 100 if max_score > 0 else 0.0, 2)
+        result['avg_similarity_pct'] = round(result['avg_similarity'] * 100, 1)
+    return top_results
+
+
+def _random_case(rng): #(profiles, rrf_results, bm25 rankings, st rankings, top_k) with ties, gaps and missing fields
+    authors = [f"A{i}" for i in range(60)]
+    profiles = {}
+    for author in authors[:45]:
+        profile = {}
+        if rng.random() < .9:
+            profile['num_papers'] = rng.choice([0, 1, 2, 3, 4, 5, 9, 10, 19, 20, 29, 30, 40])
+        if rng.random() < .9:
+            profile['primary_institution'] = rng.choice(['IIT', 'NIT', 'Other', 'MIT', None, 'VIT'])
+        if rng.random() < .8:
+            profile['recent_papers'] = rng.choice([0, 1, 2, 3, 5])
+        if rng.random() < .8:
+            profile['latest_year'] = rng.choice([None, 2019, 2024])
+        profiles[author] = profile
+
+    def ranking():
+        chosen = rng.sample(authors, 20)
+        return [(a, r + 1, rng.random(), rng.choice([0.3, 0.5, 0.7, rng.random()]), rng.randint(0, 12))
+                for r, a in enumerate(chosen)]
+    bm25, st = ranking(), ranking()
+    candidates = list(dict.fromkeys([x[0] for x in bm25] + [x[0] for x in st] + ['Unranked']))
+    rrf = [(a, rng.choice([1 / 61, 1 / 62, rng.random() / 30]), {}) for a in candidates]
+    return profiles, rrf, bm25, st, rng.choice([1, 5, 10, 100])
+
+
+@pytest.fixture
+def reranking():
+    return startup.load_reranking_module()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_vectorized_matches_reference_loop(reranking, monkeypatch, seed):
+    rng = random.Random(seed)
+    for _ in range(60):
+        profiles, rrf, bm25, st, top_k = _random_case(rng)
+        monkeypatch.setattr(reranking, "get_author_profiles", lambda: profiles)
+        assert reranking.rerank_results(rrf, bm25, st, top_k=top_k) == reference_rerank(reranking, rrf, bm25, st, top_k)
+
+
+def test_scalar_boosts_match_tables(reranking):
+    for papers in range(40):
+        assert reranking.calculate_experience_boost(papers) == _ladder(papers, [(30, 1.07), (20, 1.05), (10, 1.02), (5, 1.01)], 1.00)
+        assert reranking.calculate_penalty(papers) == (0.95 if papers <= 2 else 1.00)
+    for similarity in (0, .49, .5, .69, .7, .9):
+        assert reranking.calculate_consistency_boost(similarity) == _ladder(similarity, [(0.7, 1.05), (0.5, 1.025)], 1.00)
+    assert reranking.calculate_institution_boost('IIT') == 1.02
+    assert reranking.calculate_institution_boost(None) == 1.00
+
+
+def test_empty_candidates(reranking):
+    assert reranking.rerank_results([], [], []) == []
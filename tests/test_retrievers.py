@@ -0,0 +1,40 @@
+#Retriever timeouts: a hung retriever must not take workers that later requests need
+import threading
+
+import pytest
+
+import RRF_Ensemble
+from fusion import AuthorRanking, Retriever
+from query_context import QueryContext
+
+
+def _fast(name): #Retriever returning a fixed two-author ranking at once
+    ranking = AuthorRanking.from_rankings([(f"{name} A", 1, 1.0, 1.0, 3), (f"{name} B", 2, 0.5, 0.5, 2)])
+    return Retriever(name, lambda context, depth: ranking)
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()   # let the hung threads exit
+
+
+def test_hung_retriever_does_not_starve_later_requests(monkeypatch, release):
+    hang = Retriever("Hang", lambda context, depth: release.wait(30))
+    fast = {"First": _fast("First"), "Second": _fast("Second")}
+    timeouts = {"Hang": 0.05, "First": 2.0, "Second": 2.0}
+
+    # More hung retrievers than the shared pool has workers
+    monkeypatch.setattr(RRF_Ensemble, "RETRIEVERS", {**fast, "Hang": hang})
+    for _ in range(6):
+        context = QueryContext(raw_text="submission")
+        results = RRF_Ensemble.run_retrievers(context, executor="thread", timeouts=timeouts)
+        assert context.failed_retrievers == ["Hang"]
+        assert set(results) == set(fast)
+
+    monkeypatch.setattr(RRF_Ensemble, "RETRIEVERS", fast)
+    context = QueryContext(raw_text="submission")
+    results = RRF_Ensemble.run_retrievers(context, executor="thread", timeouts=timeouts)
+    assert context.failed_retrievers == []
+    assert {name: ranking.top() for name, ranking in results.items()} == {name: r.run(None, 0).top() for name, r in fast.items()}
@@ -0,0 +1,120 @@
+#HTTP framing and the server's rankings cache, without loading the model or indexes
+import asyncio
+import json
+
+import pytest
+
+import pipeline_cache
+import server
+
+
+class _Writer:  # Collects what handle_connection writes
+    def __init__(self):
+        self.data = b""
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _respond(app, raw_request): #(status, JSON body) of one raw HTTP request
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw_request)
+        reader.feed_eof()
+        writer = _Writer()
+        await app.handle_connection(reader, writer)
+        return writer.data
+    head, _, body = asyncio.run(run()).partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+def test_bad_content_length_is_400():
+    app = server.RecommendationServer(extract_workers=1)
+    for length in (b"abc", b"-5", b"1.5"):
+        status, body = _respond(app, b"POST /recommend HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n")
+        assert status == 400, (length, body)
+    assert _respond(app, b"POST /recommend HTTP/1.1\r\n\r\n")[0] == 411
+    assert _respond(app, b"POST /recommend HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % (server.MAX_BODY_BYTES + 1))[0] == 413
+    assert app.responses == {400: 3, 411: 1, 413: 1}
+    app.extract_pool.shutdown()
+
+
+def test_cache_hits_are_copies(monkeypatch):
+    cache = pipeline_cache.PipelineCache(cache_dir=None)
+    monkeypatch.setattr(pipeline_cache, "get_cache", lambda: cache)
+    app = server.RecommendationServer(extract_workers=1)
+    monkeypatch.setattr(app, "_rankings_key", lambda digest, top_k: ("key", digest, top_k))
+    cached = [{"author": "A", "final_score": 1.0, "papers": ["p"]}]
+    cache.put("rankings", ("key", "text:" + pipeline_cache.content_hash("paper"), 10), cached)
+
+    first = asyncio.run(app.recommend(raw_text="paper", top_k=10))
+    first[0]["papers"].append("mutated")
+    first.append({})
+    second = asyncio.run(app.recommend(raw_text="paper", top_k=10))
+    assert second == [{"author": "A", "final_score": 1.0, "papers": ["p"]}]
+    assert app.cache_hits == 2
+    app.extract_pool.shutdown()
+
+
+def _submissions(vocabulary, n=5): #(raw texts, cleaned texts) of synthetic papers; the cleaned text skips NLTK
+    import numpy as np
+    from benchmarks.synthetic import synthetic_paper
+    rng = np.random.default_rng(3)
+    tokens = [synthetic_paper(rng, vocabulary, int(rng.integers(100, 2000)))[1] for _ in range(n)]
+    return [" ".join(t) for t in tokens], [" ".join(t) for t in tokens]
+
+
+def _in_process(reranking, raw_text, cleaned_text, top_k):
+    from query_context import QueryContext
+    context = QueryContext(raw_text=raw_text)
+    context._query_tokens = cleaned_text.split()
+    return reranking.get_reranked_recommendations(context, top_k=top_k, use_cache=False)
+
+
+@pytest.mark.parametrize("setting", ["default", "combsum", "extra_retriever", "maxsim", "centroid"])
+def test_batched_path_matches_get_reranked_recommendations(corpus_root, stub_model, vocabulary, monkeypatch, setting):
+    import batch_assign
+    import fusion
+    import startup
+    import Sentence_Transformer
+    from vector_index import AuthorCentroidIndex
+    reranking = startup.load_reranking_module()
+    recommender = Sentence_Transformer.get_recommender()
+    if setting == "combsum":
+        monkeypatch.setattr(fusion, "FUSION_METHOD", "combsum")
+    elif setting == "extra_retriever":
+        authors = recommender.author_index.authors
+        ranking = fusion.AuthorRanking.from_rankings([(a, r + 1, 1.0 / (r + 1), 0.5, 1) for r, a in enumerate(authors[::7])])
+        monkeypatch.setitem(fusion.RETRIEVERS, "Extra", fusion.Retriever("Extra", lambda context, depth: ranking))
+    elif setting == "maxsim":
+        monkeypatch.setattr(recommender, "chunking", "maxsim")
+        monkeypatch.setattr(recommender, "chunk_words", 200)
+    elif setting == "centroid":
+        monkeypatch.setattr(recommender, "ann_index", AuthorCentroidIndex.build(recommender.exact_index, recommender.author_index))
+        monkeypatch.setattr(recommender, "author_shortlist", 20)
+    raw_texts, cleaned_texts = _submissions(vocabulary)
+    batched = batch_assign.assign_batch(raw_texts, cleaned_texts, top_k=10, use_cache=False)
+    assert batched == [_in_process(reranking, raw, cleaned, 10) for raw, cleaned in zip(raw_texts, cleaned_texts)]
+
+
+def test_score_batch_isolates_failures(corpus_root, stub_model, vocabulary, monkeypatch):
+    import startup
+    reranking = startup.load_reranking_module()
+    raw_texts, cleaned_texts = _submissions(vocabulary, n=3)
+    run = reranking.get_reranked_recommendations
+
+    def failing_second(context, top_k=10, use_cache=True):
+        if context.raw_text == raw_texts[1]:
+            raise RuntimeError("All retrievers failed")
+        return run(context, top_k=top_k, use_cache=False)
+
+    monkeypatch.setattr(reranking, "get_reranked_recommendations", failing_second)
+    results = server.score_batch([(raw, cleaned, 5, f"text:{i}") for i, (raw, cleaned) in enumerate(zip(raw_texts, cleaned_texts))])
+    assert isinstance(results[1], RuntimeError)
+    assert [len(results[0]), len(results[2])] == [5, 5]
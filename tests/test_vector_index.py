@@ -0,0 +1,63 @@
+#Saved vector indexes are only reused for the embeddings they were built from
+import numpy as np
+
+from author_index import AuthorIndex
+from embedding_store import load_store, write_store
+from vector_index import (AuthorCentroidIndex, ExactIndex, IVFIndex, content_hash, index_meta_path, load_or_build_index,
+                          save_index)
+
+
+def _embeddings(seed, n=500, dim=32):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+
+
+def test_saved_index_is_reused(tmp_path):
+    exact = ExactIndex(_embeddings(0))
+    path = tmp_path / "index_ivf.pkl"
+    save_index(IVFIndex.build(exact), path, exact)
+    loaded = load_or_build_index("ivf", ExactIndex(_embeddings(0)), path)
+    assert np.array_equal(loaded.list_ids, IVFIndex.load(path, exact).list_ids)
+
+
+def test_stale_index_is_rebuilt(tmp_path, capsys):
+    exact = ExactIndex(_embeddings(0))
+    path = tmp_path / "index_ivf.pkl"
+    save_index(IVFIndex.build(exact), path, exact)
+    for rewritten in (ExactIndex(_embeddings(1)), ExactIndex(_embeddings(0, n=400))):   # new rows / new row count
+        index = load_or_build_index("ivf", rewritten, path)
+        assert "rebuilding" in capsys.readouterr().out
+        assert len(index.list_ids) == len(rewritten)
+        assert index.list_ids.max() < len(rewritten)
+
+
+def test_index_without_sidecar_is_rebuilt(tmp_path, capsys):
+    exact = ExactIndex(_embeddings(0))
+    path = tmp_path / "index_ivf.pkl"
+    save_index(IVFIndex.build(exact), path, exact)
+    index_meta_path(path).unlink()
+    load_or_build_index("ivf", exact, path)
+    assert "rebuilding" in capsys.readouterr().out
+
+
+def test_centroid_index_is_rebuilt_for_regrouped_authors(tmp_path, capsys):
+    exact = ExactIndex(_embeddings(0))
+    paths = [f"p{i}" for i in range(500)]
+    authors = AuthorIndex.from_author_papers({f"a{i}": paths[i::10] for i in range(10)}, paths)
+    path = tmp_path / "index_centroid.pkl"
+    save_index(AuthorCentroidIndex.build(exact, authors), path, exact, authors)
+    same = AuthorIndex.from_author_papers({f"a{i}": paths[i::10] for i in range(10)}, paths)
+    load_or_build_index("centroid", exact, path, same)
+    assert "rebuilding" not in capsys.readouterr().out
+    # Same papers and embeddings, but regrouped (papers moved between authors) or with an author more
+    for regrouped in (AuthorIndex.from_author_papers({f"a{i}": paths[i * 50:(i + 1) * 50] for i in range(10)}, paths),
+                      AuthorIndex.from_author_papers({f"a{i}": paths[i::11] for i in range(11)}, paths)):
+        index = load_or_build_index("centroid", exact, path, regrouped)
+        assert "rebuilding" in capsys.readouterr().out
+        assert len(index) == len(regrouped)
+
+
+def test_store_records_the_content_hash(tmp_path):
+    for dtype in ("float16", "int8"):
+        write_store(tmp_path / dtype, _embeddings(0), [f"p{i}" for i in range(500)], {}, "m", dtype=dtype)
+        store = load_store(tmp_path / dtype)
+        assert store["content_hash"] == content_hash(store["embeddings"], store["scales"])
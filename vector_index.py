@@ -0,0 +1,385 @@
+#Vector index layer for the sentence-transformer embedding matrix: exact, HNSW and pure-NumPy IVF backends,
+#plus an author-level centroid/medoid index for two-stage author retrieval
+import hashlib
+import json
+import pickle
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from author_index import top_k_indices
+
+
+def normalize_rows(matrix): #L2-normalize rows as float32; all-zero rows stay zero (cosine 0, like sklearn)
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def max_sim(similarities): #Multi-vector (passage) queries score each paper by their best passage
+    return similarities.max(axis=1) if similarities.ndim == 2 else similarities
+
+
+def search_passages(index, query, top_m=100): #Union of each passage's top_m papers for a passages x dim query
+    if query.ndim == 1:
+        return index.search(query, top_m)[0]
+    return np.unique(np.concatenate([index.search(passage, top_m)[0] for passage in query]))
+
+
+def content_hash(vectors, scales=None, block_rows=65536): #Hex digest of a (stored) embedding matrix: shape, dtype, rows, scales
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{vectors.shape}|{vectors.dtype}".encode())
+    for start in range(0, len(vectors), block_rows):
+        digest.update(np.ascontiguousarray(vectors[start:start + block_rows]).tobytes())
+    if scales is not None:
+        digest.update(np.ascontiguousarray(scales).tobytes())
+    return digest.hexdigest()
+
+
+def author_layout_hash(author_index): #Hex digest of an AuthorIndex's author order and paper grouping
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps(author_index.authors, ensure_ascii=False).encode())
+    digest.update(np.ascontiguousarray(author_index.offsets, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(author_index.doc_ids, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+class ExactIndex:  # Brute-force cosine: corpus rows are normalized once at load, a query is one dot product
+    kind = "exact"
+    block_rows = 65536   # rows dequantized at a time for float16/int8 stores
+
+    def __init__(self, embeddings, normalized=False, scales=None, fingerprint=None):
+        # normalized=True keeps the given matrix as-is (e.g. a float16/int8 memmap from embedding_store)
+        self.vectors = embeddings if normalized else normalize_rows(embeddings)
+        self.scales = scales   # per-row dequantization scale for int8 stores
+        self._fingerprint = fingerprint   # content_hash of the rows, if already known (stores record it)
+
+    @property
+    def fingerprint(self): #content_hash of the rows, computed on first use
+        if self._fingerprint is None:
+            self._fingerprint = content_hash(self.vectors, self.scales, self.block_rows)
+        return self._fingerprint
+
+    def __len__(self):
+        return len(self.vectors)
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    def _score_rows(self, rows, scales, query):
+        sims = np.asarray(rows, dtype=np.float32) @ query.T
+        if scales is not None:
+            sims *= np.asarray(scales).reshape(-1, *([1] * (sims.ndim - 1)))
+        return max_sim(sims)
+
+    def similarities(self, query): #Cosine similarity of a normalized query against every paper
+        if self.vectors.dtype == np.float32 and self.scales is None:
+            return max_sim(self.vectors @ query.T)
+        # Quantized/memmapped rows: dequantize block by block so memory stays bounded
+        sims = np.empty(len(self.vectors), dtype=np.float32)
+        for start in range(0, len(self.vectors), self.block_rows):
+            end = start + self.block_rows
+            scales = None if self.scales is None else self.scales[start:end]
+            sims[start:end] = self._score_rows(self.vectors[start:end], scales, query)
+        return sims
+
+    def similarity_matrix(self, queries): #queries x papers cosine similarities as one GEMM (per block for stores)
+        queries = np.asarray(queries, dtype=np.float32)
+        if self.vectors.dtype == np.float32 and self.scales is None:
+            return queries @ self.vectors.T
+        sims = np.empty((len(queries), len(self.vectors)), dtype=np.float32)
+        for start in range(0, len(self.vectors), self.block_rows):
+            end = start + self.block_rows
+            sims[:, start:end] = queries @ np.asarray(self.vectors[start:end], dtype=np.float32).T
+            if self.scales is not None:
+                sims[:, start:end] *= np.asarray(self.scales[start:end])
+        return sims
+
+    def similarities_for(self, query, paper_ids): #Cosine similarity against a subset of papers
+        scales = None if self.scales is None else self.scales[paper_ids]
+        return self._score_rows(self.vectors[paper_ids], scales, query)
+
+    def dense_rows(self, paper_ids): #float32 normalized rows of some papers (dequantized for stores)
+        rows = np.asarray(self.vectors[paper_ids], dtype=np.float32)
+        if self.scales is not None:
+            rows = rows * np.asarray(self.scales[paper_ids])[:, None]
+        return rows
+
+    def dense_vectors(self): #float32 normalized matrix (dequantized copy for stores), for offline index builds
+        if self.vectors.dtype == np.float32 and self.scales is None:
+            return self.vectors
+        vectors = np.asarray(self.vectors, dtype=np.float32)
+        if self.scales is not None:
+            vectors = vectors * np.asarray(self.scales)[:, None]
+        return vectors
+
+    def search(self, query, top_m=100): #(paper ids, similarities) of the top_m papers, descending
+        sims = self.similarities(query)
+        top = top_k_indices(sims, top_m)
+        return top, sims[top]
+
+
+class IVFIndex:  # Pure-NumPy inverted-file index: spherical k-means lists, a query probes the nearest n_probe lists
+    kind = "ivf"
+
+    def __init__(self, centroids, list_offsets, list_ids, n_probe=8):
+        self.centroids = centroids          # n_lists x dim, normalized
+        self.list_offsets = list_offsets    # list i holds list_ids[list_offsets[i]:list_offsets[i+1]]
+        self.list_ids = list_ids
+        self.n_probe = n_probe
+        self.exact = None                   # ExactIndex used to score probed papers, attached at load
+
+    @classmethod
+    def build(cls, exact, n_lists=None, n_iter=10, n_probe=8, seed=0):
+        vectors = exact.dense_vectors()
+        n = len(vectors)
+        n_lists = max(1, min(n, n_lists or int(np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(n, size=n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assignment = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, vectors)
+            empty = np.bincount(assignment, minlength=n_lists) == 0
+            sums[empty] = centroids[empty]   # keep empty lists where they were
+            centroids = normalize_rows(sums)
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        list_ids = np.argsort(assignment, kind="stable")
+        list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=n_lists))))
+        index = cls(centroids, list_offsets, list_ids, n_probe=n_probe)
+        index.exact = exact
+        return index
+
+    def search(self, query, top_m=100):
+        probes = top_k_indices(self.centroids @ query, self.n_probe)
+        candidates = np.concatenate([self.list_ids[self.list_offsets[p]:self.list_offsets[p + 1]] for p in probes])
+        sims = self.exact.similarities_for(query, candidates)
+        top = top_k_indices(sims, top_m)
+        return candidates[top], sims[top]
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump({"centroids": self.centroids, "list_offsets": self.list_offsets,
+                         "list_ids": self.list_ids, "n_probe": self.n_probe}, f)
+
+    @classmethod
+    def load(cls, path, exact):
+        with open(path, "rb") as f:
+            saved = pickle.load(f)
+        index = cls(saved["centroids"], saved["list_offsets"], saved["list_ids"], n_probe=saved["n_probe"])
+        index.exact = exact
+        return index
+
+
+class HNSWIndex:  # Approximate graph index via hnswlib (optional dependency), built offline
+    kind = "hnsw"
+
+    def __init__(self, index, ef_search=200):
+        self.index = index
+        self.ef_search = ef_search
+
+    @classmethod
+    def build(cls, exact, M=16, ef_construction=200, ef_search=200):
+        import hnswlib
+        vectors = exact.dense_vectors()
+        index = hnswlib.Index(space="ip", dim=vectors.shape[1])   # inner product on normalized rows = cosine
+        index.init_index(max_elements=len(vectors), M=M, ef_construction=ef_construction)
+        index.add_items(vectors, np.arange(len(vectors)))
+        return cls(index, ef_search=ef_search)
+
+    def search(self, query, top_m=100):
+        top_m = min(top_m, self.index.get_current_count())
+        self.index.set_ef(max(self.ef_search, top_m))
+        labels, distances = self.index.knn_query(query.reshape(1, -1), k=top_m)
+        return labels[0].astype(np.int64), 1.0 - distances[0]
+
+    def save(self, path):
+        self.index.save_index(str(path))
+
+    @classmethod
+    def load(cls, path, exact, ef_search=200):
+        import hnswlib
+        index = hnswlib.Index(space="ip", dim=exact.dim)
+        index.load_index(str(path), max_elements=len(exact))
+        return cls(index, ef_search=ef_search)
+
+
+class AuthorCentroidIndex:  # Author-level first stage: each author's centroid plus a few k-means medoid papers
+    kind = "centroid"
+
+    def __init__(self, vectors, offsets):
+        self.vectors = vectors      # representative rows (normalized), grouped by author
+        self.offsets = offsets      # author i owns vectors[offsets[i]:offsets[i+1]]
+
+    @classmethod
+    def build(cls, exact, author_index, n_medoids=3, n_iter=5, seed=0): #Authors with n_medoids papers or fewer keep every paper
+        rng = np.random.default_rng(seed)
+        rows, offsets = [], [0]
+        for a in range(len(author_index)):
+            ids = author_index.doc_ids[author_index.offsets[a]:author_index.offsets[a + 1]]
+            papers = exact.dense_rows(ids)
+            centroid = normalize_rows(papers.mean(axis=0))
+            if len(papers) <= n_medoids:
+                medoids = papers
+            else:
+                # Spherical k-means over the author's papers; each cluster is represented by its most central paper
+                centers = papers[rng.choice(len(papers), size=n_medoids, replace=False)]
+                for _ in range(n_iter):
+                    assignment = np.argmax(papers @ centers.T, axis=1)
+                    sums = np.zeros_like(centers)
+                    np.add.at(sums, assignment, papers)
+                    empty = np.bincount(assignment, minlength=n_medoids) == 0
+                    sums[empty] = centers[empty]
+                    centers = normalize_rows(sums)
+                assignment = np.argmax(papers @ centers.T, axis=1)
+                sims = np.einsum("ij,ij->i", papers, centers[assignment])
+                medoids = papers[[np.flatnonzero(assignment == c)[np.argmax(sims[assignment == c])]
+                                  for c in np.unique(assignment)]]
+            rows.append(np.vstack([centroid, medoids]))
+            offsets.append(offsets[-1] + len(rows[-1]))
+        dim = exact.dim
+        vectors = np.vstack(rows).astype(np.float32) if rows else np.zeros((0, dim), dtype=np.float32)
+        return cls(vectors, np.asarray(offsets, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def author_scores(self, query): #Best representative similarity per author (best passage for multi-vector queries)
+        if len(self) == 0:
+            return np.zeros(0, dtype=np.float32)
+        return np.maximum.reduceat(max_sim(self.vectors @ query.T), self.offsets[:-1])
+
+    def shortlist(self, query, n_authors=100): #Ids of the n_authors best-scoring authors, ascending
+        return np.sort(top_k_indices(self.author_scores(query), n_authors))
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump({"vectors": self.vectors, "offsets": self.offsets}, f)
+
+    @classmethod
+    def load(cls, path, exact):
+        with open(path, "rb") as f:
+            saved = pickle.load(f)
+        return cls(saved["vectors"], saved["offsets"])
+
+
+INDEX_CLASSES = {"ivf": IVFIndex, "hnsw": HNSWIndex, "centroid": AuthorCentroidIndex}
+
+
+def default_index_path(embeddings_path, kind): #Index file stored next to the embeddings it was built from
+    embeddings_path = Path(embeddings_path)
+    suffix = ".bin" if kind == "hnsw" else ".pkl"
+    return embeddings_path.with_name(f"{embeddings_path.stem}_{kind}{suffix}")
+
+
+def index_meta_path(index_path): #JSON sidecar recording which embeddings an index file was built from
+    index_path = Path(index_path)
+    return index_path.with_name(index_path.name + ".json")
+
+
+def index_meta(kind, exact, author_index=None): #{"kind", "rows", "fingerprint"[, "authors", "author_layout"]} of an index over exact's rows
+    meta = {"kind": kind, "rows": len(exact), "fingerprint": exact.fingerprint}
+    if author_index is not None:
+        # Author-level indexes are laid out by author id; a regrouped corpus invalidates them too
+        meta.update(authors=len(author_index), author_layout=author_layout_hash(author_index))
+    return meta
+
+
+def save_index(index, index_path, exact, author_index=None): #Write the index and its sidecar; the sidecar last, so a partial save reads as stale
+    index.save(index_path)
+    with open(index_meta_path(index_path), "w", encoding="utf-8") as f:
+        json.dump(index_meta(index.kind, exact, author_index), f)
+
+
+def index_is_current(kind, exact, index_path, author_index=None): #True when index_path exists and was built from exactly these rows (and authors)
+    meta_path = index_meta_path(index_path)
+    if not Path(index_path).exists() or not meta_path.exists():
+        return False
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return False
+    # Counts first: a cheap mismatch skips hashing the embeddings
+    if saved.get("kind") != kind or saved.get("rows") != len(exact):
+        return False
+    if author_index is not None and (saved.get("authors") != len(author_index)
+                                     or saved.get("author_layout") != author_layout_hash(author_index)):
+        return False
+    return saved.get("fingerprint") == exact.fingerprint
+
+
+def load_or_build_index(kind, exact, index_path=None, author_index=None): #Approximate index over an ExactIndex's papers
+    #The "centroid" index is author-level and needs the AuthorIndex of those papers. A saved index is only
+    #loaded when its sidecar matches the current embeddings (row count and content hash) and, for "centroid",
+    #the current author grouping; otherwise it is rebuilt in memory, so embeddings rewritten in place or a
+    #regrouped corpus never meet a stale index.
+    cls = INDEX_CLASSES[kind]
+    layout = author_index if kind == "centroid" else None
+    if kind == "centroid" and author_index is None:
+        raise ValueError("The centroid index needs the AuthorIndex of the papers")
+    if index_path is not None and index_is_current(kind, exact, index_path, layout):
+        return cls.load(index_path, exact)
+    if index_path is not None and Path(index_path).exists():
+        print(f"⚠️ {index_path} was built from other embeddings or authors; rebuilding")
+    print(f"Building {kind} index for {len(exact)} papers (build it offline with vector_index.py to skip this)")
+    return cls.build(exact, author_index) if kind == "centroid" else cls.build(exact)
+
+
+def recall_at_k(index, exact_index, queries, k=10): #Mean fraction of the exact top-k papers the index returns
+    hits = 0
+    for query in queries:
+        expected, _ = exact_index.search(query, k)
+        found, _ = index.search(query, k)
+        hits += len(np.intersect1d(expected, found))
+    return hits / (k * len(queries)) if len(queries) else 1.0
+
+
+def author_recall_at_k(index, exact_index, author_index, queries, k=10, n_authors=100): #Mean fraction of the exact top-k authors in the centroid shortlist
+    #Stage two scores the shortlisted authors exactly, so this is also the recall of the final top k
+    hits = 0
+    for query in queries:
+        expected = top_k_indices(author_index.aggregate(exact_index.similarities(query))[0], k)
+        hits += len(np.intersect1d(expected, index.shortlist(query, n_authors)))
+    return hits / (min(k, len(author_index)) * len(queries)) if len(queries) else 1.0
+
+
+def sample_queries(vectors, n_queries=100, noise=0.05, seed=0): #Perturbed corpus rows as stand-in queries
+    rng = np.random.default_rng(seed)
+    picked = np.sort(rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False))
+    rows = np.asarray(vectors[picked], dtype=np.float32)
+    return normalize_rows(rows + noise * rng.standard_normal(rows.shape).astype(np.float32))
+
+
+if __name__ == "__main__":
+    # python vector_index.py {ivf|hnsw|centroid} [embeddings pickle or store] [index path]
+    from embedding_store import is_store, load_store
+    kind = sys.argv[1] if len(sys.argv) > 1 else "ivf"
+    embeddings_path = Path(sys.argv[2]) if len(sys.argv) > 2 else Path(__file__).parent / "PKL_files" / "sentence_transformer_embeddings.pkl"
+    index_path = Path(sys.argv[3]) if len(sys.argv) > 3 else default_index_path(embeddings_path, kind)
+    # Same ExactIndex as ReviewerRecommender builds, so the recorded fingerprint matches at load
+    if is_store(embeddings_path):
+        saved = load_store(embeddings_path)
+        exact = ExactIndex(saved["embeddings"], normalized=True, scales=saved["scales"], fingerprint=saved["content_hash"])
+    else:
+        with open(embeddings_path, "rb") as f:
+            saved = pickle.load(f)
+        exact = ExactIndex(saved["embeddings"])
+    queries = sample_queries(exact.vectors)
+    if kind == "centroid":
+        from author_index import AuthorIndex
+        author_index = AuthorIndex.from_author_papers(saved["author_papers"], saved["all_paths"])
+        index = AuthorCentroidIndex.build(exact, author_index)
+        save_index(index, index_path, exact, author_index)
+        for n_authors in (20, 50, 100, 200):
+            recall = author_recall_at_k(index, exact, author_index, queries, 10, n_authors)
+            print(f"author recall@10 with a {n_authors}-author shortlist: {recall:.4f}")
+    else:
+        index = INDEX_CLASSES[kind].build(exact)
+        save_index(index, index_path, exact)
+        for k in (10, 50, 100):
+            print(f"recall@{k} vs exact: {recall_at_k(index, exact, queries, k):.4f}")
+    print(f"✓ Wrote {index_path}")